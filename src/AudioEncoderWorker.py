@@ -1,39 +1,61 @@
+from contextlib import nullcontext
 from genericpath import exists
 from multiprocessing import Process
+from os import remove, replace
 from subprocess import Popen, DEVNULL, STDOUT
 
+from src.Metrics import Metrics
+from src.Profiler import Profiler
+from src.RunJournal import RunJournal
+
 
 class AudioEncoderWorker(Process):
     """
     Converts .wav files being put into the queue, to .mp3 with ffmpeg.exe
     """
 
-    def __init__(self, queue, app_config):
+    def __init__(self, queue, app_config, metrics_queue=None, profile=False):
         super(AudioEncoderWorker, self).__init__()
         self.queue = queue
         self.app_config = app_config
+        self.metrics_queue = metrics_queue
+        self.profile = profile
 
     def run(self):
+        with Profiler(self.app_config).profile('encoder') if self.profile else nullcontext():
+            self._encode_all()
+
+    def _encode_all(self):
+        journal = RunJournal(self.app_config)
+        metrics = Metrics()
+        metrics.take()  # drops what is inherited from the parent process
         while True:
             value = self.queue.get()
             if value is None:
+                if self.metrics_queue is not None:
+                    self.metrics_queue.put(metrics.take())
                 break
             language_pair, fn = value
+            source_track_name = rf'{self.app_config["RitmomRoot"]}/audio/{language_pair}/audio{fn:03}.wav'
             target_track_name = rf'{self.app_config["RitmomRoot"]}/audio/{language_pair}/audio{fn:03}.mp3'
+            temp_track_name = rf'{self.app_config["RitmomRoot"]}/audio/{language_pair}/audio{fn:03}.tmp.mp3'
             print(f'Encoding {target_track_name}')
             cmd_str = [
                 rf'ffmpeg', '-y', '-i',
-                rf'{self.app_config["RitmomRoot"]}/audio/{language_pair}/audio{fn:03}.wav',
+                source_track_name,
                 rf'-codec:a', 'libmp3lame', '-qscale:a', '2',
-                target_track_name,
-                rf'&&',
-                rf'del',
-                rf'{self.app_config["RitmomRoot"]}\audio\{language_pair}\audio{fn:03}.wav'
+                temp_track_name,
             ]
-            pipe = Popen(cmd_str, shell=True, stdout=DEVNULL, stderr=STDOUT)
-            out, err = pipe.communicate()
-            pipe.wait()
-            if not exists(target_track_name):
+            with metrics.timer('encode'):
+                pipe = Popen(cmd_str, stdout=DEVNULL, stderr=STDOUT)
+                out, err = pipe.communicate()
+                pipe.wait()
+            if pipe.returncode != 0 or not exists(temp_track_name):
+                metrics.count('encode.failures')
                 print(f'Failed to create {target_track_name}')
                 print(f'{str(err)}')
-
+                continue
+            # The .mp3 takes its name only when complete, so an interrupted run never leaves a truncated track
+            replace(temp_track_name, target_track_name)
+            remove(source_track_name)
+            journal.encoded(language_pair, fn)
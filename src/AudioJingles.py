@@ -16,6 +16,8 @@ class AudioJingles:
 
     def __init__(self, config):
         self._sounds = sounds = dict()
+        self._rendered = dict()
+        self._engine = None
         for k, v in config.items():
             if v.startswith('silence'):
                 duration = float(v[v.find(' '):])
@@ -28,3 +30,21 @@ class AudioJingles:
     def __getitem__(self, key):
         return self._sounds[key]
 
+    def get_data(self, key, volume, rate, format_type):
+        """
+        A jingle rendered once per volume, rate and stream format, so it can be written to a track as is
+        """
+        rendered_key = key, volume, rate, format_type
+        if rendered_key not in self._rendered:
+            if self._engine is None:
+                self._engine = CreateObject("SAPI.SpVoice")
+            stream = CreateObject("SAPI.SpMemoryStream")
+            stream.Format.Type = format_type
+            sound = self._sounds[key]
+            sound.Seek(0, 0)
+            self._engine.AudioOutputStream = stream
+            self._engine.Volume = volume
+            self._engine.Rate = rate
+            self._engine.SpeakStream(sound)
+            self._rendered[rendered_key] = stream.GetData()
+        return self._rendered[rendered_key]
@@ -0,0 +1,79 @@
+from os import replace
+from typing import List
+
+
+class CueSheet:
+    """
+    Printed text of a track with timing, written as SRT, WebVTT or LRC.
+    A cue is a line of the text output, WebVTT cues also carry a timestamp for every piece of text.
+    """
+
+    formats = ('srt', 'vtt', 'lrc')
+
+    def __init__(self):
+        self.cues: List[List] = list()  # list of [start, end, pieces], a piece is (start, text)
+        self._line = None
+
+    def add(self, text, start, end):
+        lines = text.split('\n')
+        for n, line in enumerate(lines):
+            if n:
+                self._close_line()
+            if line.strip():
+                if self._line is None:
+                    self._line = [start, end, list()]
+                self._line[1] = max(self._line[1], end)
+                self._line[2].append((start, line))
+            elif self._line is not None:
+                self._line[1] = max(self._line[1], end)  # trailing silence or spacing still belongs to the line
+                self._line[2].append((start, line))
+
+    def _close_line(self):
+        if self._line is not None:
+            self.cues.append(self._line)
+            self._line = None
+
+    def close(self):
+        self._close_line()
+
+    @staticmethod
+    def _text(pieces):
+        return ' '.join(''.join(text for _, text in pieces).split())
+
+    @staticmethod
+    def _clock(seconds, separator):
+        milliseconds = int(round(seconds * 1000))
+        hours, milliseconds = divmod(milliseconds, 3600000)
+        minutes, milliseconds = divmod(milliseconds, 60000)
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        return f'{hours:02}:{minutes:02}:{seconds:02}{separator}{milliseconds:03}'
+
+    def to_srt(self):
+        blocks = list()
+        for n, (start, end, pieces) in enumerate(self.cues, start=1):
+            blocks.append(f'{n}\n{self._clock(start, ",")} --> {self._clock(end, ",")}\n{self._text(pieces)}\n')
+        return '\n'.join(blocks)
+
+    def to_vtt(self):
+        blocks = ['WEBVTT\n']
+        for start, end, pieces in self.cues:
+            words = [(piece_start, ' '.join(text.split())) for piece_start, text in pieces if text.strip()]
+            text = ' '.join(text if n == 0 else f'<{self._clock(piece_start, ".")}>{text}'
+                            for n, (piece_start, text) in enumerate(words))
+            blocks.append(f'{self._clock(start, ".")} --> {self._clock(end, ".")}\n{text}\n')
+        return '\n'.join(blocks)
+
+    def to_lrc(self):
+        lines = list()
+        for start, _, pieces in self.cues:
+            minutes, seconds = divmod(start, 60)
+            lines.append(f'[{int(minutes):02}:{seconds:05.2f}]{self._text(pieces)}\n')
+        return ''.join(lines)
+
+    def write(self, path_without_extension, formats, encoding='utf-8'):
+        self.close()
+        for cue_format in formats:
+            path = f'{path_without_extension}.{cue_format}'
+            with open(f'{path}.tmp', mode='w', encoding=encoding) as f:
+                f.write(getattr(self, f'to_{cue_format}')())
+            replace(f'{path}.tmp', path)
@@ -0,0 +1,127 @@
+import pickle
+import sqlite3
+from collections import OrderedDict
+from copy import copy
+from hashlib import sha1
+from os import makedirs
+
+import attr
+
+from src.Metrics import Metrics
+
+
+class FilterCache:
+    """
+    Memoizes outputs of pure filters (see *BaseFilter.pure*) for *ChunkProcessor*.
+
+    A key is made of the filter class, its version and configuration and every chunk attribute but the voice,
+    since pure filters pass the voice of an incoming chunk through untouched.
+    Recent results are kept in an in-memory LRU, all of them optionally go to
+    an SQLite database under **cache/**, which is shared by all worker processes.
+    """
+
+    _INPUT_VOICE = '<input voice>'  # stands in stored results for the voice of an incoming chunk
+    _key_attributes = dict()  # chunk class -> names of the attributes keys are made of
+
+    def __init__(self, app_config):
+        cache_config = app_config.get('filter_cache', dict())
+        self.enabled = cache_config.get('enabled', True)
+        self.memory_entries = cache_config.get('memory_entries', 10000)
+        self.disk = cache_config.get('disk', False)
+        self.db_path = f'{app_config["RitmomRoot"]}/cache/filters/filters.db'
+        self._memory = OrderedDict()
+        self._pending = dict()  # computed results not written to disk yet
+        self._db = None
+        self.metrics = Metrics()
+        self.hits, self.misses = 0, 0
+
+    @classmethod
+    def make_key(cls, f, chunk):
+        names = cls._key_attributes.get(chunk.__class__, None)
+        if names is None:
+            names = cls._key_attributes[chunk.__class__] = tuple(a.name for a in attr.fields(chunk.__class__)
+                                                                  if a.name != 'voice')
+        chunk_attributes = tuple((name, getattr(chunk, name)) for name in names)
+        return f.__class__.__name__, f.version, f.fingerprint, chunk.__class__.__name__, chunk_attributes
+
+    def apply(self, f, chunk):
+        key = self.make_key(f, chunk)
+        template = self._get(key)
+        if template is not None:
+            self.hits += 1
+            self.metrics.count('filter_cache.hits')
+            return self._from_template(chunk, template)
+
+        self.misses += 1
+        self.metrics.count('filter_cache.misses')
+        result = f(chunk)
+        template = self._to_template(chunk, result)
+        if template is not None:
+            self._put(key, template)
+        return result
+
+    def _to_template(self, chunk, result):
+        template = list()
+        input_voice = getattr(chunk, 'voice', None)
+        for c in result:
+            voice = getattr(c, 'voice', None)
+            if voice is None:
+                template.append(copy(c))
+            elif voice is input_voice:
+                template.append(attr.evolve(c, voice=self._INPUT_VOICE))
+            else:
+                return None  # the filter has picked a voice itself, so the result can't be reused
+        return template
+
+    def _from_template(self, chunk, template):
+        result = list()
+        for c in template:
+            if getattr(c, 'voice', None) == self._INPUT_VOICE:
+                result.append(attr.evolve(c, voice=chunk.voice))
+            else:
+                result.append(copy(c))
+        return result
+
+    def _get(self, key):
+        template = self._memory.get(key, None)
+        if template is not None:
+            self._memory.move_to_end(key)
+            return template
+
+        if self.disk:
+            row = self._get_db().execute('SELECT value FROM filter_cache WHERE key = ?',
+                                         (self._disk_key(key),)).fetchone()
+            if row is not None:
+                template = pickle.loads(row[0])
+                self._remember(key, template)
+        return template
+
+    def _put(self, key, template):
+        self._remember(key, template)
+        if self.disk:
+            self._pending[self._disk_key(key)] = pickle.dumps(template)
+
+    def _remember(self, key, template):
+        self._memory[key] = template
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _disk_key(key):
+        return sha1(repr(key).encode('utf-8')).digest()
+
+    def _get_db(self):
+        if self._db is None:  # connected lazily, so every worker process gets its own connection
+            makedirs(self.db_path.rpartition('/')[0], exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS filter_cache (key BLOB PRIMARY KEY, value BLOB)')
+        return self._db
+
+    def flush(self):
+        """Writes results computed since the last flush to disk in one transaction"""
+        if not self._pending:
+            return
+        db = self._get_db()
+        with db:
+            db.executemany('INSERT OR REPLACE INTO filter_cache (key, value) VALUES (?, ?)', self._pending.items())
+        self._pending.clear()
@@ -0,0 +1,68 @@
+from collections import OrderedDict, namedtuple
+from typing import Iterable, List
+from unicodedata import name as unicode_name
+
+import ipadic
+import jaconv
+import MeCab
+
+from src.utils.singleton import Singleton
+
+
+Token = namedtuple('Token', ['surface', 'reading', 'base_form', 'part_of_speech'])
+
+
+class JapaneseAnalyzer(metaclass=Singleton):
+    """
+    Morphological analysis of Japanese text with a single MeCab tagger per worker process.
+
+    Texts of a whole track can be analysed in one batch beforehand (see *analyze_many*),
+    results are kept, so *AddFurigana*, *ExplainKanji* and others share a single tagging pass.
+    Tokens are read in the feature layout of IPAdic, so the tagger uses the pinned *ipadic* package
+    rather than whatever dictionary a system MeCab is configured with.
+    """
+
+    def __init__(self, cache_size=4096):
+        self.tagger = MeCab.Tagger(f'-Ochasen {ipadic.MECAB_ARGS}')
+        self.tagger.parse('')  # otherwise surfaces of nodes can be garbage collected too early
+        self.cache_size = cache_size
+        self._analyses = OrderedDict()
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.split())
+
+    @staticmethod
+    def is_kanji(char):
+        return unicode_name(char, '').startswith('CJK UNIFIED IDEOGRAPH')
+
+    def _parse(self, text) -> List[Token]:
+        tokens = list()
+        node = self.tagger.parseToNode(text)
+        while node is not None:
+            surface = node.surface
+            if surface:
+                features = node.feature.split(',')
+                reading = jaconv.kata2hira(features[7]) if len(features) > 7 else None
+                base_form = features[6] if len(features) > 6 and features[6] != '*' else surface
+                tokens.append(Token(surface, reading, base_form, features[0]))
+            node = node.next
+        return tokens
+
+    def analyze(self, text) -> List[Token]:
+        text = self.normalize(text)
+        tokens = self._analyses.get(text, None)
+        if tokens is None:
+            tokens = self._analyses[text] = self._parse(text)
+            if len(self._analyses) > self.cache_size:
+                self._analyses.popitem(last=False)
+        else:
+            self._analyses.move_to_end(text)
+        return tokens
+
+    def analyze_many(self, texts: Iterable[str]) -> List[List[Token]]:
+        """:return: tokens of each text, in the order of *texts*, an empty text has none"""
+        return [self.analyze(text) if text else list() for text in texts]
+
+    def segment(self, text) -> List[str]:
+        return [token.surface for token in self.analyze(text)]
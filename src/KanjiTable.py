@@ -0,0 +1,134 @@
+import pickle
+from array import array
+from bisect import bisect_right
+from io import TextIOWrapper
+from os import replace
+from os.path import abspath, dirname, exists
+from zipfile import ZipFile
+
+import jaconv
+
+from src.MemoryReport import MemoryReport
+from src.Resource import Resource
+
+
+class KanjiTable:
+    """
+    Japanese readings and definitions of CJK ideographs, compiled once from Unihan.
+
+    Records are addressed by a dense codepoint index spanning the CJK blocks,
+    readings are converted to kana at compile time, so a lookup is a couple of array reads.
+    Unihan is **resource.unihan** of the config, if *Resource.configure*-d, otherwise *default_unihan*.
+    """
+
+    blocks = (
+        (0x3400, 0x4DBF),  # CJK Unified Ideographs Extension A
+        (0x4E00, 0x9FFF),  # CJK Unified Ideographs
+        (0xF900, 0xFAFF),  # CJK Compatibility Ideographs
+        (0x20000, 0x2A6DF),  # Extension B
+        (0x2A700, 0x2EBEF),  # Extensions C, D, E, F
+        (0x2F800, 0x2FA1F),  # CJK Compatibility Ideographs Supplement
+        (0x30000, 0x323AF),  # Extensions G, H
+    )
+
+    fields = ('kJapaneseOn', 'kJapaneseKun', 'kDefinition')
+    readings_file = 'Unihan_Readings.txt'
+
+    ritmom_root = dirname(dirname(abspath(__file__)))
+    default_path = f'{ritmom_root}/resource/kanji.table'
+    default_unihan = {
+        "url": "https://www.unicode.org/Public/UCD/latest/ucd/Unihan.zip",
+        "destination": f"{ritmom_root}/resource/Unihan.zip",
+        "description": "Unihan database"
+    }
+
+    _tables = dict()  # path -> loaded table, read-only, so shared within a process and with forked workers
+
+    def __init__(self, block_starts, block_bases, index, records):
+        self._block_starts = block_starts
+        self._block_bases = block_bases  # position of the block's first codepoint within index
+        self._block_ends = [end for _, end in self.blocks]
+        self._index = index  # 1-based record number, or 0 if there is nothing known about a codepoint
+        self._records = records
+
+    @classmethod
+    def ensure(cls, path=default_path, unihan=None):
+        """Compiles the table if it hasn't been done yet"""
+        if not exists(path):
+            cls.compile(path, unihan)
+
+    @classmethod
+    def load(cls, path=default_path, unihan=None):
+        if path not in cls._tables:
+            cls.ensure(path, unihan)
+            with open(path, 'rb') as f, MemoryReport().measure('kanji_table'):
+                block_starts, block_bases, index, records = pickle.load(f)
+            cls._tables[path] = cls(block_starts, block_bases, index, records)
+        return cls._tables[path]
+
+    @classmethod
+    def compile(cls, path=default_path, unihan=None):
+        unihan = unihan or Resource.configured.get('unihan', cls.default_unihan)
+        Resource(**unihan).ensure()
+        print(f'Compiling kanji table from {unihan["destination"]}')
+
+        entries = dict()
+        with ZipFile(unihan['destination']) as z, z.open(cls.readings_file) as f:
+            for line in TextIOWrapper(f, encoding='utf-8'):
+                if line.startswith('#') or not line.strip():
+                    continue
+                codepoint, field, value = line.rstrip('\n').split('\t', 2)
+                if field in cls.fields:
+                    entries.setdefault(int(codepoint[2:], 16), dict())[field] = value
+
+        block_starts = [start for start, _ in cls.blocks]
+        block_bases = list()
+        index = array('I')
+        records = list()
+        for start, end in cls.blocks:
+            block_bases.append(len(index))
+            for codepoint in range(start, end + 1):
+                entry = entries.get(codepoint, None)
+                if entry is None:
+                    index.append(0)
+                    continue
+                records.append(cls._make_record(entry))
+                index.append(len(records))
+
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump((block_starts, block_bases, index, records), f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(temp_path, path)
+
+    @staticmethod
+    def _make_record(entry):
+        def to_kana(romaji):
+            return jaconv.alphabet2kana(romaji.lower()).split(' ') if romaji else list()
+
+        hiragana = to_kana(entry.get('kJapaneseKun', ''))
+        katakana = [jaconv.hira2kata(kana) for kana in to_kana(entry.get('kJapaneseOn', ''))]
+        return hiragana, katakana, entry.get('kDefinition', '')
+
+    def __getitem__(self, char):
+        """
+        :return: tuple of kun readings in hiragana, on readings in katakana and an english definition,
+                 or None if the character is unknown
+        """
+        codepoint = ord(char)
+        block = bisect_right(self._block_starts, codepoint) - 1
+        if block < 0 or codepoint > self._block_ends[block]:
+            return None
+        record_number = self._index[self._block_bases[block] + codepoint - self._block_starts[block]]
+        return self._records[record_number - 1] if record_number else None
+
+    def reverse(self, word):
+        """Characters which definitions mention *word*"""
+        result = list()
+        for block, (start, _) in enumerate(self.blocks):
+            base = self._block_bases[block]
+            next_base = self._block_bases[block + 1] if block + 1 < len(self.blocks) else len(self._index)
+            for position in range(base, next_base):
+                record_number = self._index[position]
+                if record_number and word in self._records[record_number - 1][2]:
+                    result.append(chr(start + position - base))
+        return result
@@ -0,0 +1,53 @@
+from string import ascii_lowercase, digits, punctuation
+
+from comtypes.client import CreateObject
+
+
+class LetterBank:
+    """
+    Letters, digits and punctuation pre-rendered to PCM once per voice, rate and volume.
+    Spelling a word out is then a matter of writing buffers to the output stream, without any TTS calls.
+    A space is not in the bank: *PronounceByLetter* spells it as the **space** jingle, which is rendered once as well.
+    """
+
+    symbols = ascii_lowercase + digits + punctuation
+
+    def __init__(self):
+        self._banks = dict()
+        self._engine = None
+
+    @staticmethod
+    def _key(voice, rate, volume, format_type):
+        return voice.Id, rate, volume, format_type
+
+    def _render(self, voice, rate, volume, format_type):
+        if self._engine is None:
+            self._engine = CreateObject("SAPI.SpVoice")
+        engine = self._engine
+        engine.Voice = voice
+        engine.Rate = rate
+        engine.Volume = volume
+
+        sounds = dict()
+        for symbol in self.symbols:
+            stream = CreateObject("SAPI.SpMemoryStream")
+            stream.Format.Type = format_type  # same as of the track, so buffers can be written as is
+            engine.AudioOutputStream = stream
+            engine.Speak(symbol)
+            sounds[symbol] = stream.GetData()
+        return sounds
+
+    def has(self, symbol):
+        return len(symbol) == 1 and symbol.lower() in self.symbols
+
+    def get(self, symbol, voice, rate, volume, format_type):
+        """
+        :return: PCM data of the spoken symbol, or None if it isn't in the bank
+        """
+        if not self.has(symbol):
+            return None
+        symbol = symbol.lower()
+        key = self._key(voice, rate, volume, format_type)
+        if key not in self._banks:
+            self._banks[key] = self._render(voice, rate, volume, format_type)
+        return self._banks[key][symbol]
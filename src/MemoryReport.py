@@ -0,0 +1,138 @@
+import tracemalloc
+from contextlib import contextmanager
+from glob import glob
+from json import dump, load
+from os import getpid, makedirs, remove, replace
+from os.path import basename
+
+from src.utils.memory import get_rss
+from src.utils.singleton import Singleton
+
+
+class MemoryReport(metaclass=Singleton):
+    """
+    Memory taken by subsystems (dictionaries, corpus indices, kanji table, the sequencer, the speech engine)
+    and by rendering each part, within a process.
+
+    A *measure*-d block is accounted with tracemalloc, for Python allocations, and RSS, which also shows
+    memory of native libraries and COM. Each process keeps its figures in **cache/memory/<pid>.json**,
+    the parent *merge*-s them into **cache/memory/report.json**. Does nothing unless *enable*-d.
+    """
+
+    top_allocations = 5
+
+    def __init__(self):
+        self.enabled = False
+        self.pid = None
+        self.directory = None
+        self.subsystems = dict()  # name -> figures, see *_account*
+        self.parts = dict()
+        self._peaks = list()  # traced peaks of the enclosing blocks
+
+    def enable(self, app_config):
+        """Starts accounting in this process, figures inherited from the parent process are dropped"""
+        if self.enabled and self.pid == getpid():
+            return
+        self.directory = f'{app_config["RitmomRoot"]}/cache/memory'
+        self.enabled = True
+        self.pid = getpid()
+        self.subsystems, self.parts, self._peaks = dict(), dict(), list()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self):
+        """Removes reports of the previous run"""
+        makedirs(self.directory, exist_ok=True)
+        for path in glob(f'{self.directory}/*.json'):
+            remove(path)
+
+    @staticmethod
+    def _reset_peak():
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+, otherwise peaks are of the process
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def measure(self, name, part=False):
+        """
+        Accounts memory of the block as the subsystem *name*
+        :param part: the block renders a part, it's reported among the parts
+        """
+        if not self.enabled:
+            yield
+            return
+
+        traced_before, peak = tracemalloc.get_traced_memory()
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        self._reset_peak()
+        self._peaks.append(traced_before)
+        snapshot = tracemalloc.take_snapshot()
+        rss_before, _ = get_rss()
+        try:
+            yield
+        finally:
+            traced_after, peak = tracemalloc.get_traced_memory()
+            peak = max(self._peaks.pop(), peak)
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            rss_after, rss_peak = get_rss()
+            top = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:self.top_allocations]
+            figures = dict(traced=traced_after - traced_before, traced_peak=peak - traced_before,
+                           rss=rss_after - rss_before, rss_after=rss_after, rss_peak=rss_peak,
+                           top=[[str(stat.traceback), stat.size_diff] for stat in top])
+            self._account(self.parts if part else self.subsystems, name, figures)
+            self._save()
+
+    @staticmethod
+    def _account(target, name, figures):
+        """Keeps the totals of what is retained and the maximums of peaks"""
+        entry = target.get(name, None)
+        if entry is None:
+            target[name] = dict(figures, count=1)
+            return
+        entry['count'] += 1
+        for key in ('traced', 'rss'):
+            entry[key] += figures[key]
+        for key in ('traced_peak', 'rss_after', 'rss_peak'):
+            entry[key] = max(entry[key], figures[key])
+        if figures['traced_peak'] >= entry['traced_peak']:
+            entry['top'] = figures['top']
+
+    def _save(self):
+        makedirs(self.directory, exist_ok=True)
+        path = f'{self.directory}/{getpid()}.json'
+        with open(f'{path}.tmp', mode='w', encoding='utf-8') as f:
+            dump(dict(subsystems=self.subsystems, parts=self.parts, rss_peak=get_rss()[1]), f)
+        replace(f'{path}.tmp', path)
+
+    def merge(self):
+        """
+        Aggregates reports of all processes: per subsystem and per part peaks, and peak RSS of each process
+        :return: path of the report, or None if there is nothing to merge
+        """
+        paths = sorted(path for path in glob(f'{self.directory}/*.json') if basename(path) != 'report.json')
+        if not paths:
+            return None
+        report = dict(subsystems=dict(), parts=dict(), processes=dict())
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                process = load(f)
+            report['processes'][f'pid {basename(path)[:-len(".json")]}'] = process['rss_peak']
+            for name, figures in process['subsystems'].items():
+                self._merge_into(report['subsystems'], name, figures)
+            for name, figures in process['parts'].items():
+                self._merge_into(report['parts'], name, figures)
+
+        path = f'{self.directory}/report.json'
+        with open(path, mode='w', encoding='utf-8') as f:
+            dump(report, f, indent=2)
+        return path
+
+    @classmethod
+    def _merge_into(cls, target, name, figures):
+        if name not in target:
+            target[name] = dict(figures)
+            return
+        count = target[name]['count']
+        cls._account(target, name, figures)
+        target[name]['count'] = count + figures['count']
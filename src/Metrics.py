@@ -0,0 +1,150 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from json import dump
+from os import getpid, makedirs, replace
+from os.path import dirname
+from threading import Lock
+from time import perf_counter
+
+from src.utils.singleton import Singleton
+
+
+class Metrics(metaclass=Singleton):
+    """
+    Counters and timing histograms of the pipeline stages within a process.
+
+    Worker processes hand their metrics over to the parent with *take* (see *make_audio_track*),
+    the parent *merge*-s them, keeping a breakdown per worker, and writes a JSON report,
+    optionally also a Prometheus textfile. Counters named ``*.hits`` and ``*.misses`` give hit ratios.
+    Updates are locked, since the streaming producer and consumer threads count into the same metrics.
+    """
+
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, float('inf'))  # upper bounds, seconds
+
+    def __init__(self):
+        self.counters = dict()
+        self.histograms = dict()  # name -> [count, sum, min, max, list of counts per bucket]
+        self.workers = dict()  # worker -> merged snapshot
+        self._lock = Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self.histograms.get(name, None)
+            if histogram is None:
+                histogram = self.histograms[name] = [0, 0.0, seconds, seconds, [0] * len(self.buckets)]
+            histogram[0] += 1
+            histogram[1] += seconds
+            histogram[2] = min(histogram[2], seconds)
+            histogram[3] = max(histogram[3], seconds)
+            histogram[4][bucket] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start)
+
+    def timed(self, name, iterable):
+        """Generator. Yields items of the iterable, timing each step as *name*"""
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, perf_counter() - start)
+            yield item
+
+    def take(self):
+        """:return: snapshot of the metrics collected since the last call, for the parent process to *merge*"""
+        with self._lock:
+            snapshot = dict(worker=f'pid {getpid()}', counters=self.counters, histograms=self.histograms)
+            self.counters, self.histograms = dict(), dict()
+        return snapshot
+
+    @staticmethod
+    def _merge_into(target, counters, histograms):
+        for name, value in counters.items():
+            target['counters'][name] = target['counters'].get(name, 0) + value
+        for name, (count, total, minimum, maximum, bucket_counts) in histograms.items():
+            histogram = target['histograms'].get(name, None)
+            if histogram is None:
+                target['histograms'][name] = [count, total, minimum, maximum, list(bucket_counts)]
+                continue
+            histogram[0] += count
+            histogram[1] += total
+            histogram[2] = min(histogram[2], minimum)
+            histogram[3] = max(histogram[3], maximum)
+            histogram[4] = [a + b for a, b in zip(histogram[4], bucket_counts)]
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        with self._lock:
+            worker = self.workers.setdefault(snapshot['worker'], dict(counters=dict(), histograms=dict()))
+            self._merge_into(worker, snapshot['counters'], snapshot['histograms'])
+            self._merge_into(dict(counters=self.counters, histograms=self.histograms),
+                             snapshot['counters'], snapshot['histograms'])
+
+    @classmethod
+    def _describe(cls, counters, histograms):
+        ratios = dict()
+        for name, hits in counters.items():
+            if name.endswith('.hits'):
+                total = hits + counters.get(f'{name[:-len(".hits")]}.misses', 0)
+                ratios[name[:-len('.hits')]] = hits / total if total else 0.0
+        return dict(
+            counters=dict(sorted(counters.items())),
+            ratios=dict(sorted(ratios.items())),
+            histograms={name: dict(count=count, sum=total, min=minimum, max=maximum, mean=total / count,
+                                   buckets={str(bound): n for bound, n in zip(cls.buckets, bucket_counts)})
+                        for name, (count, total, minimum, maximum, bucket_counts) in sorted(histograms.items())})
+
+    def report(self):
+        return dict(total=self._describe(self.counters, self.histograms),
+                    workers={worker: self._describe(snapshot['counters'], snapshot['histograms'])
+                             for worker, snapshot in sorted(self.workers.items())})
+
+    @staticmethod
+    def _metric_name(name):
+        return 'ritmom_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+    def to_prometheus(self):
+        lines = list()
+        for name, value in sorted(self.counters.items()):
+            metric = f'{self._metric_name(name)}_total'
+            lines.append(f'# TYPE {metric} counter\n{metric} {value}')
+        for name, (count, total, _, _, bucket_counts) in sorted(self.histograms.items()):
+            metric = f'{self._metric_name(name)}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{"+Inf" if bound == float("inf") else bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum {total}\n{metric}_count {count}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _write(path, write):
+        makedirs(dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', mode='w', encoding='utf-8') as f:
+            write(f)
+        replace(f'{path}.tmp', path)
+
+    def write_report(self, app_config, elapsed):
+        config = app_config.get('metrics', dict())
+        report = config.get('report', None)
+        if report and not report.startswith('#'):
+            self._write(f'{app_config["RitmomRoot"]}/{report}',
+                        lambda f: dump(dict(elapsed=elapsed, **self.report()), f, indent=2))
+        prometheus = config.get('prometheus', None)
+        if prometheus and not prometheus.startswith('#'):
+            self._write(f'{app_config["RitmomRoot"]}/{prometheus}', lambda f: f.write(self.to_prometheus()))
@@ -0,0 +1,105 @@
+from hashlib import blake2b
+from os import makedirs, replace
+from os.path import exists
+from unicodedata import normalize
+
+
+class PhrasebookIndex:
+    """
+    Drops repeated entries of the chained phrasebooks, so every word is rendered once per run.
+
+    Entries are keyed by a hash of the language pair and the normalized foreign word. Optionally,
+    words already rendered by earlier runs are skipped too, as well as known words of the exclusion list,
+    a text file with a word per line, or a language pair and a word separated by a tab.
+    Hashes of rendered entries are kept per language pair in ``cache/phrasebook_index/{pair}.idx``,
+    an entry counts as rendered once its part is journaled as synthesized (see *RunJournal*).
+    """
+
+    digest_size = 16
+
+    def __init__(self, app_config):
+        config = app_config.get('dedup', dict())
+        self.enabled = config.get('enabled', False)
+        self.skip_rendered = config.get('skip_rendered', False)
+        self.path = f'{app_config["RitmomRoot"]}/cache/phrasebook_index'
+        self.rendered = dict()  # language pair -> set of hashes, loaded on demand
+        self.parts = dict()  # (language pair, part number) -> hashes of the part's entries
+        self.known = set()
+        self.known_words = set()  # of any language pair
+        self.seen = set()
+        self.skipped = 0
+
+        exclude = config.get('exclude', None)
+        if self.enabled and exclude and not exclude.startswith('#'):
+            self._load_known(f'{app_config["RitmomRoot"]}/{exclude}')
+
+    @staticmethod
+    def normalize(word):
+        return ' '.join(normalize('NFKC', word).casefold().split())
+
+    @classmethod
+    def make_key(cls, language_pair, word):
+        return blake2b(f'{language_pair}\t{cls.normalize(word)}'.encode('utf-8'), digest_size=cls.digest_size).digest()
+
+    def _load_known(self, path):
+        with open(path, 'rt', errors='replace', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '\t' in line:
+                    language_pair, word = line.split('\t', 1)
+                    self.known.add(self.make_key(language_pair, word))
+                else:
+                    self.known_words.add(self.normalize(line))
+
+    def _get_rendered(self, language_pair):
+        if language_pair not in self.rendered:
+            hashes = set()
+            path = f'{self.path}/{language_pair}.idx'
+            if exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                hashes.update(data[i:i + self.digest_size] for i in range(0, len(data), self.digest_size))
+            self.rendered[language_pair] = hashes
+        return self.rendered[language_pair]
+
+    def is_new(self, language_pair, word):
+        """Whether the entry hasn't been seen, rendered or known yet, it's remembered as seen then"""
+        if not self.enabled:
+            return True
+        key = self.make_key(language_pair, word)
+        if key in self.seen or key in self.known or self.normalize(word) in self.known_words or \
+                self.skip_rendered and key in self._get_rendered(language_pair):
+            self.skipped += 1
+            return False
+        self.seen.add(key)
+        return True
+
+    def add_part(self, language_pair, part_number, items):
+        """Remembers entries of a part queued for rendering, see *save*"""
+        if self.enabled:
+            self.parts[language_pair, part_number] = [self.make_key(language_pair, word) for word, _ in items]
+
+    def save(self, journaled_parts):
+        """
+        Adds hashes of entries of the parts rendered within this run to the persistent index
+        :param journaled_parts: as returned by *RunJournal.load*, entries of parts which haven't got
+            synthesized are left out, so they are rendered again by the next run
+        """
+        added = dict()  # language pair -> set of hashes
+        for (language_pair, part_number), keys in self.parts.items():
+            _, state = journaled_parts.get((language_pair, part_number), (None, None))
+            if state in ('synthesized', 'encoded', 'verified'):
+                added.setdefault(language_pair, set()).update(keys)
+        self.parts.clear()
+        if not added:
+            return
+        makedirs(self.path, exist_ok=True)
+        for language_pair, keys in added.items():
+            hashes = self._get_rendered(language_pair)
+            hashes.update(keys)
+            path = f'{self.path}/{language_pair}.idx'
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(b''.join(sorted(hashes)))
+            replace(f'{path}.tmp', path)
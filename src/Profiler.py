@@ -0,0 +1,144 @@
+import sys
+from contextlib import contextmanager
+from cProfile import Profile
+from glob import glob
+from os import getpid, makedirs, remove
+from os.path import basename
+from pstats import Stats
+from threading import Thread, Event, get_ident
+
+
+class StackSampler(Thread):
+    """
+    Samples stacks of a thread at an interval, which shows where wall time goes, time spent
+    in COM calls or waiting included. Stacks are kept collapsed, as flame graph tools take them.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = dict()  # 'outer;...;inner' -> samples
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id, None)
+            names = list()
+            while frame is not None:
+                names.append(f'{basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    """
+    cProfile of the work done in a process, dumped per part to **cache/profile/**: ``<name>.prof`` and,
+    if **profile.sampling_interval** is set, ``<name>.folded`` of sampled stacks.
+    The parent process *merge*-s dumps of all workers into ``merged.prof`` and a text report
+    of the top functions by cumulative and own time.
+    cProfile only sees the thread which enabled it, so threads doing work of a profiled block,
+    e.g. the producer of *StreamingSequencer*, profile themselves with *thread* into dumps of their own.
+    """
+
+    _active = None  # the profiler and name of the block being profiled in this process
+
+    def __init__(self, app_config):
+        config = app_config.get('profile', dict())
+        self.directory = f'{app_config["RitmomRoot"]}/{config.get("directory", "cache/profile")}'
+        self.sampling_interval = config.get('sampling_interval', 0)
+        self.top = config.get('top', 40)
+
+    def start(self):
+        """Removes dumps of the previous run"""
+        makedirs(self.directory, exist_ok=True)
+        for path in glob(f'{self.directory}/*.prof') + glob(f'{self.directory}/*.folded'):
+            remove(path)
+
+    @contextmanager
+    def profile(self, name):
+        Profiler._active = self, name
+        try:
+            with self._profile(name):
+                yield
+        finally:
+            Profiler._active = None
+
+    @classmethod
+    @contextmanager
+    def thread(cls, name):
+        """Profiles the calling thread as *name* of the block being profiled, if any, see *profile*"""
+        if cls._active is None:
+            yield
+            return
+        profiler, block = cls._active
+        with profiler._profile(f'{block}.{name}'):
+            yield
+
+    @contextmanager
+    def _profile(self, name):
+        profile = Profile()
+        sampler = StackSampler(get_ident(), self.sampling_interval) if self.sampling_interval else None
+        if sampler is not None:
+            sampler.start()
+        try:
+            profile.enable()
+        except ValueError:  # Python 3.12+ allows one profile at a time, which covers all threads then
+            profile = None
+        try:
+            yield
+        finally:
+            makedirs(self.directory, exist_ok=True)
+            path = f'{self.directory}/{name}.{getpid()}'
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(f'{path}.prof')
+            if sampler is not None:
+                sampler.stop()
+                self._write_folded(f'{path}.folded', sampler.stacks)
+
+    @staticmethod
+    def _write_folded(path, stacks):
+        with open(path, mode='w', encoding='utf-8') as f:
+            for stack, samples in sorted(stacks.items()):
+                f.write(f'{stack} {samples}\n')
+
+    @staticmethod
+    def _read_folded(path, stacks):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                stack, _, samples = line.rstrip('\n').rpartition(' ')
+                stacks[stack] = stacks.get(stack, 0) + int(samples)
+
+    def merge(self):
+        """
+        Aggregates dumps of all processes and parts
+        :return: path of the text report, or None if there is nothing to merge
+        """
+        dumps = sorted(path for path in glob(f'{self.directory}/*.prof') if basename(path) != 'merged.prof')
+        if not dumps:
+            return None
+        stats = Stats(*dumps)
+        stats.dump_stats(f'{self.directory}/merged.prof')
+
+        stacks = dict()
+        for path in glob(f'{self.directory}/*.folded'):
+            if basename(path) != 'merged.folded':
+                self._read_folded(path, stacks)
+        if stacks:
+            self._write_folded(f'{self.directory}/merged.folded', stacks)
+
+        report = f'{self.directory}/report.txt'
+        with open(report, mode='w', encoding='utf-8') as f:
+            stats.stream = f
+            f.write(f'{len(dumps)} profiles merged\n\nBy cumulative time\n')
+            stats.sort_stats('cumulative').print_stats(self.top)
+            f.write('By own time\n')
+            stats.sort_stats('tottime').print_stats(self.top)
+        return report
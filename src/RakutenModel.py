@@ -0,0 +1,61 @@
+import pickle
+from json import load
+from os import replace
+from os.path import abspath, dirname, exists, splitext
+
+from src.MemoryReport import MemoryReport
+from src.Resource import Resource
+
+
+class RakutenModel:
+    """
+    Pre-trained RakutenMA model compiled from JSON to pickle, which loads many times faster.
+    A model is loaded once per process and shared by all *RakutenMA* instances as read-only.
+    The model is **resource.rakuten_ma_model** of the config, if *Resource.configure*-d, otherwise *default_model*.
+    """
+
+    ritmom_root = dirname(dirname(abspath(__file__)))
+    default_model = {
+        "url": "https://github.com/ikegami-yukino/rakutenma-python/raw/master/rakutenma/model/model_ja.min.json",
+        "destination": f"{ritmom_root}/resource/model_ja.min.json",
+        "description": ""
+    }
+
+    _models = dict()
+
+    @classmethod
+    def _get_model(cls, model):
+        return model or Resource.configured.get('rakuten_ma_model', cls.default_model)
+
+    @staticmethod
+    def compiled_path(json_path):
+        return f'{splitext(json_path)[0]}.pickle'
+
+    @classmethod
+    def ensure(cls, model=None):
+        """Downloads the JSON model and compiles it if it hasn't been done yet"""
+        model = cls._get_model(model)
+        path = cls.compiled_path(model['destination'])
+        if not exists(path):
+            cls.compile(model)
+        return path
+
+    @classmethod
+    def compile(cls, model=None):
+        model = cls._get_model(model)
+        Resource(**model).ensure()
+        print(f'Compiling RakutenMA model {model["destination"]}')
+        with open(model['destination'], encoding='utf-8') as f:
+            weights = load(f)
+        path = cls.compiled_path(model['destination'])
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(weights, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(f'{path}.tmp', path)
+
+    @classmethod
+    def load(cls, model=None):
+        path = cls.ensure(model)
+        if path not in cls._models:
+            with open(path, 'rb') as f, MemoryReport().measure('rakuten_model'):
+                cls._models[path] = pickle.load(f)
+        return cls._models[path]
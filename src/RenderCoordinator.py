@@ -0,0 +1,243 @@
+from collections import Counter, deque
+from os import makedirs, replace
+from os.path import dirname, isabs, normpath
+from socketserver import BaseRequestHandler, ThreadingTCPServer
+from threading import Condition, Thread
+from time import monotonic
+
+from src.Metrics import Metrics
+from src.utils.rpc import send_message, receive_message
+
+
+class RenderCoordinator:
+    """
+    Hands parts of the phrasebook out to render workers (see *RenderWorker*) over TCP and stores the tracks they return.
+
+    Parts are taken from the *parts* iterator as workers ask for them. A worker sends heartbeats while rendering,
+    a part gets queued again if its worker disconnects or stays silent longer than *heartbeat_timeout*.
+    A part which fails to render, or whose files can't be stored, is queued again, up to *max_attempts* times,
+    then it's given up and kept in *failed*.
+    The first result of a part wins, later ones are dropped. The coordinator is done when all parts are rendered
+    or given up.
+
+    Messages (dicts signed with the shared secret, see *src.utils.rpc*), worker to coordinator:
+        ``get`` - asks for a part, answered with ``part``, ``wait`` (retry later) or ``done``;
+        ``heartbeat`` - the part is still being rendered;
+        ``result`` - files of the rendered part, relative to *RitmomRoot*;
+        ``error`` - the part failed to render.
+    """
+
+    def __init__(self, app_config, parts, address, secret, heartbeat_timeout=30, on_track=None, max_attempts=3):
+        """
+        :param parts: iterator of tuples of language pair, items and part number
+        :param secret: shared with the workers, frames not signed with it are rejected
+        :param on_track: called with language pair and part number when a track is stored
+        :param max_attempts: failures of a part before it's given up
+        """
+        self.root = app_config['RitmomRoot']
+        self.parts = parts
+        self.address = address
+        self.secret = secret
+        self.heartbeat_timeout = heartbeat_timeout
+        self.on_track = on_track
+        self.max_attempts = max_attempts
+
+        self.condition = Condition()
+        self.pending = deque()  # parts queued again
+        self.in_flight = dict()  # part id -> [part, worker, time of last heartbeat]
+        self.finished = set()
+        self.storing = set()  # part ids whose files are being written
+        self.failures = Counter()  # part id -> failed attempts
+        self.failed = dict()  # part id -> error of the last attempt, for parts given up
+        self.exhausted = False
+        self.done = False
+        self.server = None
+
+    @staticmethod
+    def part_id(part):
+        language_pair, _, part_number = part
+        return f'{language_pair}#{part_number}'
+
+    def _take_part(self, worker):
+        """:return: a part, 'wait' or 'done'"""
+        with self.condition:
+            part = None
+            if self.pending:
+                part = self.pending.popleft()
+            elif not self.exhausted:
+                part = next(self.parts, None)
+                if part is None:
+                    self.exhausted = True
+            if part is None:
+                if not self.in_flight:
+                    self.done = True
+                    self.condition.notify_all()
+                return 'done' if self.done else 'wait'
+            self.in_flight[self.part_id(part)] = [part, worker, monotonic()]
+            return part
+
+    def _heartbeat(self, part_id, worker):
+        with self.condition:
+            entry = self.in_flight.get(part_id, None)
+            if entry is not None and entry[1] == worker:
+                entry[2] = monotonic()
+
+    def _requeue(self, part_id):
+        entry = self.in_flight.pop(part_id)
+        print(f'Part {part_id} is lost by {entry[1]}, queued again')
+        self.pending.append(entry[0])
+
+    def _release_worker(self, worker):
+        with self.condition:
+            for part_id in [part_id for part_id, entry in self.in_flight.items() if entry[1] == worker]:
+                self._requeue(part_id)
+
+    def _check_heartbeats(self):
+        while True:
+            with self.condition:
+                if self.condition.wait_for(lambda: self.done, timeout=self.heartbeat_timeout / 2):
+                    return
+                deadline = monotonic() - self.heartbeat_timeout
+                for part_id in [part_id for part_id, entry in self.in_flight.items() if entry[2] < deadline]:
+                    self._requeue(part_id)
+
+    def _check_done(self):
+        if self.exhausted and not self.pending and not self.in_flight:
+            self.done = True
+            self.condition.notify_all()
+
+    def _fail(self, part_id, error, worker, metrics=None):
+        Metrics().merge(metrics)
+        with self.condition:
+            entry = self.in_flight.get(part_id, None)
+            if entry is None or entry[1] != worker:
+                return
+            del self.in_flight[part_id]
+            self.failures[part_id] += 1
+            if self.failures[part_id] < self.max_attempts:
+                print(f'Part {part_id} failed on {worker}, queued again: {error}')
+                self.pending.append(entry[0])
+            else:
+                print(f'Part {part_id} failed on {worker} {self.failures[part_id]} times, given up: {error}')
+                self.failed[part_id] = error
+            self._check_done()
+
+    def _claim(self, part_id, worker):
+        """:return: the part, now in flight on *worker* until its files are stored, or None if it's taken care of"""
+        with self.condition:
+            if part_id in self.finished or part_id in self.storing:
+                return None
+            entry = self.in_flight.get(part_id, None)
+            if entry is not None:
+                part = entry[0]
+            else:
+                part = next((p for p in self.pending if self.part_id(p) == part_id), None)
+                if part is None:
+                    return None
+                self.pending.remove(part)
+            self.in_flight[part_id] = [part, worker, monotonic()]
+            self.storing.add(part_id)
+            return part
+
+    def _check_paths(self, files, worker):
+        """:return: absolute paths of the uploaded files, all of them are within *root*"""
+        paths = dict()
+        for path, data in files.items():
+            path = normpath(path)
+            if isabs(path) or path.startswith('..'):
+                raise ValueError(f'Bad path "{path}" from {worker}')
+            paths[f'{self.root}/{path}'] = data
+        return paths
+
+    def _store(self, part_id, files, worker, metrics=None):
+        """
+        A part is finished only once all of its files are written,
+        if they can't be, the part fails like one which didn't render
+        """
+        part = self._claim(part_id, worker)
+        if part is None:
+            return
+        try:
+            for path, data in self._check_paths(files, worker).items():
+                makedirs(dirname(path), exist_ok=True)
+                with open(f'{path}.tmp', 'wb') as f:
+                    f.write(data)
+                replace(f'{path}.tmp', path)
+        except (ValueError, OSError) as e:
+            with self.condition:
+                self.storing.discard(part_id)
+            self._fail(part_id, f'{e.__class__.__name__}: {e}', worker, metrics)
+            return
+
+        with self.condition:
+            self.storing.discard(part_id)
+            self.in_flight.pop(part_id, None)
+            if part in self.pending:  # lost meanwhile
+                self.pending.remove(part)
+            self.finished.add(part_id)
+        print(f'Part {part_id} is rendered by {worker}')
+        Metrics().merge(metrics)
+
+        language_pair, _, part_number = part
+        if self.on_track is not None:
+            self.on_track(language_pair, part_number)
+
+        with self.condition:
+            self._check_done()
+
+    def handle(self, sock, worker):
+        try:
+            while True:
+                message = receive_message(sock, self.secret)
+                if message is None:
+                    break
+                if message['type'] == 'get':
+                    part = self._take_part(worker)
+                    if isinstance(part, str):
+                        send_message(sock, {'type': part}, self.secret)
+                    else:
+                        send_message(sock, {'type': 'part', 'id': self.part_id(part), 'part': part}, self.secret)
+                elif message['type'] == 'heartbeat':
+                    self._heartbeat(message['id'], worker)
+                elif message['type'] == 'result':
+                    self._store(message['id'], message['files'], worker, message.get('metrics', None))
+                elif message['type'] == 'error':
+                    self._fail(message['id'], message['error'], worker, message.get('metrics', None))
+        except ValueError as e:
+            print(f'Connection of {worker} is dropped: {e}')
+        finally:
+            self._release_worker(worker)
+
+    def start(self):
+        """
+        Starts listening in a background thread
+        :return: the port, which is useful when *address* has port 0, i.e. any free one
+        """
+        coordinator = self
+
+        class Handler(BaseRequestHandler):
+            def handle(self):
+                host, port = self.client_address[:2]
+                coordinator.handle(self.request, f'{host}:{port}')
+
+        class Server(ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server(self.address, Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        port = self.server.server_address[1]
+        print(f'Render coordinator is listening on {self.address[0]}:{port}')
+        return port
+
+    def wait(self):
+        """Blocks until all parts are rendered, then stops listening"""
+        try:
+            self._check_heartbeats()
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def serve(self):
+        self.start()
+        self.wait()
@@ -0,0 +1,80 @@
+from glob import glob
+from os.path import getmtime, relpath
+from socket import create_connection
+from threading import Event, Lock, Thread
+from time import sleep, time
+from traceback import print_exc
+
+from src.Metrics import Metrics
+from src.utils.rpc import send_message, receive_message
+
+
+class RenderWorker:
+    """
+    Renders parts handed out by *RenderCoordinator* and uploads the resulting files of each track,
+    i.e. ``audio/{pair}/audio{n:03}.*`` and ``text/{pair}/audio{n:03}.*`` relative to *RitmomRoot*,
+    written by this render. If rendering raises, the part is reported as failed instead.
+    """
+
+    mtime_resolution = 2  # seconds, the coarsest one of file systems, FAT
+
+    def __init__(self, address, app_config, render, secret, heartbeat_interval=5):
+        """
+        :param render: callable taking language pair, items and part number, which writes the track files
+        :param secret: shared with the coordinator
+        """
+        self.address = address
+        self.secret = secret
+        self.root = app_config['RitmomRoot']
+        self.render = render
+        self.heartbeat_interval = heartbeat_interval
+        self.send_lock = Lock()
+
+    def _send(self, sock, message):
+        with self.send_lock:
+            send_message(sock, message, self.secret)
+
+    def _send_heartbeats(self, sock, part_id, stop):
+        while not stop.wait(self.heartbeat_interval):
+            self._send(sock, {'type': 'heartbeat', 'id': part_id})
+
+    def _collect_files(self, language_pair, part_number, since):
+        """:param since: time the render started, files of earlier runs are left out"""
+        files = dict()
+        for directory in ('audio', 'text'):
+            for path in glob(f'{self.root}/{directory}/{language_pair}/audio{part_number:03}.*'):
+                if path.endswith('.tmp') or '.tmp.' in path or getmtime(path) < since - self.mtime_resolution:
+                    continue
+                with open(path, 'rb') as f:
+                    files[relpath(path, self.root).replace('\\', '/')] = f.read()
+        return files
+
+    def run(self):
+        with create_connection(self.address) as sock:
+            while True:
+                self._send(sock, {'type': 'get'})
+                message = receive_message(sock, self.secret)
+                if message is None or message['type'] == 'done':
+                    break
+                if message['type'] == 'wait':
+                    sleep(self.heartbeat_interval)
+                    continue
+
+                part_id = message['id']
+                language_pair, items, part_number = message['part']
+                stop = Event()
+                heartbeats = Thread(target=self._send_heartbeats, args=(sock, part_id, stop), daemon=True)
+                heartbeats.start()
+                started = time()
+                try:
+                    self.render(language_pair, items, part_number)
+                except Exception as e:
+                    print_exc()
+                    self._send(sock, {'type': 'error', 'id': part_id, 'metrics': Metrics().take(),
+                                      'error': f'{e.__class__.__name__}: {e}'})
+                    continue
+                finally:
+                    stop.set()
+                    heartbeats.join()
+                self._send(sock, {'type': 'result', 'id': part_id, 'metrics': Metrics().take(),
+                                  'files': self._collect_files(language_pair, part_number, started)})
@@ -1,10 +1,22 @@
 from urllib.request import urlopen
 from shutil import copyfileobj
 from tempfile import NamedTemporaryFile
-from os.path import exists, abspath
+from os.path import exists, abspath, isabs
 
 
 class Resource:
+    configured = dict()  # name -> arguments of a resource of the **resource** config section, see *configure*
+
+    @classmethod
+    def configure(cls, app_config):
+        """
+        Takes resources of the config, relative destinations are resolved against RitmomRoot,
+        so every process finds a resource where the parent has put it, whatever the working directory is
+        """
+        root = app_config['RitmomRoot']
+        cls.configured = {name: dict(resource, destination=resource['destination']
+                                     if isabs(resource['destination']) else f'{root}/{resource["destination"]}')
+                          for name, resource in app_config.get('resource', dict()).items()}
 
     def __init__(self, url, destination, description):
         self.url = url
@@ -12,7 +24,7 @@ class Resource:
         self.description = description
 
     def _download(self):
-        with urlopen(self) as f_src, open(self.destination, 'wb') as f_dst:
+        with urlopen(self.url) as f_src, open(self.destination, 'wb') as f_dst:
             copyfileobj(f_src, f_dst)
 
     def ensure(self):
@@ -0,0 +1,90 @@
+from datetime import datetime
+from hashlib import blake2b
+from json import dumps, loads
+from os import makedirs, replace
+from os.path import exists, getsize
+
+
+class RunJournal:
+    """
+    Append-only log of the states parts of a run went through, so an interrupted run can be resumed.
+
+    A part is ``queued`` for rendering, then its .wav is ``synthesized``, then ``encoded`` to .mp3, and finally
+    ``verified`` once the final file is checked. Every state is a JSON line appended by the process which did
+    the work, a line is written with a single call, so lines of processes don't interleave.
+    A new run starts a new journal, the previous one is kept as ``journal.jsonl.old``.
+    """
+
+    states = ('queued', 'synthesized', 'encoded', 'verified')
+
+    def __init__(self, app_config):
+        self.root = app_config['RitmomRoot']
+        self.path = f'{self.root}/cache/journal.jsonl'
+        makedirs(f'{self.root}/cache', exist_ok=True)
+
+    @staticmethod
+    def digest(items):
+        """Identifies content of a part, so a part is only resumed if the phrasebook gave the same entries"""
+        return blake2b(repr(items).encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_audio_path(self, language_pair, part_number, extension):
+        return f'{self.root}/audio/{language_pair}/audio{part_number:03}.{extension}'
+
+    def start(self):
+        """Starts the journal of a new run"""
+        if exists(self.path):
+            replace(self.path, f'{self.path}.old')
+
+    def record(self, language_pair, part_number, state, digest=None):
+        entry = dict(pair=language_pair, part=part_number, state=state, time=datetime.utcnow().isoformat())
+        if digest is not None:
+            entry['digest'] = digest
+        with open(self.path, mode='a', encoding='utf-8') as f:
+            f.write(f'{dumps(entry)}\n')
+
+    def _is_valid(self, path):
+        return exists(path) and getsize(path) > 0
+
+    def synthesized(self, language_pair, part_number, only_wav):
+        self.record(language_pair, part_number, 'synthesized')
+        if only_wav and self._is_valid(self.get_audio_path(language_pair, part_number, 'wav')):
+            self.record(language_pair, part_number, 'verified')
+
+    def encoded(self, language_pair, part_number):
+        self.record(language_pair, part_number, 'encoded')
+        if self._is_valid(self.get_audio_path(language_pair, part_number, 'mp3')):
+            self.record(language_pair, part_number, 'verified')
+
+    def load(self):
+        """:return: (language pair, part number) -> [digest, last state]"""
+        parts = dict()
+        if not exists(self.path):
+            return parts
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = loads(line)
+                except ValueError:
+                    continue  # the last line of a crashed run can be cut
+                key = entry['pair'], entry['part']
+                if entry['state'] == 'queued':
+                    parts[key] = [entry.get('digest', None), 'queued']
+                elif key in parts:
+                    parts[key][1] = entry['state']
+        return parts
+
+    def get_resume_state(self, parts, language_pair, items, part_number, only_wav):
+        """
+        :param parts: as returned by *load*
+        :return: 'verified' if the part is done, 'synthesized' if it only needs encoding, None to render it again
+        """
+        digest, state = parts.get((language_pair, part_number), (None, None))
+        if digest != self.digest(items):
+            return None
+        final_extension = 'wav' if only_wav else 'mp3'
+        if state == 'verified' and self._is_valid(self.get_audio_path(language_pair, part_number, final_extension)):
+            return 'verified'
+        if state in ('synthesized', 'encoded', 'verified') and \
+                self._is_valid(self.get_audio_path(language_pair, part_number, 'wav')):
+            return 'synthesized'
+        return None
@@ -1,11 +1,18 @@
 from itertools import repeat
 from operator import contains
 from functools import partial
+from threading import Thread
 from comtypes.client import CreateObject
+import attr
 
 from src.SequenceDemultiplexor import SequenceDemultiplexor
-from src.Sequencer import Sequencer, JingleChunk, SpeechChunk, FilterControlChunk
-from src.PhraseExamples import PhraseExamples
+from src.Sequencer import Sequencer, StreamingSequencer, SequencerAborted, JingleChunk, SpeechChunk, \
+    FilterControlChunk, TextChunk, SegmentChunk
+from src.SequencePlan import SequencePlan
+from src.FilterCache import FilterCache
+from src.Metrics import Metrics
+from src.MemoryReport import MemoryReport
+from src.Profiler import Profiler
 from src.filter.AddVoice import AddVoice
 from src.filter.PronounceByLetter import PronounceByLetter
 
@@ -13,13 +20,17 @@ from src.utils.config import split_name_pair
 
 
 class SequenceBuilder:
-    def __init__(self, *, app_config, encode_queue, only_wav, dump_sequencer_log):
+    def __init__(self, *, app_config, encode_queue, only_wav, dump_sequencer_log, postprocess_queue=None):
         languages = app_config['languages']
         self.app_config = app_config
         self.dump_sequencer_log = dump_sequencer_log
 
-        self.info_engine = CreateObject("SAPI.SpVoice")
+        memory_report = MemoryReport()
+        with memory_report.measure('speech_engine'):
+            self.info_engine = CreateObject("SAPI.SpVoice")
         self.voices = dict()
+        self.voice_items = dict()  # resolved once here, so a producer thread never calls into COM
+        self.plans = dict()
 
         self.voices_com = voices = self.info_engine.GetVoices()
         for language_pair in languages:
@@ -38,132 +49,174 @@ class SequenceBuilder:
             has_voice = partial(contains, self.voices[language_pair])
             assert all(map(has_voice, ['foreign1', 'foreign2', 'native']))
 
-        self.phrase_examples = PhraseExamples(app_config)
-        self.sequencer = Sequencer()
-        self.chunk_demultiplexor = SequenceDemultiplexor(app_config, self.sequencer, encode_queue, only_wav)
+            self.voice_items[language_pair] = {purpose: voices.Item(self.voices[language_pair][purpose])
+                                               for purpose in ('foreign1', 'foreign2', 'native')}
+            self.plans[language_pair] = SequencePlan(app_config['pattern'], self.voices[language_pair])
+
+        streaming = app_config.get('streaming', dict())
+        self.streaming = streaming.get('enabled', False)
+
+        self._phrase_examples = None  # built on the first enrichment, so nltk is only imported if needed
+        self.filter_cache = FilterCache(app_config)
+        normalization = app_config.get('normalization', None)
+        language_names = {name for language_pair in languages for name in split_name_pair(language_pair)}
+        with memory_report.measure('sequencer'):
+            self.sequencer = StreamingSequencer(streaming['buffer_size'], self.filter_cache, normalization,
+                                                language_names) \
+                if self.streaming else Sequencer(self.filter_cache, normalization, language_names)
+        with memory_report.measure('demultiplexor'):
+            self.chunk_demultiplexor = SequenceDemultiplexor(app_config, self.sequencer, encode_queue, only_wav,
+                                                             postprocess_queue)
+
+    @property
+    def phrase_examples(self):
+        if self._phrase_examples is None:
+            from src.PhraseExamples import PhraseExamples
+            with MemoryReport().measure('phrase_examples'):
+                self._phrase_examples = PhraseExamples(self.app_config)
+        return self._phrase_examples
 
     def make_audio_track(self, language_pair, lines, track_num):
+        if language_pair not in self.app_config['languages']:
+            return
+
         self.chunk_demultiplexor.start_section(language_pair, track_num)
 
-        for word, translation in lines:
-            if language_pair not in self.app_config['languages']:
+        if self.streaming:
+            self._stream_track(language_pair, lines, track_num)
+        else:
+            self._sequence_track(language_pair, lines)
+            self._feed_demultiplexor(language_pair, track_num)
+
+        self.chunk_demultiplexor.stop_section()
+        self.filter_cache.flush()
+
+    def _stream_track(self, language_pair, lines, track_num):
+        """
+        Enrichment and filtering run in a producer thread, while this thread keeps
+        feeding the demultiplexor, so TTS of a word overlaps preparation of the next one
+        """
+        def produce():
+            try:
+                with Profiler.thread('producer'):
+                    self._sequence_track(language_pair, lines)
+            except SequencerAborted:
                 return
+            except Exception as e:
+                self.sequencer.close(error=e)
+            else:
+                self.sequencer.close()
+
+        self.sequencer.open()
+        producer = Thread(target=produce, name=f'sequencer-{language_pair}-{track_num}', daemon=True)
+        producer.start()
+        try:
+            self._feed_demultiplexor(language_pair, track_num)
+        except BaseException:
+            self.sequencer.abort()
+            raise
+        finally:
+            producer.join()
+
+    def _feed_demultiplexor(self, language_pair, track_num):
+        if not self.dump_sequencer_log:
+            for chunk in self.sequencer:
+                self.chunk_demultiplexor.feed(chunk)
+            return
 
-            native_name = self.voices[language_pair]['native_name']
-            foreign_name = self.voices[language_pair]['foreign_name']
+        with open(f'text/{language_pair}/audio{track_num:03}.log', mode='wt', encoding='utf-8') as f:
+            for chunk in self.sequencer:
+                f.write(repr(chunk))
+                f.write('\n')
+                self.chunk_demultiplexor.feed(chunk)
 
-            # Say a phrase with both male and female narrators
-            for voice_num in range(1, 3):
-                first_pass = voice_num == 1
-                voice_foreign = self.voices_com.Item(self.voices[language_pair][f'foreign{voice_num}'])
-                voice_native = self.voices_com.Item(self.voices[language_pair]['native'])
-                self.sequencer << FilterControlChunk(instant=True,
-                                                     target=AddVoice,
-                                                     attribute='default_voices',
-                                                     value={foreign_name: voice_foreign, native_name: voice_native})
-                
-                if first_pass:
-                    self.sequencer << JingleChunk(jingle='timestamp')
+    def _sequence_track(self, language_pair, lines):
+        if 'japanese' in (self.voices[language_pair]['foreign_name'], self.voices[language_pair]['native_name']):
+            self._analyze_japanese(language_pair, lines)
 
-                voice = voice_foreign
+        for word, translation in lines:
+            self._sequence_word(language_pair, word, translation)
 
-                self.sequencer << FilterControlChunk(instant=True, target=PronounceByLetter,
-                                                     attribute='enabled', value=True)
+        self.sequencer << JingleChunk(jingle='end_of_part', volume=20)
 
-                self.sequencer << SpeechChunk(text=word, language=foreign_name, final=not first_pass,
-                                              rate=-6, volume=100, voice=voice, printable=first_pass)
+    def _analyze_japanese(self, language_pair, lines):
+        """Tags all Japanese texts of a track in one batch, filters pick the results up later"""
+        from src.JapaneseAnalyzer import JapaneseAnalyzer
 
+        foreign_name = self.voices[language_pair]['foreign_name']
+        texts = list()
+        for word, translation in lines:
+            if foreign_name == 'japanese':
+                texts.append(word)
+            texts.extend(chunk.text for chunk in translation or list()
+                         if isinstance(chunk, TextChunk) and chunk.language == 'japanese')
+        JapaneseAnalyzer().analyze_many(texts)
+
+    def _sequence_word(self, language_pair, word, translation):
+        native_name = self.voices[language_pair]['native_name']
+        foreign_name = self.voices[language_pair]['foreign_name']
+        voice_items = self.voice_items[language_pair]
+        enrichments = dict()  # looked up only if the plan asks for them
+
+        for step in self.plans[language_pair]:
+            if step.kind == 'jingle':
+                self.sequencer << JingleChunk(jingle=step.jingle, volume=step.volume, printable=step.printable)
+                continue
+
+            segment = (word, step.segment)
+            if step.replay:
+                self.sequencer << SegmentChunk(segment=segment, action='replay')
+                continue
+
+            voice_foreign = voice_items['foreign1' if step.voice == 'native' else step.voice]
+            voice_native = voice_items['native']
+            self.sequencer << FilterControlChunk(instant=True,
+                                                 target=AddVoice,
+                                                 attribute='default_voices',
+                                                 value={foreign_name: voice_foreign, native_name: voice_native})
+            if step.record:
+                self.sequencer << SegmentChunk(segment=segment, action='record')
+
+            if step.kind == 'word':
+                self.sequencer << FilterControlChunk(instant=True, target=PronounceByLetter,
+                                                     attribute='enabled', value=True)
+                self.sequencer << SpeechChunk(text=word, language=foreign_name, final=not step.filtered,
+                                              rate=step.rate, volume=step.volume, voice=voice_foreign,
+                                              printable=step.printable)
                 self.sequencer << FilterControlChunk(instant=True, target=PronounceByLetter,
                                                      attribute='enabled', value=False)
-
-                self.sequencer << JingleChunk(jingle='silence_long', printable=first_pass)
-
-                if translation:
-                    # trans = trans.replace('~', word)
-                    # trans = '; '.join(sorted(set(map(str.strip, trans.split(';')))))
-                    for chunk in translation:
-                        spoken = chunk.promote(SpeechChunk, rate=0, volume=60, printable=first_pass)
-                        self.sequencer << spoken \
-                                       << JingleChunk(jingle='silence', printable=first_pass)
-
-                self.sequencer << JingleChunk(jingle='silence_long', printable=first_pass)
-
+            elif step.kind == 'translation':
+                for n, chunk in enumerate(translation or list()):
+                    if n:
+                        self.sequencer << JingleChunk(jingle='silence', printable=step.printable)
+                    self.sequencer << chunk.promote(SpeechChunk, rate=step.rate, volume=step.volume,
+                                                    printable=step.printable, final=not step.filtered)
+            else:
+                if step.kind not in enrichments:
+                    enrichments.update(self._get_enrichments(foreign_name, word))
+                for item in enrichments[step.kind]:
+                    if isinstance(item, JingleChunk):
+                        item = attr.evolve(item, printable=step.printable)
+                    else:
+                        foreign = item.language == foreign_name
+                        volume = step.volume if foreign or step.native_volume is None else step.native_volume
+                        item = item.promote(SpeechChunk, rate=step.rate, volume=volume,
+                                            voice=voice_foreign if foreign else voice_native,
+                                            final=not step.filtered, printable=step.printable)
+                    self.sequencer << item
+
+            if step.record:
+                self.sequencer << SegmentChunk(segment=segment, action='stop')
+
+    def _get_enrichments(self, foreign_name, word):
+        with Metrics().timer('enrichment.definitions_and_examples'):
             word_info = self.phrase_examples.get_definitions_and_examples(word, foreign_name)
-            if word_info:
-                for voice_num in range(1, 3):
-                    first_pass = voice_num == 1
-                    voice_foreign = self.voices_com.Item(self.voices[language_pair][f'foreign{voice_num}'])
-                    voice_native = self.voices_com.Item(self.voices[language_pair]['native'])
-                    self.sequencer << FilterControlChunk(instant=True,
-                                                         target=AddVoice,
-                                                         attribute='default_voices',
-                                                         value={foreign_name: voice_foreign, native_name: voice_native})
-
-                    for definition in word_info.definitions:
-                        voice = voice_foreign
-                        if not isinstance(definition, JingleChunk):
-                            definition = definition.promote(SpeechChunk, rate=0, volume=100, voice=voice, final=True)
-                            definition.final = not first_pass
-                        definition.printable = first_pass
-                        self.sequencer << definition
-
-                    for example in word_info.examples:
-                        if not isinstance(example, JingleChunk):
-                            if example.language == foreign_name:
-                                voice = voice_foreign
-                                volume = 100
-                            else:
-                                voice = voice_native
-                                volume = 75
-                            example = example.promote(SpeechChunk, rate=0, volume=volume, voice=voice, final=True)
-                            example.final = not first_pass
-                        example.printable = first_pass
-                        self.sequencer << example
-
-                    for synonym in word_info.synonyms:
-                        voice = voice_foreign
-                        if not isinstance(synonym, JingleChunk):
-                            synonym = synonym.promote(SpeechChunk, rate=0, volume=100, voice=voice, final=True)
-                            synonym.final = not first_pass
-                        synonym.printable = first_pass
-                        self.sequencer << synonym
-
-                    for antonym in word_info.antonyms:
-                        voice = voice_foreign
-                        if not isinstance(antonym, JingleChunk):
-                            antonym = antonym.promote(SpeechChunk, rate=0, volume=100, voice=voice, final=True)
-                            antonym.final = not first_pass
-                        antonym.printable = first_pass
-                        self.sequencer << antonym
-
-                    excerpts = self.phrase_examples.search_excerpt(self.app_config, foreign_name, word)
-                    if excerpts is not None:
-                        for excerpt in excerpts:
-                            if not isinstance(excerpt, JingleChunk):
-                                voice = voice_foreign
-                                excerpt = excerpt.promote(SpeechChunk, rate=0, volume=100, voice=voice, final=True)
-                                excerpt.final = not first_pass
-                            excerpt.printable = first_pass
-                            self.sequencer << excerpt
-
-            self.sequencer << JingleChunk(jingle='silence_long')
-            self.sequencer << JingleChunk(jingle='silence_long', printable=False)
-
-        self.sequencer << JingleChunk(jingle='end_of_part', volume=20)
-        
-        if self.dump_sequencer_log:
-            def interleave_with_newline(iterator):
-                for item in iterator:
-                    yield item
-                    yield '\n'
-
-            sequencer_commands = map(repr, self.sequencer.queue)
-            with open(f'text/{language_pair}/audio{track_num:03}.log', mode='wt', encoding='utf-8') as f:
-                f.writelines(interleave_with_newline(reversed(list(sequencer_commands))))
-
-        while len(self.sequencer):
-            chunk = self.sequencer.pop()
-            if chunk:
-                self.chunk_demultiplexor.feed(chunk)
-
-        self.chunk_demultiplexor.stop_section()
+        with Metrics().timer('enrichment.excerpts'):
+            excerpts = self.phrase_examples.search_excerpt(self.app_config, foreign_name, word)
+        return {
+            'definitions': word_info.definitions,
+            'examples': word_info.examples,
+            'synonyms': word_info.synonyms,
+            'antonyms': word_info.antonyms,
+            'excerpts': excerpts or list(),
+        }
@@ -1,29 +1,49 @@
 from datetime import datetime
-from enum import IntEnum
-from os import mkdir
+from os import mkdir, replace
 
 from comtypes.client import CreateObject
 from comtypes.gen import SpeechLib
 
 from src.AudioJingles import AudioJingles
-from src.Sequencer import AudioChunkMixin, Chunk, SpeechChunk, TextChunk, JingleChunk
+from src.CueSheet import CueSheet
+from src.LetterBank import LetterBank
+from src.Metrics import Metrics
+from src.RunJournal import RunJournal
+from src.Sequencer import AudioChunkMixin, Chunk, SpeechChunk, TextChunk, JingleChunk, LetterChunk, SegmentChunk
 from src.TextBuilder import TextBuilder
 
 
-class SpeechStreamSeekPositionType(IntEnum):
-    SSSPTRelativeToStart = 0
-    SSSPTRelativeToCurrentPosition = 1
-    SSSPTRelativeToEnd = 2
-
-
 class SequenceDemultiplexor:
-    def __init__(self, app_config, sequencer, encode_queue, only_wav):
-        self.text_builder = TextBuilder(app_config)
+    """
+    Renders chunks into a track: audio goes to a .wav file, printable text to *TextBuilder*.
+    All audio is rendered to memory first and then written to the track, so the position in the track
+    is counted in bytes rather than asked from the stream, which gives exact timing for the cue sheets.
+    """
+
+    def __init__(self, app_config, sequencer, encode_queue, only_wav, postprocess_queue=None):
+        self.text_builder = TextBuilder(app_config, postprocess_queue)
         self.sequencer = sequencer
         self.sounds = AudioJingles(app_config['jingles'])
         self.text_jingles = app_config['text_jingles']
         self.only_wav = only_wav
         self.encode_queue = encode_queue
+        self.journal = RunJournal(app_config)
+        self.metrics = Metrics()
+        self.letter_bank = LetterBank() if app_config.get('letter_bank', False) else None
+        self.segments = dict()  # audio of recorded segments, kept within a track
+        self.output = None  # the track stream, or a memory stream while a segment is recorded
+        self.recording = None
+        self.voice_affinity = app_config.get('render', dict()).get('voice_affinity', False)
+        if self.voice_affinity and app_config.get('streaming', dict()).get('enabled', False):
+            # affinity keeps every chunk of the track until its end, which undoes streaming's overlap and flat memory
+            print('Warning: render.voice_affinity is ignored, as streaming.enabled is set, they exclude each other')
+            self.voice_affinity = False
+        self.timeline = list()  # chunks of the track, when rendering with voice affinity
+        self.rendered = dict()  # id of chunk -> synthesized audio, when rendering with voice affinity
+        self.cue_formats = app_config.get('cues', list())
+        self.cue_sheet = None
+        self.position = 0  # bytes of audio written to the track
+        self.bytes_per_second = None
 
     def _start_conversion_process(self, language_pair, fn):
         self.encode_queue.put((language_pair, fn))
@@ -37,7 +57,8 @@ class SequenceDemultiplexor:
             mkdir(f'audio/{language_pair}')
         except OSError:
             pass
-        stream.Open(f'audio/{language_pair}/audio{fn:03}.wav', SpeechLib.SSFMCreateForWrite)
+        # The track takes its name only when complete, see stop_section
+        stream.Open(f'audio/{language_pair}/audio{fn:03}.tmp.wav', SpeechLib.SSFMCreateForWrite)
         engine.AudioOutputStream = stream
         return engine, stream
 
@@ -45,46 +66,176 @@ class SequenceDemultiplexor:
         self.language_pair = language_pair
         self.track_num = track_num
         self.engine, self.stream = self._get_engine(language_pair, track_num)
+        self.format_type = self.stream.Format.Type
+        self.bytes_per_second = self.stream.Format.GetWaveFormatEx().AvgBytesPerSec
+        self.output = self.stream
+        self.position = 0
+        self.segments.clear()
+        self.cue_sheet = CueSheet()
         self.text_builder.open(language_pair, track_num)
 
     def stop_section(self):
+        if self.voice_affinity:
+            self._render_timeline()
+        self.segments.clear()
         self.stream.Close()
+        with self.metrics.timer('text.write'):
+            self.text_builder.close()
+        if self.cue_formats:
+            self.cue_sheet.write(f'audio/{self.language_pair}/audio{self.track_num:03}', self.cue_formats)
+        replace(f'audio/{self.language_pair}/audio{self.track_num:03}.tmp.wav',
+                f'audio/{self.language_pair}/audio{self.track_num:03}.wav')
+        self.journal.synthesized(self.language_pair, self.track_num, self.only_wav)
         if not self.only_wav:
             self._start_conversion_process(self.language_pair, self.track_num)
 
     def get_time(self):
-        wf = self.stream.Format.GetWaveFormatEx()
-        stream_position_divider = int(wf.SamplesPerSec * (wf.BitsPerSample // 8))
-        stream_position_bytes = self.stream.Seek(0, SpeechStreamSeekPositionType.SSSPTRelativeToCurrentPosition)
-        stream_position_seconds = stream_position_bytes // stream_position_divider
-        return stream_position_seconds
+        """Seconds of audio in the track so far"""
+        return self.position / self.bytes_per_second
+
+    def _new_memory_stream(self):
+        memory_stream = CreateObject("SAPI.SpMemoryStream")
+        memory_stream.Format.Type = self.format_type
+        return memory_stream
+
+    def _write(self, data):
+        self.output.Write(data)
+        self.position += len(data)
+
+    def _synthesize(self, text):
+        memory_stream = self._new_memory_stream()
+        self.engine.AudioOutputStream = memory_stream
+        with self.metrics.timer('tts.speak'):
+            self.engine.Speak(text)
+        self.metrics.count('tts.characters', len(text))
+        return memory_stream.GetData()
+
+    def _print(self, text, start, language=None):
+        end = self.get_time()
+        self.text_builder.speak(text, language, start, end)
+        self.cue_sheet.add(text, start, end)
+
+    @staticmethod
+    def _sets_engine(chunk: JingleChunk):
+        """Whether the jingle leaves its rate and volume to the engine, so chunks without their own inherit them"""
+        return chunk.jingle != 'timestamp' and chunk.audible and isinstance(chunk, AudioChunkMixin)
 
     def speak_jingle(self, chunk):
         jingle_name = chunk.jingle
-        if jingle_name == 'timestamp' and chunk.printable:
-            t = datetime.utcfromtimestamp(self.get_time())
-            self.text_builder.speak(f'{t.strftime("%H:%M:%S")}\n')
+        if jingle_name == 'timestamp':  # text only, there is no sound, so nothing to do for a repeated step
+            if chunk.printable:
+                position = self.get_time()
+                t = datetime.utcfromtimestamp(int(position))
+                self.text_builder.speak(f'{t.strftime("%H:%M:%S")}\n', start=position, end=position)
             return
+        start = self.get_time()
+        if self._sets_engine(chunk):
+            self.engine.Volume = chunk.volume
+            self.engine.Rate = chunk.rate
         if chunk.audible:
-            if isinstance(chunk, AudioChunkMixin):
-                self.engine.Volume = chunk.volume
-                self.engine.Rate = chunk.rate
-            self.engine.SpeakStream(self.sounds[jingle_name])
+            with self.metrics.timer('jingle'):
+                data = self.sounds.get_data(jingle_name, self.engine.Volume, self.engine.Rate, self.format_type)
+            self._write(data)
         if chunk.printable:
-            self.text_builder.speak(self.text_jingles[jingle_name])
+            self._print(self.text_jingles[jingle_name], start)
 
     def speak_audio(self, chunk: Chunk):
+        if id(chunk) in self.rendered:
+            self._write(self.rendered[id(chunk)])
+            return
         if isinstance(chunk, SpeechChunk):
             self.engine.Rate = chunk.rate
             self.engine.Volume = chunk.volume
             self.engine.Voice = chunk.voice
-        self.engine.Speak(chunk.text)
+        self._write(self._synthesize(chunk.text))
+
+    def speak_letter(self, chunk: LetterChunk):
+        data = None
+        if self.letter_bank is not None:
+            data = self.letter_bank.get(chunk.text, chunk.voice, chunk.rate, chunk.volume, self.format_type)
+        if data is None:
+            self.metrics.count('letter_bank.misses')
+            self.speak_audio(chunk)
+        else:
+            self.metrics.count('letter_bank.hits')
+            self._write(data)
+
+    def start_recording(self, segment):
+        self.output = self._new_memory_stream()
+        self.recording = segment
+
+    def stop_recording(self):
+        data = self.output.GetData()
+        self.segments[self.recording] = data
+        self.output = self.stream
+        self.stream.Write(data)  # already counted while recording
+        self.recording = None
+
+    def replay(self, segment):
+        self._write(self.segments[segment])
+
+    def feed_segment(self, chunk: SegmentChunk):
+        if chunk.action == 'record':
+            self.start_recording(chunk.segment)
+        elif chunk.action == 'stop':
+            self.stop_recording()
+        elif chunk.action == 'replay':
+            self.replay(chunk.segment)
+
+    def _is_synthesized(self, chunk):
+        if not isinstance(chunk, TextChunk) or not chunk.audible:
+            return False
+        return not isinstance(chunk, LetterChunk) or self.letter_bank is None or not self.letter_bank.has(chunk.text)
+
+    def _synthesize_by_voice(self, timeline):
+        """
+        Synthesizes all utterances of the timeline grouped by voice, so the engine switches
+        to each voice once per track rather than on almost every chunk.
+        Chunks without a voice of their own inherit the engine state left by preceding chunks,
+        just like they would when spoken one by one.
+        """
+        groups = dict()  # voice id -> list of (chunk, voice, rate, volume)
+        voice, rate, volume = self.engine.Voice, self.engine.Rate, self.engine.Volume
+        for chunk in timeline:
+            if isinstance(chunk, JingleChunk) and self._sets_engine(chunk):
+                rate, volume = chunk.rate, chunk.volume
+            if not self._is_synthesized(chunk):
+                continue
+            if isinstance(chunk, SpeechChunk):
+                voice, rate, volume = chunk.voice, chunk.rate, chunk.volume
+            groups.setdefault(voice.Id, list()).append((chunk, voice, rate, volume))
+
+        for utterances in groups.values():
+            self.engine.Voice = utterances[0][1]
+            for chunk, _, rate, volume in utterances:
+                self.engine.Rate = rate
+                self.engine.Volume = volume
+                self.rendered[id(chunk)] = self._synthesize(chunk.text)
+
+    def _render_timeline(self):
+        """Places synthesized utterances, jingles and text into the track in the sequence order"""
+        timeline, self.timeline = self.timeline, list()
+        self._synthesize_by_voice(timeline)
+        for chunk in timeline:
+            self._feed(chunk)
+        self.rendered.clear()
 
     def feed(self, chunk: Chunk):
+        if self.voice_affinity:
+            self.timeline.append(chunk)
+        else:
+            self._feed(chunk)
+
+    def _feed(self, chunk: Chunk):
         if isinstance(chunk, TextChunk):
-            if chunk.audible:
+            start = self.get_time()
+            if chunk.audible and isinstance(chunk, LetterChunk):
+                self.speak_letter(chunk)
+            elif chunk.audible:
                 self.speak_audio(chunk)
             if chunk.printable:
-                self.text_builder.speak(chunk.text)
+                self._print(chunk.text, start, chunk.language)
         elif isinstance(chunk, JingleChunk):
-            self.speak_jingle(chunk)
\ No newline at end of file
+            self.speak_jingle(chunk)
+        elif isinstance(chunk, SegmentChunk):
+            self.feed_segment(chunk)
\ No newline at end of file
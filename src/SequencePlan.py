@@ -0,0 +1,90 @@
+from collections import Counter
+from typing import List
+
+import attr
+
+
+@attr.s(frozen=True)
+class PlanStep:
+    kind = attr.ib(type=str)  # 'jingle', 'word', 'translation' or one of SequencePlan.enrichments
+    jingle = attr.ib(type=str, default=None)
+    voice = attr.ib(type=str, default=None)  # purpose of the voice, i.e. 'foreign1', 'foreign2', 'native'
+    rate = attr.ib(type=int, default=0)
+    volume = attr.ib(type=int, default=100)
+    native_volume = attr.ib(type=int, default=None)  # of enrichment items in the native language, *volume* if None
+    printable = attr.ib(type=bool, default=True)
+    filtered = attr.ib(type=bool, default=True)  # whether chunks go through the filters, i.e. aren't final
+    segment = attr.ib(default=None)  # key of the rendered audio, same keys mean same audio
+    record = attr.ib(type=bool, default=False)  # audio is kept to be replayed by a later step
+    replay = attr.ib(type=bool, default=False)  # audio of an earlier step is reused instead of synthesis
+
+
+class SequencePlan:
+    """
+    The **pattern** config section compiled for a language pair.
+
+    A pattern is a list of steps: ``{"jingle": "silence"}``, ``{"speak": "foreign1", "rate": -6, "volume": 100}``
+    to say the word with a voice, ``{"speak": "native", ...}`` to say the translation and
+    ``{"speak": "definitions", "voice": "foreign2", ...}`` to say one of *enrichments*; items of an enrichment
+    in the native language, e.g. translations of examples, are said at ``native_volume``, if it's given.
+    The first time some content is said it's printed and filtered; a step which would render exactly
+    the same audio as an earlier step (same content, voice, rate, volume and filtering)
+    replays the audio of that step instead.
+    """
+
+    voice_purposes = ('foreign1', 'foreign2', 'native')
+    enrichments = ('definitions', 'examples', 'synonyms', 'antonyms', 'excerpts')
+
+    def __init__(self, pattern, voices):
+        """
+        :param pattern: list of steps from config
+        :param voices: voice purpose -> voice index, so identical voices of different purposes are recognized
+        """
+        self.steps: List[PlanStep] = self._compile(pattern, voices)
+
+    @classmethod
+    def _compile(cls, pattern, voices):
+        steps = list()
+        said = set()
+        printable = True
+        for step in pattern:
+            if 'jingle' in step:
+                steps.append(PlanStep(kind='jingle', jingle=step['jingle'], volume=step.get('volume', 50),
+                                      printable=printable))
+                continue
+
+            content = step['speak']
+            if content in cls.voice_purposes:
+                kind = 'translation' if content == 'native' else 'word'
+                voice = content
+            elif content in cls.enrichments:
+                kind = content
+                voice = step.get('voice', 'foreign1')
+            else:
+                raise ValueError(f'Unknown pattern step: {step}')
+
+            printable = kind not in said
+            # The word is spelled out and decorated only for the first time, the rest is filtered each time
+            filtered = printable or kind != 'word'
+            said.add(kind)
+
+            rate, volume = step.get('rate', 0), step.get('volume', 100)
+            native_volume = step.get('native_volume', None) if kind in cls.enrichments else None
+            segment = (kind, voices[voice], rate, volume, native_volume, filtered)
+            steps.append(PlanStep(kind=kind, voice=voice, rate=rate, volume=volume, native_volume=native_volume,
+                                  printable=printable, filtered=filtered, segment=segment))
+
+        occurrences = Counter(step.segment for step in steps if step.segment is not None)
+        seen = set()
+        for n, step in enumerate(steps):
+            if step.segment is None or occurrences[step.segment] < 2:
+                continue
+            if step.segment in seen:
+                steps[n] = attr.evolve(step, replay=True)
+            else:
+                steps[n] = attr.evolve(step, record=True)
+                seen.add(step.segment)
+        return steps
+
+    def __iter__(self):
+        return iter(self.steps)
@@ -1,11 +1,12 @@
 from collections import deque, Iterable
+from queue import Queue, Full
 from typing import Deque, List
 import attr
 
-from src.filter.AddFurigana import AddFurigana
+from src.Metrics import Metrics
 from src.filter.AddVoice import AddVoice
 from src.filter.BaseFilter import BaseFilter
-from src.filter.ExplainKanji import ExplainKanji
+from src.filter.ExpandContractions import ExpandContractions
 from src.filter.PronounceByLetter import PronounceByLetter
 from src.filter.StubFinalizer import StubFinalizer
 from src.utils.lists import flatten
@@ -91,6 +92,25 @@ class SpeechChunk(AudioChunkMixin, TextChunk):
         return f'{qualname}({", ".join([f"{name}={value}" for name, value in result])})'
 
 
+@attr.s(repr=False)
+class LetterChunk(SpeechChunk):
+    """A single symbol of a word being spelled out, taken from *LetterBank* instead of TTS"""
+    ...
+
+
+@attr.s
+class SegmentChunk(Chunk):
+    """
+    Marks a segment of audio: *record* keeps what's rendered until *stop*,
+    *replay* writes the kept audio once more instead of synthesizing it again
+    """
+    segment = attr.ib(default=None)
+    action = attr.ib(type=str, default=None)  # 'record', 'stop' or 'replay'
+    audible = attr.ib(type=bool, default=True)
+    printable = attr.ib(type=bool, default=False)
+    final = attr.ib(type=bool, default=True)
+
+
 @attr.s
 class JingleChunk(AudioChunkMixin, Chunk):
     jingle = attr.ib(type=str, default=None)
@@ -98,8 +118,9 @@ class JingleChunk(AudioChunkMixin, Chunk):
 
 
 class ChunkProcessor:
-    def __init__(self, filters=list()):
+    def __init__(self, filters=list(), cache=None):
         self.filters = filters
+        self.cache = cache  # FilterCache for pure filters
 
     def apply_filters(self, chunk: Chunk) -> List[Chunk]:
         result = [chunk]
@@ -111,25 +132,43 @@ class ChunkProcessor:
                     continue
                 new_result = list()
                 for chunk in result:
-                    new_result.extend([chunk] if chunk.final or not isinstance(chunk, TextChunk) else f(chunk))
+                    new_result.extend([chunk] if chunk.final or not isinstance(chunk, TextChunk)
+                                      else self._call_filter(f, chunk))
                 result = new_result
             result_is_final = all(map(lambda c: c.final, result))
 
         return result
 
+    def _call_filter(self, f, chunk):
+        with Metrics().timer(f'filter.{f.__class__.__name__}'):
+            if self.cache is None or not self.cache.enabled or not f.pure:
+                return f(chunk)
+            return self.cache.apply(f, chunk)
+
 
 class Sequencer:
-    def __init__(self):
+    def __init__(self, filter_cache=None, normalization=None, languages=None):
+        """
+        :param languages: names of the languages of configured pairs, filters specific to other languages
+            aren't built and their dependencies aren't even imported; all filters if None
+        """
         self.queue: Deque[Chunk] = deque()
-        self.chunk_processor = ChunkProcessor(filters=[
-            TidyUpText(),
-            SplitMixedLanguages(),
+        self.chunk_processor = ChunkProcessor(cache=filter_cache,
+                                              filters=self._make_filters(normalization or dict(), languages))
+
+    @staticmethod
+    def _make_filters(normalization, languages):
+        filters = [
+            TidyUpText(normalization.get('tidy_up_text', None)),
+            ExpandContractions(normalization.get('contractions', None)),
+            SplitMixedLanguages(languages),
             PronounceByLetter(),
-            AddFurigana(),
-            ExplainKanji(),
-            AddVoice(),
-            StubFinalizer()
-        ])
+        ]
+        if languages is None or 'japanese' in languages:
+            from src.filter.AddFurigana import AddFurigana
+            from src.filter.ExplainKanji import ExplainKanji
+            filters += [AddFurigana(), ExplainKanji()]
+        return filters + [AddVoice(), StubFinalizer()]
     
     def __lshift__(self, chunk):
         self.append(chunk)
@@ -156,9 +195,98 @@ class Sequencer:
     def __len__(self):
         return len(self.queue)
 
+    def __iter__(self):
+        """Drains the queue, control chunks are applied on the way and not yielded"""
+        while len(self):
+            chunk = self.pop()
+            if chunk:
+                yield chunk
+
     def pop(self):
         chunk = self.queue.pop()
         if isinstance(chunk, ControlChunk):
             self._apply_control_chunk(chunk)
             chunk = None
         return chunk
+
+
+class SequencerAborted(Exception):
+    ...
+
+
+class StreamingSequencer(Sequencer):
+    """
+    Hands filtered chunks over to a consumer as soon as they're ready.
+    The buffer is bounded: a producer thread appending chunks gets blocked until
+    the consumer (usually *SequenceDemultiplexor*) catches up, so memory stays flat
+    regardless of the track length.
+    Filters are only touched by the producer thread, so control chunks must be instant:
+    a deferred one would be applied by the consumer while the producer is still filtering.
+    """
+
+    _end_of_stream = object()
+    _put_timeout = 0.5
+
+    def __init__(self, buffer_size, filter_cache=None, normalization=None, languages=None):
+        super().__init__(filter_cache, normalization, languages)
+        self.buffer_size = buffer_size
+        self.queue = None
+        self._error = None
+        self._aborted = False
+        self.open()
+
+    def open(self):
+        """Starts a new stream, must be called before a producer appends the first chunk of a track"""
+        self.queue = Queue(maxsize=self.buffer_size)
+        self._error = None
+        self._aborted = False
+
+    def close(self, error=None):
+        """Called by a producer when the track is complete or when it failed with *error*"""
+        self._error = error
+        self._put(self._end_of_stream)
+
+    def abort(self):
+        """Called by a consumer to release a producer blocked on the full buffer"""
+        self._aborted = True
+
+    def _put(self, item):
+        while True:
+            if self._aborted:
+                raise SequencerAborted()
+            try:
+                self.queue.put(item, timeout=self._put_timeout)
+                return
+            except Full:
+                continue
+
+    def append(self, chunk: Chunk):
+        if isinstance(chunk, ControlChunk):
+            if not chunk.instant:
+                raise ValueError(f'Only instant control chunks can be streamed, got {chunk!r}')
+            self._apply_control_chunk(chunk)
+            return
+        flat = flatten([attr.evolve(chunk)])  # copy as an alternative to immutability
+        for chunk in flat:
+            for filtered in self.chunk_processor.apply_filters(chunk):
+                self._put(filtered)
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def __iter__(self):
+        """Yields chunks until the producer closes the stream, re-raises the producer's error"""
+        while True:
+            chunk = self.queue.get()
+            if chunk is self._end_of_stream:
+                break
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+    def pop(self):
+        chunk = self.queue.get()
+        if chunk is self._end_of_stream:
+            self.queue.put(chunk)
+            return None
+        return chunk
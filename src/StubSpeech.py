@@ -0,0 +1,135 @@
+import sys
+from types import ModuleType
+
+
+class WaveFormatEx:
+    SamplesPerSec = 22050
+    BitsPerSample = 16
+    Channels = 1
+    AvgBytesPerSec = SamplesPerSec * BitsPerSample // 8 * Channels
+
+
+class AudioFormat:
+    def __init__(self):
+        self.Type = 22  # SAFT22kHz16BitMono
+
+    @staticmethod
+    def GetWaveFormatEx():
+        return WaveFormatEx()
+
+
+class StubMemoryStream:
+    def __init__(self):
+        self.Format = AudioFormat()
+        self._data = bytearray()
+        self._position = 0
+
+    def Write(self, data):
+        self._data += bytes(data)
+
+    def Seek(self, offset, origin=0):
+        self._position = [offset, self._position + offset, len(self._data) + offset][origin]
+        return self._position
+
+    def GetData(self):
+        return bytes(self._data)
+
+    def Read(self):
+        data = bytes(self._data[self._position:])
+        self._position = len(self._data)
+        return data
+
+
+class StubFileStream(StubMemoryStream):
+    def __init__(self):
+        super().__init__()
+        self._file = None
+
+    def Open(self, path, mode=0):
+        if mode:
+            self._file = open(path, 'wb')
+        else:
+            with open(path, 'rb') as f:
+                self._data = bytearray(f.read())
+
+    def Write(self, data):
+        if self._file is None:
+            super().Write(data)
+        else:
+            self._file.write(bytes(data))
+
+    def Close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StubVoiceToken:
+    def __init__(self, description):
+        self.Id = f'HKEY_LOCAL_MACHINE\\SOFTWARE\\Stub\\Voices\\{description}'
+        self._description = description
+
+    def GetDescription(self):
+        return self._description
+
+
+class StubVoiceTokens:
+    def __init__(self, descriptions):
+        self._tokens = [StubVoiceToken(description) for description in descriptions]
+        self.Count = len(self._tokens)
+
+    def Item(self, i):
+        return self._tokens[i]
+
+
+class StubVoice:
+    """
+    SAPI SpVoice lookalike, which "speaks" silence of a length proportional to the text and the rate,
+    so tracks can be rendered without any speech engine, fast and deterministically
+    """
+
+    descriptions = ('Stub English', 'Stub Russian', 'Stub Japanese')
+    seconds_per_character = 0.06
+
+    def __init__(self):
+        self.Voice = self.GetVoices().Item(0)
+        self.Rate = 0
+        self.Volume = 100
+        self.AudioOutputStream = StubMemoryStream()
+
+    def GetVoices(self):
+        return StubVoiceTokens(self.descriptions)
+
+    def Speak(self, text):
+        seconds = len(text) * self.seconds_per_character * 0.9 ** self.Rate
+        wave_format = self.AudioOutputStream.Format.GetWaveFormatEx()
+        size = int(seconds * wave_format.SamplesPerSec) * (wave_format.BitsPerSample // 8)
+        self.AudioOutputStream.Write(bytes(size))
+
+    def SpeakStream(self, stream):
+        stream.Seek(0, 0)
+        self.AudioOutputStream.Write(stream.Read())
+
+
+def CreateObject(prog_id):
+    return {
+        'SAPI.SpVoice': StubVoice,
+        'SAPI.SpFileStream': StubFileStream,
+        'SAPI.SpMemoryStream': StubMemoryStream,
+    }[prog_id]()
+
+
+def install():
+    """
+    Makes modules importing ``comtypes`` use the stub speech backend,
+    has to be called before any of them is imported
+    """
+    comtypes = ModuleType('comtypes')
+    client = ModuleType('comtypes.client')
+    client.CreateObject = CreateObject
+    gen = ModuleType('comtypes.gen')
+    speech_lib = ModuleType('comtypes.gen.SpeechLib')
+    speech_lib.SSFMCreateForWrite = 3
+    comtypes.client, comtypes.gen, gen.SpeechLib = client, gen, speech_lib
+    sys.modules.update({'comtypes': comtypes, 'comtypes.client': client,
+                        'comtypes.gen': gen, 'comtypes.gen.SpeechLib': speech_lib})
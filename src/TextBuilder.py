@@ -1,41 +1,101 @@
-from os import mkdir
-from sys import modules
+from html import escape
+from json import dumps
+from os import mkdir, replace
+
+from src.postprocessing import enabled_transforms
 
 
 class TextBuilder:
-    def __init__(self, app_config):
+    """
+    Collects the printed text of a track as records and writes the file once, when the track is done.
+
+    A record is a dict of text, language and start/end time in the track (None if unknown).
+    The file is either plain text, JSON lines with a record per line, or HTML with a paragraph per line,
+    as set by ``text_output.format``. Tracks, which have post-processing enabled in config, are put
+    into the post-processing queue (see *TextPostprocessWorker*).
+    """
+
+    formats = ('txt', 'jsonl', 'html')
+
+    def __init__(self, app_config, postprocess_queue=None):
         self.app_config = app_config
-        self.extension = 'txt'
-        self.stream = None
+        self.extension = app_config.get('text_output', dict()).get('format', 'txt')
+        if self.extension not in self.formats:
+            raise ValueError(f'Unknown text_output.format "{self.extension}", '
+                             f'expected one of {", ".join(self.formats)}')
         self.text_jingles = app_config['text_jingles']
         self.postprocessing = app_config['postprocessing']
+        self.postprocess_queue = postprocess_queue
+        self.records = list()
+        self.language_pair = None
+        self.track_num = None
+
+    @staticmethod
+    def get_path(app_config, language_pair, track_num, suffix=''):
+        extension = app_config.get('text_output', dict()).get('format', 'txt')
+        return f'{app_config["RitmomRoot"]}/text/{language_pair}/audio{track_num:03}{suffix}.{extension}'
+
+    @staticmethod
+    def get_encoding(app_config, language_pair):
+        return app_config['text_encoding'].get(language_pair, None) or 'utf-8'
 
     def open(self, language_pair, track_num):
         try:
             mkdir(f'{self.app_config["RitmomRoot"]}/text/{language_pair}')
         except OSError:
             pass
-        file_name = f'{self.app_config["RitmomRoot"]}/text/{language_pair}/audio{track_num:03}.{self.extension}'
-        encoding = self.app_config['text_encoding'][language_pair] or 'urf-8'
-        self.stream = open(file_name, mode='w', encoding=encoding, errors='ignore')
+        self.language_pair = language_pair
+        self.track_num = track_num
+        self.records = list()
 
-    def speak_with_postprocess(self, text, language_pair):
-        module_list = list()
+    def close(self):
+        records, self.records = self.records, list()
+        self.write(self.get_path(self.app_config, self.language_pair, self.track_num),
+                   records, self.extension, self.get_encoding(self.app_config, self.language_pair))
+        if self.postprocess_queue is not None and enabled_transforms(self.postprocessing, self.language_pair)[1]:
+            self.postprocess_queue.put((self.language_pair, self.track_num, records))
 
-        for language in self.postprocessing:
-            if language_pair.lower().startswith(language):
-                module_list = self.postprocessing[language]
-                break
+    def speak(self, text, language=None, start=None, end=None):
+        self.records.append(dict(text=text, language=language, start=start, end=end))
 
-        for module in module_list:
-            if module.startswith('text') and module_list[module]:
-                processed_text = modules[f'src.postprocessing.{module}'].process(text)
-                print(processed_text, file=self.stream, sep='')
+    def speak_jingle(self, jingle_name, start=None, end=None):
+        self.speak(self.text_jingles[jingle_name], start=start, end=end)
 
-    def speak(self, text):
-        print(text, file=self.stream, end='', sep='')
+    @staticmethod
+    def to_txt(records):
+        return ''.join(record['text'] for record in records)
 
-    def speak_jingle(self, jingle_name):
-        print(self.text_jingles[jingle_name], file=self.stream, end='', sep='')
+    @staticmethod
+    def to_jsonl(records):
+        return ''.join(f'{dumps(record, ensure_ascii=False)}\n' for record in records)
 
+    @staticmethod
+    def to_html(records):
+        paragraphs = list()
+        line = list()
+        for record in records:
+            pieces = record['text'].split('\n')
+            for n, piece in enumerate(pieces):
+                if n:
+                    paragraphs.append(f'<p>{"".join(line)}</p>')
+                    line = list()
+                if not piece:
+                    continue
+                if record['start'] is None:
+                    line.append(escape(piece, quote=False))
+                else:
+                    line.append(f'<span data-start="{record["start"]:.3f}">{escape(piece, quote=False)}</span>')
+        if line:
+            paragraphs.append(f'<p>{"".join(line)}</p>')
+        body = '\n'.join(paragraphs)
+        return f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"></head>\n<body>\n{body}\n</body>\n</html>\n'
 
+    @classmethod
+    def write(cls, path, records, output_format, encoding):
+        """Writes the file in one go through a temporary file, so a half-written file never takes the name"""
+        text = getattr(cls, f'to_{output_format}')(records)
+        if output_format == 'html':
+            encoding = 'utf-8'  # as declared by the page
+        with open(f'{path}.tmp', mode='w', encoding=encoding, errors='ignore') as f:
+            f.write(text)
+        replace(f'{path}.tmp', path)
@@ -0,0 +1,68 @@
+import re
+from typing import Dict, List
+
+
+class TextNormalizer:
+    """
+    Applies a set of replacement rules to a text in a single pass.
+
+    Every rule is either ``{"literal": "smb.", "replace": "somebody"}`` or
+    ``{"regex": "/(.+?)/", "replace": "(\\1)"}``. All rules are compiled into one alternation:
+    regex rules go first in the given order, then literal ones, longest first.
+    The leftmost match wins, replaced text is not scanned again, except for groups
+    referenced by a replacement, which are normalized by the same rules.
+    Rules matching what other rules leave behind, e.g. brackets emptied by them, go to *final_rules*,
+    applied in a second pass. Optionally whitespace gets collapsed and stripped afterwards.
+    """
+
+    _group_reference = re.compile(r'\\(\d+)|\\g<(\d+)>')
+
+    def __init__(self, rules: List[Dict[str, str]], collapse_whitespace=False, final_rules=None):
+        self.collapse_whitespace = collapse_whitespace
+        self.final = TextNormalizer(final_rules) if final_rules else None
+
+        regex_rules = [rule for rule in rules if 'regex' in rule]
+        literal_rules = sorted((rule for rule in rules if 'literal' in rule),
+                               key=lambda rule: len(rule['literal']), reverse=True)
+
+        self._replacements = dict()  # index of the rule's group -> replacement callable
+        alternatives = list()
+        group_index = 1
+        for rule in regex_rules + literal_rules:
+            pattern = rule['regex'] if 'regex' in rule else re.escape(rule['literal'])
+            alternatives.append(f'({pattern})')
+            self._replacements[group_index] = self._make_replacement(rule['replace'], group_index)
+            group_index += 1 + re.compile(pattern).groups
+
+        self._regex = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def _make_replacement(self, template, offset):
+        pieces = list()  # either str or group number
+        position = 0
+        for m in self._group_reference.finditer(template):
+            pieces.append(template[position:m.start()])
+            pieces.append(offset + int(m.group(1) or m.group(2)))
+            position = m.end()
+        pieces.append(template[position:])
+
+        if len(pieces) == 1:
+            return lambda m: template
+
+        def replace(m):
+            return ''.join(self._normalize(m.group(piece) or '') if isinstance(piece, int) else piece
+                           for piece in pieces)
+        return replace
+
+    def _replace(self, m):
+        return self._replacements[m.lastindex](m)
+
+    def _normalize(self, text):
+        return self._regex.sub(self._replace, text) if self._regex else text
+
+    def __call__(self, text):
+        text = self._normalize(text)
+        if self.final is not None:
+            text = self.final(text)
+        if self.collapse_whitespace:
+            text = ' '.join(text.split())
+        return text
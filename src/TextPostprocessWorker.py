@@ -0,0 +1,61 @@
+from contextlib import nullcontext
+from multiprocessing import Process
+from traceback import print_exc
+
+from src import postprocessing
+from src.Metrics import Metrics
+from src.Profiler import Profiler
+from src.Resource import Resource
+from src.TextBuilder import TextBuilder
+
+
+class TextPostprocessWorker(Process):
+    """
+    Runs text transforms of the **postprocessing** config section over whole tracks being put into the queue,
+    apart from the synthesis. Each transform gets printed texts of the track's language in one batch and
+    its results are written next to the track's text, e.g. ``audio001.text_output_furigana.txt``.
+    """
+
+    def __init__(self, queue, app_config, metrics_queue=None, profile=False):
+        super(TextPostprocessWorker, self).__init__()
+        self.queue = queue
+        self.app_config = app_config
+        self.metrics_queue = metrics_queue
+        self.profile = profile
+
+    def run(self):
+        Resource.configure(self.app_config)
+        Metrics().take()  # drops what is inherited from the parent process
+        with Profiler(self.app_config).profile('postprocess') if self.profile else nullcontext():
+            self._process_all()
+        if self.metrics_queue is not None:
+            self.metrics_queue.put(Metrics().take())
+
+    def _process_all(self):
+        while True:
+            value = self.queue.get()
+            if value is None:
+                break
+            language_pair, track_num, records = value
+            try:
+                self.process_track(language_pair, track_num, records)
+            except Exception as e:
+                print(str(e))
+                print_exc()
+
+    def process_track(self, language_pair, track_num, records):
+        language, transforms = postprocessing.enabled_transforms(self.app_config['postprocessing'], language_pair)
+        indices = [n for n, record in enumerate(records) if record['language'] == language and record['text'].strip()]
+        texts = [records[n]['text'] for n in indices]
+        output_format = self.app_config.get('text_output', dict()).get('format', 'txt')
+        encoding = TextBuilder.get_encoding(self.app_config, language_pair)
+
+        for name in transforms:
+            print(f'Post-processing {language_pair} #{track_num} with {name}')
+            processed = list(records)
+            with Metrics().timer(f'postprocess.{name}'):
+                processed_texts = postprocessing.process_many(postprocessing.load(name), texts)
+            for n, text in zip(indices, processed_texts):
+                processed[n] = dict(records[n], text=text)
+            path = TextBuilder.get_path(self.app_config, language_pair, track_num, suffix=f'.{name}')
+            TextBuilder.write(path, processed, output_format, encoding)
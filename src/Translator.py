@@ -1,11 +1,27 @@
 from functools import partial
-from typing import List, Dict
-
+from multiprocessing import current_process
+from multiprocessing.pool import Pool
+from os import cpu_count
+from time import perf_counter
+from typing import List, Dict, Optional, Tuple
+
+from src.MemoryReport import MemoryReport
+from src.Metrics import Metrics
 from src.Sequencer import TextChunk, JingleChunk
 from src.dictionary.BaseDictionary import BaseDictionary
 from src.utils.singleton import Singleton
 
 
+def build_cache(descriptor):
+    """
+    This will be executed as payload from a worker process: parses a dictionary and saves its cache
+    :return: the dictionary file and seconds it took
+    """
+    start = perf_counter()
+    BaseDictionary.load(descriptor['file'], descriptor['type'], descriptor['encoding'], descriptor['pair'])
+    return descriptor['file'], perf_counter() - start
+
+
 class Translator(metaclass=Singleton):
 
     # @classmethod
@@ -18,34 +34,97 @@ class Translator(metaclass=Singleton):
         if dict_descriptors is None:
             return
 
+        self.dict_descriptors = dict_descriptors  # to load the same dictionaries in other processes
         self.dictionaries: Dict[str, List[BaseDictionary]] = dict()
         self.all_dictionaries: List[BaseDictionary] = list()
         self._load_dictionaries(dict_descriptors)
-
-    def _load_dictionaries(self, dict_descriptors):
+        self._make_routes()
+
+    def _make_routes(self):
+        """
+        A route is a tuple of numbers of dictionaries (in *all_dictionaries*) to look a word up in, in priority order.
+        Routes of language pairs are made once here, rather than chosen on every lookup
+        """
+        numbers = {id(d): n for n, d in enumerate(self.all_dictionaries)}
+        self._pair_routes: Dict[Optional[str], Tuple[int, ...]] = {
+            language_pair: tuple(numbers[id(d)] for d in dictionaries)
+            for language_pair, dictionaries in self.dictionaries.items()}
+        self._pair_routes[None] = tuple(range(len(self.all_dictionaries)))  # unknown pairs go to all dictionaries
+        self._language_routes: Dict[str, Tuple[int, ...]] = dict()  # foreign language -> route of its examples
+        self._indices: Dict[Tuple[int, ...], Dict[str, Tuple[int, ...]]] = dict()
+
+    @staticmethod
+    def _build_caches(dict_descriptors):
+        """
+        Dictionaries without caches are parsed concurrently, a process per file, so a cold start takes
+        about as long as the largest dictionary rather than all of them together
+        """
+        missing = dict()
         for d in dict_descriptors:
-            language_pair = d['pair']
-            dictionary = BaseDictionary.load(d['file'], d['type'], d['encoding'], language_pair)
-
-            if language_pair not in self.dictionaries:
-                self.dictionaries[language_pair] = list()
+            if d['file'] not in missing and not BaseDictionary.is_cached(d['file'], d['type'], d['encoding']):
+                missing[d['file']] = d
+        if len(missing) < 2 or current_process().daemon:
+            return  # a pool worker can't start processes, dictionaries are built while loaded then
+        with Pool(processes=min(len(missing), cpu_count())) as pool:
+            for file_path, seconds in pool.imap_unordered(build_cache, missing.values()):
+                Metrics().observe('dictionary.build', seconds)
+                print(f'Cache of {file_path} built in {seconds:.1f} sec')
 
-            self.dictionaries[language_pair].append(dictionary)
-            self.all_dictionaries.append(dictionary)
+    def _load_dictionaries(self, dict_descriptors):
+        self._build_caches(dict_descriptors)
+        with MemoryReport().measure('dictionaries'):
+            for d in dict_descriptors:
+                language_pair = d['pair']
+                dictionary = BaseDictionary.load(d['file'], d['type'], d['encoding'], language_pair)
+
+                if language_pair not in self.dictionaries:
+                    self.dictionaries[language_pair] = list()
+
+                self.dictionaries[language_pair].append(dictionary)
+                self.all_dictionaries.append(dictionary)
+
+    def _compile_index(self, route):
+        """
+        Merges headwords of the route's dictionaries
+        :return: word -> numbers of the dictionaries having it, in the route's order
+        """
+        index = dict()
+        shared = dict()  # words of the same dictionaries refer to the same tuple
+        with MemoryReport().measure('dictionary_index'):
+            for n in route:
+                for word in self.all_dictionaries[n].dictionary_data:
+                    numbers = index.get(word, ()) + (n,)
+                    index[word] = shared.setdefault(numbers, numbers)
+        return index
+
+    def _get_index(self, route):
+        index = self._indices.get(route, None)
+        if index is None:
+            index = self._indices[route] = self._compile_index(route)
+        return index
+
+    def compile_indices(self):
+        """Merges indices of all language pairs at once, e.g. before forking workers to share them"""
+        for route in self._pair_routes.values():
+            if len(route) > 1:
+                self._get_index(route)
+
+    def _find(self, route, word):
+        """:return: numbers of the route's dictionaries having the word"""
+        if len(route) < 2:
+            return route  # a single dictionary is probed directly, it needs no merged index
+        return self._get_index(route).get(word, ())
 
     def translate(self, word, language_pair=None):
         def chunk_factory(*, language, text):
             return TextChunk(text=text, language=language)
 
-        if language_pair and language_pair in self.dictionaries:
-            dictionaries = self.dictionaries[language_pair]
-        else:
-            dictionaries = self.all_dictionaries
+        route = self._pair_routes.get(language_pair, None) or self._pair_routes[None]
 
         result = list()
 
-        for d in dictionaries:
-            chunks = d.translate_word_chunked(word, chunk_factory)
+        for n in self._find(route, word):
+            chunks = self.all_dictionaries[n].translate_word_chunked(word, chunk_factory)
             if chunks:
                 result.extend(chunks)
 
@@ -60,10 +139,15 @@ class Translator(metaclass=Singleton):
                 TextChunk(text=pair[1].strip(), language=native)
             ]
 
+        route = self._language_routes.get(language, None)
+        if route is None:
+            route = self._language_routes[language] = tuple(
+                n for n, d in enumerate(self.all_dictionaries) if d.language_pair.startswith(language.capitalize()))
+
         examples = list()
-        for d in self.all_dictionaries:
-            if d.language_pair.startswith(language.capitalize()):
-                to_chunks = partial(example_sequence, d.foreign_language, d.native_language)
-                examples += map(to_chunks, d.get_examples(word))
+        for n in self._find(route, word):
+            d = self.all_dictionaries[n]
+            to_chunks = partial(example_sequence, d.foreign_language, d.native_language)
+            examples += map(to_chunks, d.get_examples(word))
 
         return examples
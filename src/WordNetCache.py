@@ -4,9 +4,12 @@ from genericpath import exists
 import nltk
 from nltk import ConcordanceIndex
 
+from src.MemoryReport import MemoryReport
+
 
 class WordNetCache:
     _lock = None
+    _shared = dict()  # language -> texts and indices, shared by instances within a process and with forked workers
 
     @classmethod
     def get_lock(cls):
@@ -14,7 +17,7 @@ class WordNetCache:
 
     def __init__(self, _app_config):
         self.app_config = _app_config
-        self._byLanguage = dict()
+        self._byLanguage = self._shared
         self._lock = self.get_lock()
 
     @staticmethod
@@ -26,7 +29,7 @@ class WordNetCache:
             self._byLanguage[language] = dict()
             self._byLanguage[language]['texts'] = dict()
             self._byLanguage[language]['indices'] = dict()
-            with self.get_lock():
+            with self.get_lock(), MemoryReport().measure(f'corpus_index.{language}'):
                 if exists(f'cache/{language}.ready'):
                     self._load_cache(language)
                 else:
@@ -0,0 +1,271 @@
+# coding: utf-8
+"""
+Performance benchmarks on synthetic data: dictionaries, corpora and phrasebooks of a configurable size are
+generated into a temporary directory, which serves as RitmomRoot, and the speech engine is replaced
+with *StubSpeech*, so results don't depend on the machine's dictionaries and voices.
+
+    python src/benchmark.py --entries 20000 --output cache/benchmark.json --compare cache/benchmark.old.json
+"""
+import argparse
+import platform
+import sys
+from datetime import datetime
+from json import load, dump
+from os import chdir, getcwd, makedirs
+from os.path import abspath, dirname
+from random import Random
+from statistics import median
+from tempfile import TemporaryDirectory
+from threading import Lock
+from time import perf_counter
+
+sys.path.append(r'.')
+from src import StubSpeech
+
+StubSpeech.install()
+
+from src.Metrics import Metrics
+from src.utils import fixtures
+
+ritmom_root = dirname(dirname(abspath(__file__)))
+
+
+class Results:
+    """Measured values by name, each with its unit and whether higher or lower is better"""
+
+    def __init__(self):
+        self.values = dict()
+
+    def add(self, name, value, unit, better='lower'):
+        self.values[name] = dict(value=value, unit=unit, better=better)
+        print(f'{name:<44} {value:>14.3f} {unit}')
+
+    def rate(self, name, count, seconds, unit='1/s'):
+        self.add(name, count / seconds if seconds else float('inf'), unit, better='higher')
+
+    def latencies(self, name, seconds):
+        seconds = sorted(seconds)
+        self.add(f'{name}.p50', median(seconds) * 1000, 'ms')
+        self.add(f'{name}.p95', seconds[int(0.95 * (len(seconds) - 1))] * 1000, 'ms')
+        self.add(f'{name}.max', seconds[-1] * 1000, 'ms')
+
+
+def timed(function, *args, **kwargs):
+    """:return: result of the function and seconds it took"""
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def prepare_fixtures(root, entries):
+    """Writes dictionaries, a corpus and phrasebooks, :return: the glossary and descriptors of the dictionaries"""
+    for directory in ('audio', 'text', 'cache', 'dictionaries', 'corpus', 'phrases', 'resource'):
+        makedirs(f'{root}/{directory}', exist_ok=True)
+    glossary = fixtures.make_glossary(entries)
+    words = [word for word, _ in glossary]
+
+    fixtures.write_dsl(f'{root}/dictionaries/en-ru.dsl.dz', glossary, name='Synthetic EnglishRussian')
+    fixtures.write_ldx(f'{root}/dictionaries/en-ru.ldx', glossary, dictionary_id=0xB0000001)
+    fixtures.write_ldx(f'{root}/dictionaries/en-en.ldx', fixtures.make_glossary(entries, seed=1),
+                       dictionary_id=0xB0000002)
+    fixtures.write_corpus(f'{root}/corpus', words, sentences=max(200, entries // 10))
+    fixtures.write_csv_phrasebook(f'{root}/phrases/phrasebook.csv', glossary)
+    fixtures.write_text_phrasebook(f'{root}/phrases/phrasebook.txt', glossary)
+    fixtures.write_unihan(f'{root}/resource/Unihan.zip')
+
+    descriptors = [
+        dict(pair='EnglishRussian', type='dsl', encoding='utf-16', file=f'{root}/dictionaries/en-ru.dsl.dz'),
+        dict(pair='EnglishRussian', type='ldx', encoding='utf-8', file=f'{root}/dictionaries/en-ru.ldx'),
+        dict(pair='EnglishEnglish', type='ldx', encoding='utf-8', file=f'{root}/dictionaries/en-en.ldx'),
+    ]
+    return glossary, descriptors
+
+
+def make_app_config(root, descriptors):
+    """The repo's config with synthetic dictionaries, stub voices and jingles made of silence"""
+    from src.SequencePlan import SequencePlan
+
+    with open(f'{ritmom_root}/config.json', encoding='utf-8') as f:
+        app_config = load(f)
+    app_config.update(
+        RitmomRoot=root,
+        dictionaries=descriptors,
+        languages={'EnglishRussian': {'foreign1': 'Stub English', 'foreign2': 'Stub English',
+                                      'native': 'Stub Russian'}},
+        jingles={name: value if value.startswith('silence') else 'silence 0.3'
+                 for name, value in app_config['jingles'].items()},
+        # enrichments depend on WordNet, excerpts are measured on their own
+        pattern=[step for step in app_config['pattern'] if step.get('speak', None) not in SequencePlan.enrichments],
+        phraseExamples={'english': ['synthetic']},
+        text_encoding=dict(),
+        postprocessing=dict(),
+        filter_cache=dict(app_config.get('filter_cache', dict()), disk=False),
+    )
+    return app_config
+
+
+def bench_dictionaries(results, descriptors, words):
+    from src.dictionary.BaseDictionary import BaseDictionary
+    from src.dictionary.DslDictionary import DslMarkup
+    from src.Sequencer import TextChunk
+
+    random = Random(0)
+    probes = [random.choice(words) for _ in range(50000)] + [f'{word}x' for word in words[:10000]]  # hits, misses
+    for d in descriptors:
+        name = f'dictionary.{d["type"]}.{d["pair"]}'
+        dictionary, seconds = timed(BaseDictionary.load, d['file'], d['type'], d['encoding'], d['pair'])
+        results.add(f'{name}.build', seconds, 's')
+        dictionary, seconds = timed(BaseDictionary.load, d['file'], d['type'], d['encoding'], d['pair'])
+        results.add(f'{name}.load', seconds, 's')
+        results.rate(f'{name}.lookups', len(probes), timed(lambda: [dictionary.get_raw_word_info(word)
+                                                                       for word in probes])[1])
+        results.rate(f'{name}.translations', len(words),
+                     timed(lambda: [dictionary.translate_word_chunked(word, TextChunk) for word in words])[1])
+
+        if d['type'] == 'dsl':
+            infos = [dictionary.get_raw_word_info(word) for word in words]
+            results.rate('dsl_markup.parses', len(infos), timed(lambda: [DslMarkup(info) for info in infos])[1])
+
+
+def bench_chunk_processor(results, app_config, translations):
+    """
+    Translations and Japanese phrases through the regex filters and *ExplainKanji*, which is pure,
+    so the cold and warm cache runs show what memoization saves
+    """
+    from src.FilterCache import FilterCache
+    from src.JapaneseAnalyzer import JapaneseAnalyzer
+    from src.KanjiTable import KanjiTable
+    from src.Sequencer import ChunkProcessor, TextChunk
+    from src.filter.ExpandContractions import ExpandContractions
+    from src.filter.ExplainKanji import ExplainKanji
+    from src.filter.PronounceByLetter import PronounceByLetter
+    from src.filter.SplitMixedLanguages import SplitMixedLanguages
+    from src.filter.StubFinalizer import StubFinalizer
+    from src.filter.TidyUpText import TidyUpText
+
+    root = app_config['RitmomRoot']
+    normalization = app_config.get('normalization', dict())
+    chunks = [TextChunk(text=chunk.text, language=chunk.language, final=False)
+              for translation in translations for chunk in translation]
+    phrases = fixtures.make_japanese_phrases(len(translations))
+    chunks += [TextChunk(text=text, language='japanese', final=False) for text in phrases]
+    JapaneseAnalyzer().analyze_many(phrases)  # tagged beforehand, as SequenceBuilder does for a track
+    kanji_table = KanjiTable.load(f'{root}/resource/kanji.table',
+                                  unihan=dict(url=None, destination=f'{root}/resource/Unihan.zip', description=None))
+
+    def make_processor(cache=None):
+        return ChunkProcessor(cache=cache, filters=[
+            TidyUpText(normalization.get('tidy_up_text', None)),
+            ExpandContractions(normalization.get('contractions', None)),
+            SplitMixedLanguages(),
+            PronounceByLetter(),
+            ExplainKanji(kanji_table),
+            StubFinalizer()
+        ])
+
+    processor = make_processor()
+    results.rate('chunk_processor.chunks', len(chunks),
+                 timed(lambda: [processor.apply_filters(chunk) for chunk in chunks])[1])
+    processor = make_processor(FilterCache(app_config))
+    results.rate('chunk_processor.chunks.cold_cache', len(chunks),
+                 timed(lambda: [processor.apply_filters(chunk) for chunk in chunks])[1])
+    results.rate('chunk_processor.chunks.warm_cache', len(chunks),
+                 timed(lambda: [processor.apply_filters(chunk) for chunk in chunks])[1])
+
+
+def bench_excerpts(results, app_config, root, words, samples):
+    import nltk
+    from nltk.corpus.reader import PlaintextCorpusReader
+    from src.PhraseExamples import PhraseExamples
+    from src.WordNetCache import WordNetCache
+
+    nltk.corpus.synthetic = PlaintextCorpusReader(f'{root}/corpus', r'.*\.txt')
+    WordNetCache._lock = Lock()
+    phrase_examples = PhraseExamples(app_config)
+    results.add('excerpt.index_build', timed(phrase_examples.word_net_cache.get_cache, 'english')[1], 's')
+
+    latencies = list()
+    for word in Random(0).sample(words, min(samples, len(words))):
+        latencies.append(timed(phrase_examples.get_excerpt, word, 'english')[1])
+    results.latencies('excerpt.latency', latencies)
+
+
+def bench_render(results, app_config, items, tracks):
+    from src.SequenceBuilder import SequenceBuilder
+
+    sequence_builder, seconds = timed(SequenceBuilder, app_config=app_config, encode_queue=None,
+                                      only_wav=True, dump_sequencer_log=False)
+    results.add('render.setup', seconds, 's')
+
+    per_track = app_config['words_per_audio']
+    latencies = list()
+    for part_number in range(tracks):
+        part = items[part_number * per_track:(part_number + 1) * per_track]
+        latencies.append(timed(sequence_builder.make_audio_track, 'EnglishRussian', part, part_number)[1])
+    results.latencies('render.track', latencies)
+    results.rate('render.words', per_track * len(latencies), sum(latencies))
+
+
+def compare(current, previous):
+    """Prints how the results changed, ratio above 1 means faster"""
+    print(f'\n{"":<44} {"previous":>14} {"current":>14} {"speedup":>8}')
+    for name, result in current['results'].items():
+        old = previous['results'].get(name, None)
+        if old is None or not old['value'] or not result['value']:
+            continue
+        speedup = (result['value'] / old['value']) if result['better'] == 'higher' else (old['value'] / result['value'])
+        print(f'{name:<44} {old["value"]:>14.3f} {result["value"]:>14.3f} {speedup:>7.2f}x')
+
+
+def run(args):
+    results = Results()
+    cwd = getcwd()
+    with TemporaryDirectory(prefix='ritmom-benchmark-') as root:
+        chdir(root)  # dictionary caches and tracks are written relative to the working directory
+        try:
+            glossary, descriptors = prepare_fixtures(root, args.entries)
+            app_config = make_app_config(root, descriptors)
+            words = [word for word, _ in glossary]
+
+            bench_dictionaries(results, descriptors, words)
+
+            from src.Translator import Translator
+            from src.source.text import TextSource
+            translator, seconds = timed(Translator, descriptors)
+            results.add('translator.load', seconds, 's')
+            translations, seconds = timed(lambda: [translator.translate(word, 'EnglishRussian') for word in words])
+            results.rate('translator.translations', len(words), seconds)
+            source = next(TextSource(f'{root}/phrases/phrasebook.txt', 'EnglishRussian'))
+            results.rate('phrasebook.text.rows', len(words), timed(lambda: sum(1 for _ in source))[1])
+
+            bench_chunk_processor(results, app_config, translations)
+            bench_excerpts(results, app_config, root, words, args.samples)
+            bench_render(results, app_config, list(zip(words, translations)), args.tracks)
+        finally:
+            chdir(cwd)
+
+    return dict(meta=dict(time=datetime.utcnow().isoformat(), python=platform.python_version(),
+                          platform=platform.platform(), entries=args.entries, tracks=args.tracks),
+                results=results.values,
+                metrics=Metrics().report()['total'])
+
+
+if __name__ == '__main__':
+    def main():
+        parser = argparse.ArgumentParser(description='Benchmarks on synthetic dictionaries and phrasebooks')
+        parser.add_argument('--entries', help='Entries of each dictionary and the phrasebook', type=int, default=20000)
+        parser.add_argument('--tracks', help='Tracks to render', type=int, default=5)
+        parser.add_argument('--samples', help='Words to look excerpts up for', type=int, default=200)
+        parser.add_argument('--output', help='Write results to JSON file')
+        parser.add_argument('--compare', help='Compare with results of a previous run', metavar='JSON')
+        args = parser.parse_args()
+
+        report = run(args)
+        if args.output:
+            with open(args.output, mode='w', encoding='utf-8') as f:
+                dump(report, f, indent=2)
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                compare(report, load(f))
+
+    main()
@@ -1,4 +1,5 @@
 import pickle
+from os import replace
 from os.path import exists, abspath
 from abc import ABC, abstractmethod
 from typing import Tuple, List, Callable, Optional
@@ -30,10 +31,19 @@ class BaseDictionary(ABC):
     def translate_word_chunked(self, word, chunk_factory: Callable) -> List:
         ...
 
+    @classmethod
+    @abstractmethod
+    def get_cache_id(cls, file_path, encoding) -> str:
+        """Reads just enough of the dictionary file to tell the name of its cache"""
+        ...
+
     def _save_cache(self):
+        """The cache is published complete or not at all, so a reader never gets a partial one"""
         dictionary_cache_path = f'{self.cache_dir}/{self.dictionary_header[self.cache_id_header]}.dic'
-        with open(dictionary_cache_path, 'wb') as f:
-            pickle.dump({"dictionary": self.dictionary_data, "dictionary_header": self.dictionary_header}, f)
+        with open(f'{dictionary_cache_path}.tmp', 'wb') as f:
+            pickle.dump({"dictionary": self.dictionary_data, "dictionary_header": self.dictionary_header}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        replace(f'{dictionary_cache_path}.tmp', dictionary_cache_path)
 
     def _load_cache(self) -> bool:
         dictionary_cache_path = f'{self.cache_dir}/{self.dictionary_header[self.cache_id_header]}.dic'
@@ -46,17 +56,26 @@ class BaseDictionary(ABC):
         return cache_exists
 
     @staticmethod
-    def load(file_path, dict_type, encoding, language_pair):
+    def get_class(dict_type):
         from src.dictionary.DslDictionary import DslBaseDictionary
         from src.dictionary.LdxDictionary import LdxBaseDictionary
 
-        cache_dir = abspath(r'./cache')
         if dict_type == 'dsl':
-            dictionary = DslBaseDictionary(file_path, encoding, cache_dir)
+            return DslBaseDictionary
         elif dict_type == 'ldx':
-            dictionary = LdxBaseDictionary(file_path, encoding, cache_dir)
+            return LdxBaseDictionary
         else:
             raise Exception('Wrong dictionary type')
+
+    @staticmethod
+    def is_cached(file_path, dict_type, encoding):
+        cache_id = BaseDictionary.get_class(dict_type).get_cache_id(file_path, encoding)
+        return exists(f'{abspath(r"./cache")}/{cache_id}.dic')
+
+    @staticmethod
+    def load(file_path, dict_type, encoding, language_pair):
+        cache_dir = abspath(r'./cache')
+        dictionary = BaseDictionary.get_class(dict_type)(file_path, encoding, cache_dir)
         dictionary.language_pair = language_pair
         dictionary.foreign_language, dictionary.native_language = split_name_pair(language_pair)
         return dictionary
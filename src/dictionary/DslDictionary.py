@@ -226,12 +226,7 @@ class DslBaseDictionary(BaseDictionary):
         file_size = get_uncompressed_size(file_path)
 
         with gzip.open(file_path, mode='rt', encoding=encoding) as f:
-            while True:
-                line = f.readline()
-                if line is None or not line.startswith('#'):
-                    break
-                terms = re.match(r'#(?P<name>[^ ]+?) "(?P<value>[^"]+)"', line)
-                self.dictionary_header[terms['name']] = terms['value']
+            self.dictionary_header.update(self._read_header(f))
 
             if self._load_cache():
                 return
@@ -265,6 +260,23 @@ class DslBaseDictionary(BaseDictionary):
         print(f'Saving cache for {self.dictionary_header["NAME"]}')
         self._save_cache()
     
+    @staticmethod
+    def _read_header(f):
+        """Reads '#NAME "value"' lines, and the line following them"""
+        header = dict()
+        while True:
+            line = f.readline()
+            if line is None or not line.startswith('#'):
+                break
+            terms = re.match(r'#(?P<name>[^ ]+?) "(?P<value>[^"]+)"', line)
+            header[terms['name']] = terms['value']
+        return header
+
+    @classmethod
+    def get_cache_id(cls, file_path, encoding):
+        with gzip.open(file_path, mode='rt', encoding=encoding) as f:
+            return cls._read_header(f)['NAME']
+
     def get_examples(self, word):
         phrases = []
         word_info = self[word]
@@ -61,6 +61,12 @@ class LdxBaseDictionary(BaseDictionary):
                 self.position = 0
                 self._read_header()
 
+    @classmethod
+    def get_cache_id(cls, file_path, encoding):
+        with open(file_path, 'rb') as f:
+            f.seek(0x1C)
+            return hex(struct.unpack('I', f.read(4))[0])
+
     def get_int(self, offset, *, unsigned=False, buffer=None):
         return struct.unpack('I' if unsigned else 'i', (buffer or self.mm)[offset:offset+4])[0]
 
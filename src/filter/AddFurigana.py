@@ -1,10 +1,12 @@
-from furigana.furigana import split_furigana
+from furigana.furigana import split_okurigana
 
+from src.JapaneseAnalyzer import JapaneseAnalyzer
 from src.filter.BaseFilter import BaseFilter
 
 
 class AddFurigana(BaseFilter):
-    
+    pure = True
+
     def __init__(self):
         super().__init__()
 
@@ -27,5 +29,10 @@ class AddFurigana(BaseFilter):
 
     @staticmethod
     def tokenize(text):
-        tokens = map(list, split_furigana(text))
+        tokens = list()
+        for token in JapaneseAnalyzer().analyze(text):
+            if token.reading and any(map(JapaneseAnalyzer.is_kanji, token.surface)):
+                tokens.extend(map(list, split_okurigana(token.surface, token.reading)))
+            else:
+                tokens.append([token.surface])
         return tokens
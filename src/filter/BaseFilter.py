@@ -4,6 +4,10 @@ from typing import List
 
 
 class BaseFilter:
+    pure = False  # True if the output depends only on the incoming chunk, so it can be memoized
+    version = 1  # Bump on changing the output of a pure filter to invalidate results cached on disk
+    fingerprint = None  # Identifies the configuration a pure filter's output depends on
+
     def __init__(self):
         self.enabled = True
 
@@ -1,35 +1,42 @@
-from src.Sequencer import TextChunk
+from src.TextNormalizer import TextNormalizer
 from src.filter.BaseFilter import BaseFilter
-from re import sub
 
 
 class ExpandContractions(BaseFilter):
-
     contractions = {
         "english": {
-            "smb.": "somebody",
-            "smth.": "something"
+            "rules": [
+                {"literal": "smb.", "replace": "somebody"},
+                {"literal": "smth.", "replace": "something"}
+            ]
         },
         "russian": {
-            "кто-л.": "кто-либо",
-            "кого-л.": "кого-либо",
-            "кому-л.": "кому-либо",
-            "кем-л.": "кем-либо",
-            "ком-л.": "ком-либо",
-            "что-л.": "что-либо",
-            "чему-л.": "чему-либо",
-            "чем-л.": "чем-либо",
-            "чём-л.": "чём-либо",
-            r"т.\sп.": "тому подобное",
-            r"т.\sд.": "так далее",
+            "rules": [
+                {"literal": "кто-л.", "replace": "кто-либо"},
+                {"literal": "кого-л.", "replace": "кого-либо"},
+                {"literal": "кому-л.", "replace": "кому-либо"},
+                {"literal": "кем-л.", "replace": "кем-либо"},
+                {"literal": "ком-л.", "replace": "ком-либо"},
+                {"literal": "что-л.", "replace": "что-либо"},
+                {"literal": "чему-л.", "replace": "чему-либо"},
+                {"literal": "чем-л.", "replace": "чем-либо"},
+                {"literal": "чём-л.", "replace": "чём-либо"},
+                {"regex": r"т\.\s?п\.", "replace": "тому подобное"},
+                {"regex": r"т\.\s?д\.", "replace": "так далее"}
+            ]
         }
     }
+
+    def __init__(self, contractions=None):
+        super().__init__()
+        contractions = contractions or self.contractions
+        self.normalizers = {language: TextNormalizer(config['rules'], config.get('collapse_whitespace', False))
+                            for language, config in contractions.items()}
     
     def __call__(self, chunk):
+        from src.Sequencer import TextChunk
         chunk = self._duplicate_chunk(chunk)
         result = [chunk]
-        if isinstance(chunk, TextChunk) and chunk.language in self.contractions:
-            contractions = self.contractions[chunk.language]
-            for abbr in contractions:
-                chunk.text = sub(abbr, contractions[abbr], chunk.text)
+        if isinstance(chunk, TextChunk) and chunk.language in self.normalizers:
+            chunk.text = self.normalizers[chunk.language](chunk.text)
         return result
@@ -1,25 +1,23 @@
 from src.Sequencer import Chunk, TextChunk
+from src.RakutenModel import RakutenModel
 from src.filter.BaseFilter import BaseFilter
 
-from os.path import abspath
-
 from rakutenma import RakutenMA
 
 
 class ExplainJapaneseSentences(BaseFilter):
+    pure = True
 
     def __init__(self):
         super().__init__()
-        
-        # Initialize a RakutenMA instance with an empty model
-        # the default ja feature set is set already
-        self.rma = RakutenMA()
 
         # Initialize a RakutenMA instance with a pre-trained model
+        # the default ja feature set is set already
         self.rma = RakutenMA(phi=1024, c=0.007812)  # Specify hyperparameter for SCW (for demonstration purpose)
 
         # https://github.com/ikegami-yukino/rakutenma-python/tree/master/rakutenma/model
-        self.rma.load(abspath(r'..\resource\model_ja.min.json'))
+        # Shared by all instances within a process, never trained, so it's read-only
+        self.rma.model = RakutenModel.load()
 
     def __call__(self, chunk):
         chunk = self._duplicate_chunk(chunk)
@@ -34,3 +32,10 @@ class ExplainJapaneseSentences(BaseFilter):
         tokens = self.rma.tokenize(text)
         return ' '.join(map(lambda pair: f'{pair[0]} ({pair[1]})', tokens))
 
+    def tokenize_many(self, texts):
+        """Tokenizes a batch of texts, each distinct text only once"""
+        tokenized = dict()
+        for text in texts:
+            if text not in tokenized:
+                tokenized[text] = self.tokenize(text)
+        return [tokenized[text] for text in texts]
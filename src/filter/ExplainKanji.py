@@ -1,22 +1,15 @@
-import jaconv
-import sys
-
-sys.__stdout__ = sys.stdout
-from cihai.core import Cihai
-from cihai.bootstrap import bootstrap_unihan
-
+from src.JapaneseAnalyzer import JapaneseAnalyzer
+from src.KanjiTable import KanjiTable
 from src.filter.BaseFilter import BaseFilter
 
 
 class ExplainKanji(BaseFilter):
-    def __init__(self):
+    pure = True
+
+    def __init__(self, kanji_table=None):
         super().__init__()
         
-        self.c = Cihai()
-
-        if not self.c.is_bootstrapped:  # download and install Unihan to db
-            bootstrap_unihan(self.c.metadata)
-            self.c.reflect_db()
+        self.kanji_table = kanji_table or KanjiTable.load()
 
     def __call__(self, chunk):
         from src.Sequencer import TextChunk, JingleChunk
@@ -57,14 +50,7 @@ class ExplainKanji(BaseFilter):
         return result
 
     def _kanji_to_kana(self, char):
-        glyph = self.c.lookup_char(char).first()
-        if glyph is None:
-            return None
-        romaji_on = glyph.kJapaneseKun.lower()
-        romaji_kun = glyph.kJapaneseOn.lower()
-        jp_on = jaconv.alphabet2kana(romaji_on).split(' ')
-        jp_kun = jaconv.hira2kata(jaconv.alphabet2kana(romaji_kun)).split(' ')
-        return jp_on, jp_kun, glyph.kDefinition
+        return self.kanji_table[char]
 
     @staticmethod
     def is_kana(char):
@@ -75,7 +61,8 @@ class ExplainKanji(BaseFilter):
         return not cls.is_kana(char)
 
     def _get_explanations(self, text):
-        kanji = set(filter(self.is_kanji, text))
+        tokens = JapaneseAnalyzer().analyze(text)
+        kanji = dict.fromkeys(char for token in tokens for char in token.surface if self.is_kanji(char))
         detail_list = []
         for k in kanji:
             triplet = self._kanji_to_kana(k)
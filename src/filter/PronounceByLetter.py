@@ -3,12 +3,11 @@ from re import search
 
 
 class PronounceByLetter(BaseFilter):
-    
     def __init__(self):
         super().__init__()
 
     def __call__(self, chunk):
-        from src.Sequencer import JingleChunk, TextChunk
+        from src.Sequencer import JingleChunk, TextChunk, SpeechChunk, LetterChunk
 
         chunk = self._duplicate_chunk(chunk)
         result = [chunk]
@@ -21,6 +20,10 @@ class PronounceByLetter(BaseFilter):
                 result.append(JingleChunk(jingle='silence_short', printable=False))
                 if letter.isspace():
                     result.append(JingleChunk(jingle='space', printable=False))
+                elif isinstance(chunk, SpeechChunk) and chunk.voice is not None:
+                    result.append(LetterChunk(text=letter, language='english', voice=chunk.voice,
+                                              rate=chunk.rate, volume=chunk.volume,
+                                              audible=True, printable=False, final=True))
                 else:
                     result.append(TextChunk(text=letter, language='english',
                                             audible=True, printable=False, final=True))
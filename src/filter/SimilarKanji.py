@@ -1,17 +1,11 @@
-import sys
-sys.__stdout__ = sys.stdout
-from cihai.core import Cihai
-from cihai.bootstrap import bootstrap_unihan
+from src.KanjiTable import KanjiTable
 
 
-c = Cihai()
-
-
-if not c.is_bootstrapped:  # download and install Unihan to db
-    bootstrap_unihan(c.metadata)
-    c.reflect_db()
+kanji_table = None
 
 
 def jp_reverse(word):
-    query = c.reverse_char(word)
-    return ', '.join([glyph.char for glyph in query])
+    global kanji_table
+    if kanji_table is None:
+        kanji_table = KanjiTable.load()
+    return ', '.join(kanji_table.reverse(word))
@@ -1,15 +1,22 @@
+from src.TextNormalizer import TextNormalizer
 from src.filter.BaseFilter import BaseFilter
-from re import sub
 
 
 class TidyUpEnglish(BaseFilter):
-    
-    def __init__(self):
+    config = {
+        "rules": [
+            {"regex": r"^['`\"]+|['`\"]+$", "replace": ""},
+            {"regex": r"\s+'\s+", "replace": "'"}
+        ]
+    }
+
+    def __init__(self, config=None):
         super().__init__()
+        config = config or self.config
+        self.normalize = TextNormalizer(config['rules'], config.get('collapse_whitespace', False))
 
     def __call__(self, chunk):
         chunk = self._duplicate_chunk(chunk)
         if chunk.language == 'english':
-            chunk.text = sub(r"^['`\"]+|['`\"]+$", '', chunk.text)
-            chunk.text = sub(r"\s+'\s+", "'", chunk.text)
+            chunk.text = self.normalize(chunk.text)
         return [chunk]
@@ -1,21 +1,30 @@
+from src.TextNormalizer import TextNormalizer
 from src.filter.BaseFilter import BaseFilter
-from re import sub
 
 
 class TidyUpText(BaseFilter):
-    
-    def __init__(self):
+    config = {
+        "collapse_whitespace": True,
+        "rules": [
+            {"regex": r"/\s*/", "replace": " "},
+            {"regex": r"/(.+?)/", "replace": r"(\1)"},
+            {"regex": r"[\\{}_]", "replace": " "},
+            {"literal": "/", "replace": ""}
+        ],
+        "final_rules": [
+            {"regex": r"\(\s*\)", "replace": " "}
+        ]
+    }
+
+    def __init__(self, config=None):
         super().__init__()
+        config = config or self.config
+        self.normalize = TextNormalizer(config['rules'], config.get('collapse_whitespace', False),
+                                        config.get('final_rules', None))
 
     def __call__(self, chunk):
         from src.Sequencer import TextChunk
         chunk = self._duplicate_chunk(chunk)
         if isinstance(chunk, TextChunk):
-            chunk.text = sub(r'[\\{}]', ' ', chunk.text)
-            chunk.text = sub(r'/(.*?)/', r'(\1)', chunk.text)
-            chunk.text = sub(r'[/]', '', chunk.text)
-            chunk.text = sub(r'_', ' ', chunk.text)
-            chunk.text = sub(r'\(\s*\)', ' ', chunk.text)
-            chunk.text = sub(r'\s+', ' ', chunk.text)
-            chunk.text = sub(r'^\s+|\s+$', '', chunk.text)
+            chunk.text = self.normalize(chunk.text)
         return [chunk]
@@ -1,4 +1,13 @@
-from wordsegment import load, segment
-load()
-segment('thisisatest')
+_loaded = False
+
+
+def segment(text):
+    """Splits text without spaces into words, the corpus of wordsegment is loaded on the first call"""
+    global _loaded
+    import wordsegment
+
+    if not _loaded:
+        wordsegment.load()
+        _loaded = True
+    return wordsegment.segment(text)
 
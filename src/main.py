@@ -1,14 +1,17 @@
 # coding: utf-8
 from collections import Counter
+from contextlib import nullcontext
 from itertools import chain
 from multiprocessing.pool import Pool
-from multiprocessing import Manager
+from multiprocessing import Lock, Manager, Process, get_start_method
+from queue import Queue
 from traceback import print_exc
 from comtypes.client import CreateObject
 from datetime import datetime, timedelta
 from os.path import abspath
 from os import cpu_count
 from json import load
+import gc
 import re
 import argparse
 from typing import Dict, Tuple, List
@@ -20,24 +23,49 @@ import src
 
 from src.SequenceBuilder import SequenceBuilder
 from src.AudioEncoderWorker import AudioEncoderWorker
+from src.TextPostprocessWorker import TextPostprocessWorker
 from src.WordNetCache import WordNetCache
+from src.RenderCoordinator import RenderCoordinator
+from src.RunJournal import RunJournal
+from src.Metrics import Metrics
+from src.MemoryReport import MemoryReport
+from src.Profiler import Profiler
+from src.Resource import Resource
+from src.utils.config import split_name_pair
+from src.utils.rpc import get_secret, parse_address
 
 if __name__ == '__main__':
     from src.source.csv import CsvSource
     from src.source.excel import ExcelSource
+    from src.source.xls import XlsSource
+    from src.source.xlsx import XlsxSource
     from src.source.text import TextSource
     from src.source.util import UnrollMultilineCell
     from src.Translator import Translator
+    from src.PhrasebookIndex import PhrasebookIndex
 
 
-def get_source(file_path, root, language_pair):
+def get_source(file_path, root, language_pair, options=None):
+    """
+    :param options: sheet and columns of a workbook, see *XlsxSource*, or batch size, processes and cache size
+        of a text translation, see *TextSource*
+    """
+    def pick(*names):
+        return {name: options[name] for name in names if name in options} if options else {}
+
     file_path = f"{root}/{file_path}"
-    if re.search(r'\.xls(m)?$', file_path):
-        return ExcelSource(file_path)
+    if re.search(r'\.xls[xm]$', file_path):
+        return XlsxSource(file_path, **pick('sheet', 'columns'))
+    elif re.search(r'\.xls$', file_path):
+        try:
+            import xlrd
+        except ImportError:
+            return ExcelSource(file_path)
+        return XlsSource(file_path, **pick('sheet', 'columns'))
     elif re.search(r'\.csv$', file_path):
         return CsvSource(file_path)
     elif re.search(r'\.txt$', file_path):
-        return TextSource(file_path, language_pair)
+        return TextSource(file_path, language_pair, **pick('batch_size', 'processes', 'cache_size'))
     else:
         raise Exception(f'Type of source "{file_path}" is undetermined')
 
@@ -50,20 +78,53 @@ def list_engines():
         print(f'#{i} {desc}')
 
 
-def init_audio_builder(_encode_queue, _app_config, _lock, _only_wav, _dump_sequencer_log):
+profiler = None
+
+
+def profiled(name):
+    """Profiles the block, if the run is profiled, see *Profiler*"""
+    return profiler.profile(name) if profiler is not None else nullcontext()
+
+
+def init_audio_builder(_encode_queue, _app_config, _lock, _only_wav, _dump_sequencer_log, _postprocess_queue,
+                       _profile=False, _memory_report=False):
     """
     This will initialize a worker process
     :param _encode_queue:
     :param _app_config:
     :param _lock:
+    :param _postprocess_queue:
+    :param _profile: profile the worker, each part separately
+    :param _memory_report: account memory of the worker's subsystems and parts, see *MemoryReport*
     :return:
     """
-    global sequence_builder
+    global sequence_builder, profiler
     WordNetCache._lock = _lock
-    sequence_builder = SequenceBuilder(app_config=_app_config,
-                                       encode_queue=_encode_queue,
-                                       only_wav=_only_wav,
-                                       dump_sequencer_log=_dump_sequencer_log)
+    Resource.configure(_app_config)
+    Metrics().take()  # drops what is inherited from the parent process
+    if _memory_report:
+        MemoryReport().enable(_app_config)
+    profiler = Profiler(_app_config) if _profile else None
+    with profiled('init'):
+        sequence_builder = SequenceBuilder(app_config=_app_config,
+                                           encode_queue=_encode_queue,
+                                           only_wav=_only_wav,
+                                           dump_sequencer_log=_dump_sequencer_log,
+                                           postprocess_queue=_postprocess_queue)
+
+
+def render_audio_track(language_pair, items, part_number):
+    """Renders the track in a worker process initialized by *init_audio_builder*, exceptions are passed on"""
+    global sequence_builder
+    metrics = Metrics()
+    try:
+        with metrics.timer('track'), profiled(f'track-{language_pair}-{part_number:03}'), \
+                MemoryReport().measure(f'{language_pair} #{part_number}', part=True):
+            sequence_builder.make_audio_track(language_pair, items, part_number)
+    except Exception:
+        metrics.count('track.failures')
+        raise
+    metrics.count('track.items', len(items))
 
 
 def make_audio_track(language_pair, items, part_number):
@@ -72,14 +133,105 @@ def make_audio_track(language_pair, items, part_number):
     :param language_pair:
     :param items:
     :param part_number:
-    :return:
+    :return: metrics of the track
     """
-    global sequence_builder
     try:
-        sequence_builder.make_audio_track(language_pair, items, part_number)
+        render_audio_track(language_pair, items, part_number)
     except Exception as e:
         print(str(e))
         print_exc()
+    return Metrics().take()
+
+
+def make_parts(app_config, phrasebook, phrasebook_index):
+    """
+    Generator. Splits entries of the phrasebook into parts, a track each
+    :return: tuples of language pair, items and part number
+    """
+    builder_queue: Dict[str, List[Tuple]] = dict()
+    builder_parts: Counter = Counter()
+
+    for language_pair, word, trans in phrasebook:
+        if language_pair not in app_config['languages']:
+            continue
+        if not phrasebook_index.is_new(language_pair, word):
+            continue
+        Metrics().count('phrasebook.entries')
+        builder_queue.setdefault(language_pair, list()).append((word, trans))
+        if len(builder_queue[language_pair]) > app_config['words_per_audio']:
+            items = builder_queue.pop(language_pair)
+            phrasebook_index.add_part(language_pair, builder_parts[language_pair], items)
+            yield language_pair, items, builder_parts[language_pair]
+            builder_parts[language_pair] += 1
+    for language_pair, items in builder_queue.items():
+        if len(items):
+            phrasebook_index.add_part(language_pair, builder_parts[language_pair], items)
+            yield language_pair, items, builder_parts[language_pair]
+
+
+def preload(app_config):
+    """
+    Loads read-only resources in the parent, so pool workers forked from it share their memory
+    and start rendering at once, instead of each of them loading the same. Afterwards, the loaded objects
+    are moved out of GC's sight, so garbage collections in workers don't write to, and copy, the shared pages.
+    :return: True if workers are going to be forked and share the resources
+    """
+    if get_start_method() != 'fork':
+        return False
+
+    from src.PhraseExamples import PhraseExamples
+    from src.SequencePlan import SequencePlan
+
+    languages = {name for language_pair in app_config['languages'] for name in split_name_pair(language_pair)}
+    foreign_languages = {split_name_pair(language_pair)[0] for language_pair in app_config['languages']}
+    with Metrics().timer('preload'):
+        Translator(app_config['dictionaries']).compile_indices()
+        if any(step.get('speak', None) in SequencePlan.enrichments for step in app_config['pattern']):
+            phrase_examples = PhraseExamples(app_config)
+            for language in foreign_languages & set(app_config['phraseExamples']):
+                phrase_examples.word_net_cache.get_cache(language)
+            from nltk.corpus import wordnet
+            wordnet.ensure_loaded()
+        if 'japanese' in languages:
+            from src.KanjiTable import KanjiTable
+            from src.RakutenModel import RakutenModel
+            KanjiTable.load()
+            RakutenModel.load()
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def run_render_worker(address, secret, app_config, dump_sequencer_log, profile=False, memory_report=False):
+    """
+    Renders parts for the RPC server, on another machine or in a local process
+    :param address: host and port of the server
+    :param secret: shared with the server
+    :param profile: profile rendering of the parts, dumps are left in cache/profile of this machine
+    :param memory_report: account memory, figures are left in cache/memory of this machine
+    """
+    from src.Translator import Translator
+    from src.RenderWorker import RenderWorker
+
+    if memory_report:
+        MemoryReport().enable(app_config)
+    Translator(app_config['dictionaries'])
+    postprocess_queue = Queue()
+    init_audio_builder(None, app_config, Lock(), True, dump_sequencer_log, postprocess_queue, profile, memory_report)
+    postprocessor = TextPostprocessWorker(postprocess_queue, app_config)
+
+    def render(language_pair, items, part_number):
+        try:
+            render_audio_track(language_pair, items, part_number)
+        except Exception:
+            while not postprocess_queue.empty():
+                postprocess_queue.get()  # text of the failed track
+            raise
+        while not postprocess_queue.empty():
+            postprocessor.process_track(*postprocess_queue.get())
+
+    rpc = app_config.get('rpc', dict())
+    RenderWorker(address, app_config, render, secret, rpc.get('heartbeat_interval', 5)).run()
 
 
 if __name__ == '__main__':
@@ -100,83 +252,155 @@ if __name__ == '__main__':
         parser.add_argument('-l', help='List voice engines', action='store_true')
         parser.add_argument('-w', help='Write WAV only, skip conversion to MP3', action='store_true')
         parser.add_argument('-s', help='Start RPC server', action='store_true')
+        parser.add_argument('-r', help='Render parts for the RPC server at host[:port]', metavar='ADDRESS')
         parser.add_argument('-d', help='Dump sequencer log for each output part', action='store_true')
+        parser.add_argument('--resume', help='Skip parts completed by the interrupted run', action='store_true')
+        parser.add_argument('--profile', help='Profile rendering and encoding, see cache/profile/report.txt',
+                            action='store_true')
+        parser.add_argument('--memory-report', action='store_true',
+                            help='Account memory by subsystem and part, see cache/memory/report.json')
         args = parser.parse_args()
 
         if args.l:
             list_engines()
             exit(0)
-        
-        if args.s:
-            raise NotImplementedError()
 
         time_start = datetime.utcnow()
 
         app_config = load_config()
         app_config['RitmomRoot'] = ritmom_root
+        Resource.configure(app_config)
+        rpc = app_config.get('rpc', dict())
+
+        if args.r:
+            run_render_worker(parse_address(args.r, rpc.get('port', 7070)), get_secret(rpc), app_config, args.d,
+                              args.profile, args.memory_report)
+            return
+
+        if args.memory_report:
+            MemoryReport().enable(app_config)
+            MemoryReport().start()
 
         Translator(app_config['dictionaries'])
+        if any('Japanese' in language_pair for language_pair in app_config['languages']):
+            from src.KanjiTable import KanjiTable
+            from src.RakutenModel import RakutenModel
+            KanjiTable.ensure()
+            RakutenModel.ensure()
 
         phrasebooks = []
         for phrasebook in app_config['phrasebooks']:
             if isinstance(phrasebook, str):
-                book = phrasebook
-                language_pair = app_config['default']
-            else:
-                book = phrasebook['file']
-                language_pair = phrasebook.get('pair', app_config['default'])
+                phrasebook = {'file': phrasebook}
+            book = phrasebook['file']
+            language_pair = phrasebook.get('pair', app_config['default'])
 
             if book.startswith('#'):
                 continue
 
-            source = next(get_source(book, app_config['RitmomRoot'], language_pair))
+            source = next(get_source(book, app_config['RitmomRoot'], language_pair, phrasebook))
             source = UnrollMultilineCell(default_language=language_pair)(source)
             phrasebooks.append(source)
 
-        phrasebook = chain(*phrasebooks)
+        metrics = Metrics()
+        phrasebook = metrics.timed('source', chain(*phrasebooks))
+        phrasebook_index = PhrasebookIndex(app_config)
+        parts = make_parts(app_config, phrasebook, phrasebook_index)
+
+        if args.profile:
+            Profiler(app_config).start()
+
+        journal = RunJournal(app_config)
+        journaled_parts = journal.load() if args.resume else dict()
+        if not args.resume:
+            journal.start()
 
         with Manager() as multiprocessing_manager:
             _lock = multiprocessing_manager.Lock()
+            WordNetCache._lock = _lock
+            if app_config.get('render', dict()).get('preload', False):
+                if preload(app_config):
+                    print('Resources preloaded, workers share them')
+
+            metrics_queue = multiprocessing_manager.Queue()
 
             encode_queue = multiprocessing_manager.Queue()
-            encode_worker = AudioEncoderWorker(encode_queue, app_config)
+            encode_worker = AudioEncoderWorker(encode_queue, app_config, metrics_queue, args.profile)
             encode_worker.start()
 
-            with Pool(processes=cpu_count() // 2,
-                      initializer=init_audio_builder,
-                      initargs=(encode_queue, app_config, _lock, args.w, args.d)) as pool:
-
-                builder_queue: Dict[str, List[Tuple]] = dict()
-                builder_parts: Counter = Counter()
-
-                def process_chunk():
-                    items = builder_queue.pop(language_pair)
-                    part_number = builder_parts[language_pair]
-                    pool.apply_async(make_audio_track, (language_pair, items, part_number))
-
-                    builder_queue[language_pair] = list()
-                    builder_parts[language_pair] += 1
+            postprocess_queue = multiprocessing_manager.Queue()
+            postprocess_worker = TextPostprocessWorker(postprocess_queue, app_config, metrics_queue, args.profile)
+            postprocess_worker.start()
 
-                for language_pair, word, trans in phrasebook:
-                    if language_pair not in app_config['languages']:
+            def resume_parts():
+                """Generator. Yields parts to render, skips or only encodes parts done by the interrupted run"""
+                for language_pair, items, part_number in parts:
+                    state = journal.get_resume_state(journaled_parts, language_pair, items, part_number, args.w)
+                    if state == 'verified':
+                        print(f'Skipping track {language_pair} #{part_number}, done already')
                         continue
-                    if language_pair not in builder_queue:
-                        builder_queue[language_pair] = list()
-                        builder_parts[language_pair] = 0
-                    builder_queue[language_pair].append((word, trans))
-                    if len(builder_queue[language_pair]) > app_config['words_per_audio']:
-                        process_chunk()
-                for language_pair in builder_queue:
-                    if len(builder_queue[language_pair]):
-                        process_chunk()
-
-                pool.close()
-                pool.join()
+                    if state == 'synthesized':
+                        if not args.w:
+                            encode_queue.put((language_pair, part_number))
+                        continue
+                    journal.record(language_pair, part_number, 'queued', journal.digest(items))
+                    yield language_pair, items, part_number
+
+            if args.s:
+                def on_track(language_pair, part_number):
+                    journal.synthesized(language_pair, part_number, args.w)
+                    if not args.w:
+                        encode_queue.put((language_pair, part_number))
+
+                secret = get_secret(rpc, generate=True)
+                coordinator = RenderCoordinator(app_config, resume_parts(),
+                                                (rpc.get('host', '127.0.0.1'), rpc.get('port', 7070)), secret,
+                                                rpc.get('heartbeat_timeout', 30), on_track, rpc.get('max_attempts', 3))
+                port = coordinator.start()
+                local_workers = [Process(target=run_render_worker,
+                                         args=(('localhost', port), secret, app_config, args.d, args.profile,
+                                               args.memory_report))
+                                 for _ in range(rpc.get('local_workers', 0))]
+                for worker in local_workers:
+                    worker.start()
+                coordinator.wait()
+                for worker in local_workers:
+                    worker.join()
+                for part_id, error in coordinator.failed.items():
+                    print(f'Part {part_id} failed: {error}')
+            else:
+                with Pool(processes=cpu_count() // 2,
+                          initializer=init_audio_builder,
+                          initargs=(encode_queue, app_config, _lock, args.w, args.d, postprocess_queue,
+                                    args.profile, args.memory_report)) as pool:
+                    for language_pair, items, part_number in resume_parts():
+                        pool.apply_async(make_audio_track, (language_pair, items, part_number),
+                                         callback=metrics.merge)
+
+                    pool.close()
+                    pool.join()
 
             encode_queue.put(None)
+            postprocess_queue.put(None)
             encode_worker.join()
+            postprocess_worker.join()
+            while not metrics_queue.empty():
+                metrics.merge(metrics_queue.get())
+
+        phrasebook_index.save(journal.load())
+        if phrasebook_index.skipped:
+            print(f'{phrasebook_index.skipped} repeated or known entries skipped')
 
         elapsed: timedelta = datetime.utcnow() - time_start
+        metrics.write_report(app_config, elapsed.total_seconds())
+        if args.profile:
+            report = Profiler(app_config).merge()
+            if report:
+                print(f'Profile report: {report}')
+        if args.memory_report:
+            report = MemoryReport().merge()
+            if report:
+                print(f'Memory report: {report}')
         print(f'time taken: {elapsed.total_seconds()} sec')
 
     main()
@@ -0,0 +1,23 @@
+from importlib import import_module
+
+
+def enabled_transforms(postprocessing, language_pair):
+    """
+    :param postprocessing: the **postprocessing** config section, language -> {transform name: enabled}
+    :return: language of the transforms and names of enabled ones, in config order
+    """
+    for language, transforms in postprocessing.items():
+        if language_pair.lower().startswith(language):
+            return language, [name for name, enabled in transforms.items() if name.startswith('text') and enabled]
+    return None, list()
+
+
+def load(name):
+    return import_module(f'src.postprocessing.{name}')
+
+
+def process_many(module, texts):
+    """A transform processes a batch of texts at once, if it can, otherwise one by one"""
+    if hasattr(module, 'process_many'):
+        return module.process_many(texts)
+    return [module.process(text) for text in texts]
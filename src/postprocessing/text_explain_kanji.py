@@ -0,0 +1,28 @@
+from src.JapaneseAnalyzer import JapaneseAnalyzer
+from src.KanjiTable import KanjiTable
+
+kanji_table = None
+
+
+def process(text):
+    global kanji_table
+    if kanji_table is None:
+        kanji_table = KanjiTable.load()
+
+    tokens = JapaneseAnalyzer().analyze(text)
+    kanji = dict.fromkeys(char for token in tokens for char in token.surface if JapaneseAnalyzer.is_kanji(char))
+    explanations = list()
+    for k in kanji:
+        record = kanji_table[k]
+        if record is None:
+            continue
+        kun, on, definition = record
+        explanations.append(f'{k}: {"、".join(on)}; {"、".join(kun)}; {definition}')
+    if not explanations:
+        return text
+    return f'{text} [{" | ".join(explanations)}]'
+
+
+def process_many(texts):
+    JapaneseAnalyzer().analyze_many(texts)
+    return [process(text) for text in texts]
@@ -0,0 +1,18 @@
+from src.filter.ExplainJapaneseSentences import ExplainJapaneseSentences
+
+explainer = None
+
+
+def _get_explainer():
+    global explainer
+    if explainer is None:
+        explainer = ExplainJapaneseSentences()
+    return explainer
+
+
+def process(text):
+    return f'{text} {_get_explainer().tokenize(text)}'
+
+
+def process_many(texts):
+    return [f'{text} {tokenized}' for text, tokenized in zip(texts, _get_explainer().tokenize_many(texts))]
@@ -0,0 +1,5 @@
+apostrophes = str.maketrans({'’': "'", '‘': "'", 'ʼ': "'", '`': "'"})
+
+
+def process(text):
+    return text.translate(apostrophes)
@@ -0,0 +1,12 @@
+from src.JapaneseAnalyzer import JapaneseAnalyzer
+from src.filter.AddFurigana import AddFurigana
+
+
+def process(text):
+    return ''.join(f'{token[0]}({token[1]})' if len(token) > 1 else token[0]
+                   for token in AddFurigana.tokenize(text))
+
+
+def process_many(texts):
+    JapaneseAnalyzer().analyze_many(texts)
+    return [process(text) for text in texts]
@@ -1,22 +1,121 @@
+from collections import OrderedDict, deque
+from multiprocessing import get_start_method
+from multiprocessing.pool import Pool
+from os import cpu_count
 from os.path import abspath
+from time import perf_counter
 
+from src.Metrics import Metrics
 from src.Translator import Translator
 
 
+def translate_batch(args):
+    """
+    This will be executed as payload from a translation worker process, forked from the parent
+    which has loaded the dictionaries already, or in the parent itself
+    :param args: lines and the language pair
+    :return: the lines, their translations and seconds it took
+    """
+    lines, language_pair = args
+    translator = Translator(None)
+    start = perf_counter()
+    translations = [translator.translate(line, language_pair) for line in lines]
+    return lines, translations, perf_counter() - start
+
+
 class TextSource:
-    def __init__(self, source, language_pair):
+    """
+    Plain text with a word or phrase per line, translated with the offline dictionaries.
+
+    Lines are translated in batches by a pool of worker processes forked from this one, so they share
+    the dictionaries loaded here. Where processes are spawned, e.g. on Windows, a worker would have to load
+    all dictionaries again, which costs more than translating, so lines are translated in this process then.
+    At most *read_ahead* batches are in flight, so memory doesn't depend on the size of the file.
+    Rows come out in the order of the file, recent translations are cached, so a repeated line is translated once.
+    """
+
+    def __init__(self, source, language_pair, batch_size=64, processes=None, cache_size=10000):
         self.source = abspath(source)
         self.translator = Translator(None)
         self.language_pair = language_pair
+        self.batch_size = batch_size
+        self.processes = processes or max(1, cpu_count() // 2)
+        if get_start_method() != 'fork':
+            self.processes = 1
+        self.read_ahead = 2 * self.processes
+        # lines of batches in flight must stay cached until their rows are yielded
+        self.cache_size = max(cache_size, (self.read_ahead + 1) * batch_size)
+        self.translations = OrderedDict()  # line -> translation, the least recently used first
+        self.metrics = Metrics()
 
     def __iter__(self):
         return self
 
+    def _read_batches(self, f):
+        """Generator. Yields lists of *batch_size* non-empty lines"""
+        batch = list()
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            batch.append(line)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = list()
+        if batch:
+            yield batch
+
+    def _submit(self, pool, lines, in_flight):
+        """:return: callable returning the result of *translate_batch* for lines neither cached nor in flight"""
+        missing = list()
+        for line in lines:
+            if line in self.translations or line in in_flight:
+                if line in self.translations:
+                    self.translations.move_to_end(line)  # kept until the batch is taken
+                self.metrics.count('translation.cache.hits')
+                continue
+            self.metrics.count('translation.cache.misses')
+            in_flight.add(line)
+            missing.append(line)
+        if not missing:
+            return None
+        if pool is None:
+            result = translate_batch((missing, self.language_pair))
+            return lambda: result
+        return pool.apply_async(translate_batch, ((missing, self.language_pair),)).get
+
+    def _remember(self, line, translation):
+        self.translations[line] = translation
+        self.translations.move_to_end(line)
+        if len(self.translations) > self.cache_size:
+            self.translations.popitem(last=False)
+
+    def _take(self, lines, result, in_flight):
+        """Generator. Yields rows of a batch once its translations are ready"""
+        if result is not None:
+            translated, translations, seconds = result()
+            self.metrics.observe('translation.batch', seconds)
+            self.metrics.count('translation.lines', len(translated))
+            for line, translation in zip(translated, translations):
+                self._remember(line, translation)
+                in_flight.discard(line)
+        for line in lines:
+            translation = self.translations[line]
+            self.translations.move_to_end(line)
+            yield line, translation
+
     def __next__(self):
-        with open(self.source, 'rt', errors='replace', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line == '':
-                    continue
-                trans = self.translator.translate(line, self.language_pair)
-                yield line, trans
+        batches = deque()  # lines of the batches in flight and their results
+        in_flight = set()
+        pool = Pool(processes=self.processes) if self.processes > 1 else None
+        try:
+            with open(self.source, 'rt', errors='replace', encoding='utf-8') as f:
+                for lines in self._read_batches(f):
+                    batches.append((lines, self._submit(pool, lines, in_flight)))
+                    if len(batches) > self.read_ahead:
+                        yield from self._take(*batches.popleft(), in_flight)
+            while batches:
+                yield from self._take(*batches.popleft(), in_flight)
+        finally:
+            if pool is not None:
+                pool.terminate()
@@ -0,0 +1,48 @@
+from os.path import abspath
+
+from src.source.xlsx import column_index
+
+
+class XlsSource:
+    """
+    Rows of a legacy .xls workbook read with xlrd, which loads a sheet at once,
+    but unlike Excel only the cells in use. Same options as *XlsxSource*.
+    """
+
+    def __init__(self, phrasebook, sheet=None, columns=('C', 'D')):
+        self.phrasebook = abspath(phrasebook)
+        self.sheet = sheet
+        self.columns = [column_index(column) for column in columns]
+
+    def __iter__(self):
+        return self
+
+    @staticmethod
+    def _get_value(cell):
+        import xlrd
+
+        if cell.ctype == xlrd.XL_CELL_NUMBER and cell.value == int(cell.value):
+            return str(int(cell.value))
+        return str(cell.value) if cell.ctype != xlrd.XL_CELL_EMPTY else ''
+
+    def __next__(self):
+        """Generator. Yields a tuple of cell values for *columns* of each row."""
+        import xlrd
+
+        workbook = xlrd.open_workbook(self.phrasebook, on_demand=True)
+        try:
+            if self.sheet is None:
+                sheet = workbook.sheet_by_index(0)
+            elif isinstance(self.sheet, int):
+                sheet = workbook.sheet_by_index(self.sheet)
+            else:
+                sheet = workbook.sheet_by_name(self.sheet)
+
+            for i in range(sheet.nrows):
+                cells = sheet.row(i)
+                row = tuple(self._get_value(cells[column]) if column < len(cells) else ''
+                            for column in self.columns)
+                if row[-2].strip():
+                    yield row
+        finally:
+            workbook.release_resources()
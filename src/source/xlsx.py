@@ -0,0 +1,117 @@
+import posixpath
+import re
+from os.path import abspath
+from xml.etree.ElementTree import iterparse, parse
+from zipfile import ZipFile
+
+ns_main = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+ns_relationships = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+ns_package_relationships = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def column_index(reference):
+    """'C' or 'C12' -> 2"""
+    index = 0
+    for letter in re.match(r'[A-Z]+', reference.upper()).group(0):
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+class XlsxSource:
+    """
+    Streams rows of an .xlsx/.xlsm workbook straight from the zip archive, without Excel.
+
+    Only the shared strings table is loaded, the sheet itself is parsed incrementally
+    and every row is dropped once read, so memory doesn't depend on the number of rows.
+    *columns* are letters of the columns to read, i.e. foreign word and translation, or
+    foreign language, native language, foreign word and translation (see *UnrollMultilineCell*).
+    Rows without a foreign word are skipped.
+    """
+
+    def __init__(self, phrasebook, sheet=None, columns=('C', 'D')):
+        self.phrasebook = abspath(phrasebook)
+        self.sheet = sheet  # name or number of the sheet, the first one by default
+        self.columns = [column_index(column) for column in columns]
+
+    def __iter__(self):
+        return self
+
+    def _get_sheet_path(self, archive):
+        workbook = parse(archive.open('xl/workbook.xml')).getroot()
+        sheets = [(sheet.get('name'), sheet.get(f'{ns_relationships}id'))
+                  for sheet in workbook.iter(f'{ns_main}sheet')]
+        if self.sheet is None:
+            _, relationship_id = sheets[0]
+        elif isinstance(self.sheet, int):
+            _, relationship_id = sheets[self.sheet]
+        else:
+            relationship_id = dict(sheets)[self.sheet]
+
+        relationships = parse(archive.open('xl/_rels/workbook.xml.rels')).getroot()
+        for relationship in relationships.iter(f'{ns_package_relationships}Relationship'):
+            if relationship.get('Id') == relationship_id:
+                target = relationship.get('Target')
+                return target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'xl/{target}')
+        raise Exception(f'Sheet "{self.sheet}" is not found in "{self.phrasebook}"')
+
+    @staticmethod
+    def _get_text(element):
+        """Text of a string item (*si* or *is*): its own *t* or *t* of its runs, phonetic runs (*rPh*) are left out"""
+        return ''.join(t.text or '' for t in element.iterfind(f'{ns_main}t')) + \
+            ''.join(t.text or '' for t in element.iterfind(f'{ns_main}r/{ns_main}t'))
+
+    @classmethod
+    def _get_shared_strings(cls, archive):
+        if 'xl/sharedStrings.xml' not in archive.namelist():
+            return list()
+        strings = list()
+        for _, element in iterparse(archive.open('xl/sharedStrings.xml')):
+            if element.tag == f'{ns_main}si':
+                strings.append(cls._get_text(element))
+                element.clear()
+        return strings
+
+    @classmethod
+    def _get_value(cls, cell, shared_strings):
+        cell_type = cell.get('t')
+        if cell_type == 'inlineStr':
+            inline_string = cell.find(f'{ns_main}is')
+            return '' if inline_string is None else cls._get_text(inline_string)
+        value = cell.findtext(f'{ns_main}v')
+        if value is None:
+            return ''
+        if cell_type == 's':
+            return shared_strings[int(value)]
+        if cell_type in (None, 'n') and value.endswith('.0'):
+            return value[:-2]
+        return value
+
+    def __next__(self):
+        """Generator. Yields a tuple of cell values for *columns* of each row."""
+        wanted = set(self.columns)
+        with ZipFile(self.phrasebook) as archive:
+            sheet_path = self._get_sheet_path(archive)
+            shared_strings = self._get_shared_strings(archive)
+
+            sheet_data = None
+            values = dict()
+            column = -1
+            for event, element in iterparse(archive.open(sheet_path), events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == f'{ns_main}sheetData':
+                        sheet_data = element
+                    elif element.tag == f'{ns_main}row':
+                        values = dict()
+                        column = -1
+                    continue
+
+                if element.tag == f'{ns_main}c':
+                    reference = element.get('r')
+                    column = column_index(reference) if reference else column + 1
+                    if column in wanted:
+                        values[column] = self._get_value(element, shared_strings)
+                elif element.tag == f'{ns_main}row':
+                    row = tuple(values.get(column, '') for column in self.columns)
+                    sheet_data.clear()
+                    if row[-2].strip():
+                        yield row
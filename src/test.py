@@ -161,6 +161,635 @@ class TestDictionaryReaders(unittest.TestCase):
         self.assertIsInstance(result[3], JingleChunk)
         assert result[4].language == 'japanese'
 
+    def test_split_by_language(self):
+        from src.utils.script import split_by_language
+        self.assertEqual(split_by_language('hi there привет こんにちは', 'english'),
+                         [('hi there ', 'english'), ('привет ', 'russian'), ('こんにちは', 'japanese')])
+        self.assertEqual(split_by_language('財布の中に何もありません', 'japanese'),
+                         [('財布の中に何もありません', 'japanese')])
+        self.assertEqual(split_by_language('Ça va? да', 'french'), [('Ça va? ', 'french'), ('да', 'russian')])
+        self.assertEqual(split_by_language('1, 2, 3'), [])
+        self.assertEqual(split_by_language('альфа (α) частица', 'russian', {'english', 'russian'}),
+                         [('альфа (α) частица', 'russian')])
+
+    def test_split_unvoiced_languages(self):
+        from src.Sequencer import SpeechChunk, ChunkProcessor
+        from src.filter.AddVoice import AddVoice
+        from src.filter.SplitMixedLanguages import SplitMixedLanguages
+        from src.filter.StubFinalizer import StubFinalizer
+
+        add_voice = AddVoice()
+        add_voice.default_voices = {'english': 'Salli', 'russian': 'Milena'}
+        p0 = ChunkProcessor(filters=[SplitMixedLanguages(['english', 'russian']), add_voice, StubFinalizer()])
+        result = p0.apply_filters(SpeechChunk(text='альфа (α) частица', language='russian'))
+        self.assertEqual([(c.text, c.language, c.voice) for c in result], [('альфа (α) частица', 'russian', 'Milena')])
+
+    def test_text_normalizer(self):
+        from src.TextNormalizer import TextNormalizer
+        normalize = TextNormalizer([
+            {"regex": r"/(.+?)/", "replace": r"(\1)"},
+            {"regex": r"[_{}]", "replace": " "},
+            {"literal": "smb.", "replace": "somebody"},
+            {"literal": "smb", "replace": "nobody"},
+        ], collapse_whitespace=True)
+        self.assertEqual(normalize(' /some_thing/ for  smb. '), '(some thing) for somebody')
+        self.assertEqual(TextNormalizer([])('as is'), 'as is')
+
+        from src.filter.TidyUpText import TidyUpText
+        with open(f'{parent_dir_path(parent_dir_path(abspath(__file__)))}/config.json', encoding='utf-8') as f:
+            config = load(f)['normalization']['tidy_up_text']
+        for tidy_up in (TidyUpText(), TidyUpText(config)):
+            self.assertEqual([tidy_up.normalize(text) for text in ('(_)', '/_/', '(\\)', '({})', 'a (_) b')],
+                             ['', '', '', '', 'a b'])
+            self.assertEqual(tidy_up.normalize('to /look/ up_to {smb}'), 'to (look) up to smb')
+
+    def test_sequence_plan(self):
+        from src.SequencePlan import SequencePlan
+        pattern = [
+            {"speak": "foreign1", "rate": -6, "volume": 100},
+            {"speak": "native", "volume": 80},
+            {"jingle": "silence"},
+            {"speak": "foreign2", "rate": -6, "volume": 100},
+            {"speak": "native", "volume": 80},
+        ]
+        steps = list(SequencePlan(pattern, {'foreign1': 0, 'foreign2': 1, 'native': 2}))
+        self.assertEqual([s.kind for s in steps], ['word', 'translation', 'jingle', 'word', 'translation'])
+        self.assertEqual([s.printable for s in steps], [True, True, True, False, False])
+        self.assertTrue(steps[1].record and steps[4].replay)
+        self.assertFalse(steps[0].record or steps[3].replay or steps[3].filtered)
+
+        examples = list(SequencePlan([{"speak": "examples", "volume": 100, "native_volume": 75},
+                                      {"speak": "examples", "volume": 100}], {'foreign1': 0}))
+        self.assertEqual([(s.volume, s.native_volume) for s in examples], [(100, 75), (100, None)])
+        self.assertNotEqual(examples[0].segment, examples[1].segment)
+
+    def test_filter_cache(self):
+        from tempfile import TemporaryDirectory
+        from src.FilterCache import FilterCache
+        from src.Sequencer import TextChunk, ChunkProcessor
+        from src.filter.TidyUpText import TidyUpText
+        from src.filter.StubFinalizer import StubFinalizer
+
+        class PureTidyUpText(TidyUpText):
+            pure = True
+
+        with TemporaryDirectory() as ritmom_root:
+            cache = FilterCache({'RitmomRoot': ritmom_root, 'filter_cache': {'disk': True}})
+            p0 = ChunkProcessor(filters=[PureTidyUpText(), StubFinalizer()], cache=cache)
+            for _ in range(2):
+                result = p0.apply_filters(TextChunk(text='some_text{', language='english'))
+                self.assertEqual(result[0].text, 'some text')
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            cache.flush()
+
+            cache = FilterCache({'RitmomRoot': ritmom_root, 'filter_cache': {'disk': True}})
+            p1 = ChunkProcessor(filters=[PureTidyUpText(), StubFinalizer()], cache=cache)
+            result = p1.apply_filters(TextChunk(text='some_text{', language='english'))
+            self.assertEqual(result[0].text, 'some text')
+            self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_cue_sheet(self):
+        from src.CueSheet import CueSheet
+
+        cues = CueSheet()
+        cues.add('word', 0.0, 1.0)
+        cues.add(' ', 1.0, 1.5)
+        cues.add('translation', 1.5, 2.25)
+        cues.add('\n', 2.25, 3.0)
+        cues.add('next', 3.0, 61.5)
+        cues.close()
+        self.assertEqual(cues.to_srt(), '1\n00:00:00,000 --> 00:00:03,000\nword translation\n\n'
+                                        '2\n00:00:03,000 --> 00:01:01,500\nnext\n')
+        self.assertIn('00:00:00.000 --> 00:00:03.000\nword <00:00:01.500>translation\n', cues.to_vtt())
+        self.assertEqual(cues.to_lrc(), '[00:00.00]word translation\n[00:03.00]next\n')
+
+    def test_xlsx_source(self):
+        from tempfile import TemporaryDirectory
+        from zipfile import ZipFile
+        from src.source.xlsx import XlsxSource
+
+        main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+        relationships = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+        with TemporaryDirectory() as root:
+            with ZipFile(f'{root}/book.xlsx', 'w') as archive:
+                archive.writestr('xl/workbook.xml', f'<workbook xmlns="{main}" xmlns:r="{relationships}"><sheets>'
+                                 '<sheet name="Notes" sheetId="1" r:id="rId1"/>'
+                                 '<sheet name="ForAudio" sheetId="2" r:id="rId2"/></sheets></workbook>')
+                archive.writestr('xl/_rels/workbook.xml.rels',
+                                 '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                                 '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+                                 '<Relationship Id="rId2" Target="worksheets/sheet2.xml"/></Relationships>')
+                archive.writestr('xl/sharedStrings.xml', f'<sst xmlns="{main}"><si><t>cat</t></si>'
+                                 '<si><r><t>ко</t></r><r><t>шка</t></r></si>'
+                                 '<si><t>猫</t><rPh sb="0" eb="1"><t>ネコ</t></rPh><phoneticPr fontId="1"/></si>'
+                                 '</sst>')
+                archive.writestr('xl/worksheets/sheet2.xml', f'<worksheet xmlns="{main}"><sheetData>'
+                                 '<row r="1"><c r="A1"><v>1</v></c><c r="C1" t="s"><v>0</v></c>'
+                                 '<c r="D1" t="s"><v>1</v></c></row>'
+                                 '<row r="2"><c r="D2" t="inlineStr"><is><t>skipped</t></is></c></row>'
+                                 '<row r="3"><c r="C3" t="inlineStr"><is><t>dog</t></is></c></row>'
+                                 '<row r="4"><c r="C4" t="s"><v>2</v></c><c r="D4" t="inlineStr"><is><r><t>犬</t></r>'
+                                 '<rPh sb="0" eb="1"><t>イヌ</t></rPh></is></c></row>'
+                                 '</sheetData></worksheet>')
+            rows = list(next(XlsxSource(f'{root}/book.xlsx', sheet='ForAudio')))
+            self.assertEqual(rows, [('cat', 'кошка'), ('dog', ''), ('猫', '犬')])
+
+    def test_phrasebook_index(self):
+        from tempfile import TemporaryDirectory
+        from src.PhrasebookIndex import PhrasebookIndex
+
+        with TemporaryDirectory() as root:
+            with open(f'{root}/known.txt', 'w', encoding='utf-8') as f:
+                f.write('mastered\nEnglishRussian\tLearned\n')
+            config = {'RitmomRoot': root, 'dedup': {'enabled': True, 'skip_rendered': True, 'exclude': 'known.txt'}}
+            index = PhrasebookIndex(config)
+            words = ['cat', ' Cat ', 'mastered', 'learned', 'dog']
+            self.assertEqual([index.is_new('EnglishRussian', word) for word in words],
+                             [True, False, False, False, True])
+            self.assertTrue(index.is_new('JapaneseEnglish', 'learned'))
+            self.assertTrue(index.is_new('EnglishRussian', 'failed'))
+            index.add_part('EnglishRussian', 0, [('cat', 'кошка'), ('dog', 'собака')])
+            index.add_part('EnglishRussian', 1, [('failed', 'неудачный')])
+            index.add_part('JapaneseEnglish', 0, [('learned', 'выученный')])
+            index.save({('EnglishRussian', 0): [None, 'synthesized'], ('EnglishRussian', 1): [None, 'queued'],
+                        ('JapaneseEnglish', 0): [None, 'verified']})
+
+            index = PhrasebookIndex(config)
+            self.assertEqual([index.is_new('EnglishRussian', word) for word in ('dog', 'bird', 'failed')],
+                             [False, True, True])
+            self.assertFalse(index.is_new('JapaneseEnglish', 'learned'))
+
+    def test_render_server(self):
+        from os import makedirs
+        from tempfile import TemporaryDirectory
+        from threading import Thread
+        from src.RenderCoordinator import RenderCoordinator
+        from src.RenderWorker import RenderWorker
+        from src.Sequencer import TextChunk
+
+        with TemporaryDirectory() as coordinator_root, TemporaryDirectory() as worker_root:
+            parts = [('EnglishRussian', [('cat', 'кошка')], n) for n in range(4)] + \
+                [('EnglishRussian', [('cat', [TextChunk(text='кошка', language='russian')])], 4)]
+            tracks = list()
+            coordinator = RenderCoordinator({'RitmomRoot': coordinator_root}, iter(parts), ('localhost', 0), 'secret',
+                                            heartbeat_timeout=2, on_track=lambda *track: tracks.append(track))
+            port = coordinator.start()
+            translations = list()
+
+            def render(language_pair, items, part_number):
+                translations.append(items[0][1])
+                makedirs(f'{worker_root}/text/{language_pair}', exist_ok=True)
+                with open(f'{worker_root}/text/{language_pair}/audio{part_number:03}.txt', 'w') as f:
+                    f.write(items[0][0])
+
+            class Lost(BaseException):
+                pass
+
+            def render_and_get_lost(language_pair, items, part_number):
+                raise Lost()
+
+            def run(worker):
+                try:
+                    worker.run()
+                except Lost:
+                    pass
+
+            workers = [RenderWorker(('localhost', port), {'RitmomRoot': worker_root}, render, 'forged', 0.1),
+                       RenderWorker(('localhost', port), {'RitmomRoot': worker_root}, render_and_get_lost, 'secret',
+                                    0.1)] + \
+                [RenderWorker(('localhost', port), {'RitmomRoot': worker_root}, render, 'secret', 0.1) for _ in range(2)]
+            threads = [Thread(target=run, args=(worker,)) for worker in workers]
+            for thread in threads:
+                thread.start()
+            coordinator.wait()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(sorted(tracks), [('EnglishRussian', n) for n in range(5)])
+            self.assertIn([TextChunk(text='кошка', language='russian')], translations)
+            with open(f'{coordinator_root}/text/EnglishRussian/audio004.txt') as f:
+                self.assertEqual(f.read(), 'cat')
+
+    def test_render_server_failures(self):
+        from os import makedirs, utime
+        from os.path import exists
+        from tempfile import TemporaryDirectory
+        from threading import Thread
+        from src.RenderCoordinator import RenderCoordinator
+        from src.RenderWorker import RenderWorker
+
+        with TemporaryDirectory() as coordinator_root, TemporaryDirectory() as worker_root:
+            makedirs(f'{worker_root}/audio/EnglishRussian')
+            makedirs(f'{worker_root}/text/EnglishRussian')
+            with open(f'{worker_root}/audio/EnglishRussian/audio000.wav', 'w') as f:
+                f.write('left by an earlier run')
+            utime(f'{worker_root}/audio/EnglishRussian/audio000.wav', (0, 0))
+
+            parts = [('EnglishRussian', [('cat', 'кошка')], 0), ('EnglishRussian', [('dog', 'собака')], 1)]
+            tracks = list()
+            coordinator = RenderCoordinator({'RitmomRoot': coordinator_root}, iter(parts), ('localhost', 0), 'secret',
+                                            heartbeat_timeout=2, on_track=lambda *track: tracks.append(track),
+                                            max_attempts=2)
+            port = coordinator.start()
+            attempts = list()
+
+            def render(language_pair, items, part_number):
+                attempts.append(part_number)
+                if part_number == 1 or attempts.count(0) == 1:
+                    raise RuntimeError('no voice')
+                with open(f'{worker_root}/text/{language_pair}/audio{part_number:03}.txt', 'w') as f:
+                    f.write(items[0][0])
+
+            worker = Thread(target=RenderWorker(('localhost', port), {'RitmomRoot': worker_root}, render, 'secret',
+                                                0.1).run)
+            worker.start()
+            coordinator.wait()
+            worker.join()
+
+            self.assertEqual(tracks, [('EnglishRussian', 0)])
+            self.assertEqual(coordinator.failed, {'EnglishRussian#1': 'RuntimeError: no voice'})
+            self.assertEqual(sorted(attempts), [0, 0, 1, 1])
+            self.assertTrue(exists(f'{coordinator_root}/text/EnglishRussian/audio000.txt'))
+            self.assertFalse(exists(f'{coordinator_root}/audio/EnglishRussian/audio000.wav'))
+
+    def test_render_server_storage_failures(self):
+        from tempfile import TemporaryDirectory
+        from src.RenderCoordinator import RenderCoordinator
+
+        with TemporaryDirectory() as root:
+            with open(f'{root}/text', 'w') as f:
+                f.write('a file where a directory is expected')
+            parts = [('EnglishRussian', [('cat', 'кошка')], 0)]
+            tracks = list()
+            coordinator = RenderCoordinator({'RitmomRoot': root}, iter(parts), ('localhost', 0), 'secret',
+                                            on_track=lambda *track: tracks.append(track), max_attempts=2)
+
+            part = coordinator._take_part('worker')
+            coordinator._store(coordinator.part_id(part), {'../outside.txt': b'cat'}, 'worker')
+            self.assertEqual(list(coordinator.pending), [part])
+            self.assertNotIn('EnglishRussian#0', coordinator.finished)
+
+            part = coordinator._take_part('worker')
+            coordinator._store(coordinator.part_id(part), {'text/EnglishRussian/audio000.txt': b'cat'}, 'worker')
+            self.assertEqual(tracks, [])
+            self.assertEqual(coordinator.finished, set())
+            self.assertTrue(coordinator.failed['EnglishRussian#0'].startswith('NotADirectoryError'))
+            self.assertEqual(coordinator._take_part('worker'), 'done')
+            self.assertTrue(coordinator.done)  # so *wait* returns
+
+    def test_run_journal(self):
+        from os import makedirs
+        from tempfile import TemporaryDirectory
+        from src.RunJournal import RunJournal
+
+        with TemporaryDirectory() as root:
+            makedirs(f'{root}/audio/EnglishRussian')
+            journal = RunJournal({'RitmomRoot': root})
+            journal.start()
+            items = [[('cat', 'кошка')], [('dog', 'собака')], [('bird', 'птица')]]
+            for n, part in enumerate(items):
+                journal.record('EnglishRussian', n, 'queued', journal.digest(part))
+            for n, extension in ((0, 'mp3'), (1, 'wav')):
+                with open(f'{root}/audio/EnglishRussian/audio{n:03}.{extension}', 'wb') as f:
+                    f.write(b'RIFF')
+            journal.synthesized('EnglishRussian', 0, only_wav=False)
+            journal.encoded('EnglishRussian', 0)
+            journal.synthesized('EnglishRussian', 1, only_wav=False)
+            with open(journal.path, 'a') as f:
+                f.write('{"pair": "EnglishRu')  # cut by a crash
+
+            parts = RunJournal({'RitmomRoot': root}).load()
+            states = [journal.get_resume_state(parts, 'EnglishRussian', part, n, only_wav=False)
+                      for n, part in enumerate(items)]
+            self.assertEqual(states, ['verified', 'synthesized', None])
+            self.assertIsNone(journal.get_resume_state(parts, 'EnglishRussian', [('cow', 'корова')], 0, False))
+
+    def test_metrics(self):
+        from src.Metrics import Metrics
+
+        worker, parent = Metrics.__new__(Metrics), Metrics.__new__(Metrics)
+        worker.__init__()
+        parent.__init__()
+        for hit in (True, True, False):
+            worker.count('filter_cache.hits' if hit else 'filter_cache.misses')
+        worker.observe('tts.speak', 0.2)
+        worker.observe('tts.speak', 2.0)
+        parent.merge(worker.take())
+        parent.merge(worker.take())
+        self.assertEqual(worker.counters, dict())
+
+        report = parent.report()
+        self.assertAlmostEqual(report['total']['ratios']['filter_cache'], 2 / 3)
+        histogram = report['total']['histograms']['tts.speak']
+        self.assertEqual((histogram['count'], histogram['min'], histogram['max']), (2, 0.2, 2.0))
+        self.assertEqual(len(report['workers']), 1)
+        self.assertIn('ritmom_tts_speak_seconds_bucket{le="+Inf"} 2', parent.to_prometheus())
+
+    def test_metrics_threads(self):
+        from sys import getswitchinterval, setswitchinterval
+        from threading import Thread
+        from src.Metrics import Metrics
+
+        metrics = Metrics.__new__(Metrics)
+        metrics.__init__()
+
+        def update():
+            for _ in range(20000):
+                metrics.count('sequencer.chunks')
+                metrics.observe('filter.apply', 0.001)
+
+        switch_interval = getswitchinterval()
+        setswitchinterval(1e-6)  # makes a lost update likely, were the updates not locked
+        try:
+            threads = [Thread(target=update) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            setswitchinterval(switch_interval)
+        snapshot = metrics.take()
+        self.assertEqual(snapshot['counters']['sequencer.chunks'], 80000)
+        self.assertEqual(snapshot['histograms']['filter.apply'][0], 80000)
+
+    def test_profiler(self):
+        from os.path import exists
+        from tempfile import TemporaryDirectory
+        from threading import Thread
+        from src.Profiler import Profiler
+
+        def busy(n):
+            return sum(i * i for i in range(n))
+
+        with TemporaryDirectory() as root:
+            profiler = Profiler({'RitmomRoot': root, 'profile': {'sampling_interval': 0.001}})
+            profiler.start()
+            for part in range(2):
+                with profiler.profile(f'track-EnglishRussian-{part:03}'):
+                    busy(200000)
+            report = profiler.merge()
+            with open(report, encoding='utf-8') as f:
+                text = f.read()
+            self.assertIn('2 profiles merged', text)
+            self.assertIn('busy', text)
+            self.assertTrue(exists(f'{profiler.directory}/merged.prof'))
+            profiler.start()
+            self.assertIsNone(profiler.merge())
+
+            def produce():
+                with Profiler.thread('producer'):
+                    busy_producer(200000)
+
+            def busy_producer(n):
+                return busy(n)
+
+            with profiler.profile('track-EnglishRussian-002'):
+                thread = Thread(target=produce)
+                thread.start()
+                thread.join()
+            with open(profiler.merge(), encoding='utf-8') as f:
+                self.assertIn('busy_producer', f.read())
+
+    def test_memory_report(self):
+        import tracemalloc
+        from tempfile import TemporaryDirectory
+        from src.MemoryReport import MemoryReport
+
+        with TemporaryDirectory() as root:
+            memory_report = MemoryReport.__new__(MemoryReport)
+            memory_report.__init__()
+            memory_report.enable({'RitmomRoot': root})
+            memory_report.start()
+            with memory_report.measure('dictionaries'):
+                kept = [bytearray(1024) for _ in range(1000)]
+                with memory_report.measure('kanji_table'):
+                    dropped = [bytearray(1024) for _ in range(2000)]
+                    del dropped
+            for part in range(2):
+                with memory_report.measure(f'EnglishRussian #{part}', part=True):
+                    pass
+            with open(memory_report.merge(), encoding='utf-8') as f:
+                report = load(f)
+
+            dictionaries, kanji_table = report['subsystems']['dictionaries'], report['subsystems']['kanji_table']
+            self.assertGreater(dictionaries['traced'], 1000 * 1024)
+            self.assertLess(kanji_table['traced'], 1000 * 1024)
+            self.assertGreater(kanji_table['traced_peak'], 2000 * 1024)
+            self.assertGreater(dictionaries['traced_peak'], 3000 * 1024)
+            self.assertEqual(sorted(report['parts']), ['EnglishRussian #0', 'EnglishRussian #1'])
+            self.assertEqual(len(report['processes']), 1)
+            del kept
+            tracemalloc.stop()
+
+    def test_language_filters(self):
+        from src.Sequencer import Sequencer
+
+        sequencer = Sequencer(languages={'english', 'russian'})
+        names = [f.__class__.__name__ for f in sequencer.chunk_processor.filters]
+        self.assertNotIn('ExplainKanji', names)
+        self.assertNotIn('AddFurigana', names)
+        self.assertEqual(names[-1], 'StubFinalizer')
+
+    def test_japanese_analyzer(self):
+        from src.JapaneseAnalyzer import JapaneseAnalyzer, Token
+
+        tokens = JapaneseAnalyzer().analyze('財布がありません')
+        self.assertEqual(tokens[0], Token('財布', 'さいふ', '財布', '名詞'))
+        self.assertEqual(tokens[2], Token('あり', 'あり', 'ある', '動詞'))  # reading and base form of IPAdic
+        analyses = JapaneseAnalyzer().analyze_many(['財布', '', '中'])
+        self.assertEqual([[token.surface for token in tokens] for tokens in analyses], [['財布'], [], ['中']])
+
+    def test_explain_kanji_fixtures(self):
+        from tempfile import TemporaryDirectory
+        from src.KanjiTable import KanjiTable
+        from src.Sequencer import TextChunk
+        from src.filter.ExplainKanji import ExplainKanji
+        from src.utils import fixtures
+
+        with TemporaryDirectory() as root:
+            fixtures.write_unihan(f'{root}/Unihan.zip')
+            kanji_table = KanjiTable.load(f'{root}/kanji.table',
+                                          unihan=dict(url=None, destination=f'{root}/Unihan.zip', description=None))
+            phrase = fixtures.make_japanese_phrases(1)[0]
+            result = ExplainKanji(kanji_table)(TextChunk(text=phrase, language='japanese', final=False))
+            explained = [chunk.text for chunk in result[2:] if isinstance(chunk, TextChunk) and chunk.printable
+                         and not chunk.audible]
+            self.assertEqual([char for char in explained if len(char) == 1 and char not in '、]'],
+                             list(dict.fromkeys(char for char in phrase if kanji_table[char] is not None)))
+
+    def test_spell_spaces(self):
+        from src.Sequencer import JingleChunk, LetterChunk, SpeechChunk
+        from src.filter.PronounceByLetter import PronounceByLetter
+
+        chunk = SpeechChunk(text='faux pas', language='english', voice=object(), final=False)
+        result = PronounceByLetter()(chunk)
+        letters = [c.text for c in result if isinstance(c, LetterChunk)]
+        self.assertEqual(''.join(letters), 'fauxpas')  # spoken letters come from the letter bank
+        self.assertEqual(sum(isinstance(c, JingleChunk) and c.jingle == 'space' for c in result), 1)
+
+    def test_text_output_format(self):
+        from src.TextBuilder import TextBuilder
+
+        with self.assertRaisesRegex(ValueError, 'text_output.format "pdf"'):
+            TextBuilder({'text_output': {'format': 'pdf'}, 'text_jingles': dict(), 'postprocessing': dict()})
+
+    def test_streaming_control_chunks(self):
+        from src.Sequencer import StreamingSequencer, FilterControlChunk, TextChunk
+        from src.filter.PronounceByLetter import PronounceByLetter
+
+        sequencer = StreamingSequencer(8, languages={'english', 'russian'})
+        sequencer << FilterControlChunk(instant=True, target=PronounceByLetter, attribute='enabled', value=True)
+        pronounce_by_letter, = [f for f in sequencer.chunk_processor.filters if isinstance(f, PronounceByLetter)]
+        self.assertTrue(pronounce_by_letter.enabled)
+        with self.assertRaises(ValueError):
+            sequencer << FilterControlChunk(instant=False, target=PronounceByLetter, attribute='enabled',
+                                            value=False)
+        self.assertTrue(pronounce_by_letter.enabled)
+        sequencer << TextChunk(text='hi', language='english', audible=True, printable=True, final=True)
+        sequencer.close()
+        self.assertEqual([chunk.text for chunk in sequencer], ['hi'])
+
+    def test_configured_resources(self):
+        import pickle
+        from os import makedirs
+        from tempfile import TemporaryDirectory
+        from src.Resource import Resource
+        from src.RakutenModel import RakutenModel
+
+        configured = Resource.configured
+        with TemporaryDirectory() as root:
+            model = {'url': 'https://example.com/model.json', 'destination': 'resource/model.json',
+                     'description': 'model'}
+            Resource.configure({'RitmomRoot': root, 'resource': {'rakuten_ma_model': model,
+                                                                 'absolute': dict(model, destination='/model.json')}})
+            try:
+                self.assertEqual(Resource.configured['rakuten_ma_model']['destination'],
+                                 f'{root}/resource/model.json')
+                self.assertEqual(Resource.configured['absolute']['destination'], '/model.json')
+                makedirs(f'{root}/resource')
+                with open(f'{root}/resource/model.pickle', 'wb') as f:
+                    pickle.dump({'mu': 1}, f)
+                # what main has ensured is what the filters load, whatever the working directory is
+                self.assertEqual(RakutenModel.ensure(), f'{root}/resource/model.pickle')
+                self.assertEqual(RakutenModel.load(), {'mu': 1})
+            finally:
+                Resource.configured = configured
+                RakutenModel._models.pop(f'{root}/resource/model.pickle', None)
+
+    def test_parallel_dictionary_caches(self):
+        from glob import glob
+        from os import chdir, getcwd, makedirs
+        from tempfile import TemporaryDirectory
+        from src.dictionary.BaseDictionary import BaseDictionary
+        from src.Translator import Translator
+        from src.utils import fixtures
+
+        cwd = getcwd()
+        with TemporaryDirectory() as root:
+            chdir(root)
+            try:
+                makedirs('cache')
+                glossary = fixtures.make_glossary(300)
+                fixtures.write_dsl(f'{root}/en-ru.dsl.dz', glossary, name='Test EnglishRussian')
+                fixtures.write_ldx(f'{root}/en-ru.ldx', glossary, dictionary_id=0xA0000001)
+                fixtures.write_ldx(f'{root}/en-en.ldx', fixtures.make_glossary(300, seed=1),
+                                   dictionary_id=0xA0000002)
+                descriptors = [
+                    {'pair': 'EnglishRussian', 'type': 'dsl', 'encoding': 'utf-16', 'file': f'{root}/en-ru.dsl.dz'},
+                    {'pair': 'EnglishRussian', 'type': 'ldx', 'encoding': 'utf-8', 'file': f'{root}/en-ru.ldx'},
+                    {'pair': 'EnglishEnglish', 'type': 'ldx', 'encoding': 'utf-8', 'file': f'{root}/en-en.ldx'},
+                ]
+                Translator._build_caches(descriptors)
+
+                for d in descriptors:
+                    self.assertTrue(BaseDictionary.is_cached(d['file'], d['type'], d['encoding']))
+                self.assertEqual(glob('cache/*.tmp'), [])
+                word, translations = glossary[0]
+                dsl = BaseDictionary.load(descriptors[0]['file'], 'dsl', 'utf-16', 'EnglishRussian')
+                self.assertIn(translations[0], dsl.get_raw_word_info(word))
+                ldx = BaseDictionary.load(descriptors[1]['file'], 'ldx', 'utf-8', 'EnglishRussian')
+                self.assertIn(translations[0], ldx.get_raw_word_info(word))
+            finally:
+                chdir(cwd)
+        self.assertIn('get_cache_id', BaseDictionary.__abstractmethods__)
+        for dict_type in ('dsl', 'ldx'):
+            self.assertEqual(BaseDictionary.get_class(dict_type).__abstractmethods__, frozenset())
+
+    def test_merged_index(self):
+        from src.Translator import Translator
+
+        class Dictionary:
+            def __init__(self, language_pair, data):
+                self.language_pair = language_pair
+                self.foreign_language, self.native_language = 'english', language_pair[len('English'):].lower()
+                self.dictionary_data = data
+
+            def translate_word_chunked(self, word, chunk_factory):
+                info = self.dictionary_data.get(word, None)
+                return [chunk_factory(language=self.native_language, text=info)] if info else list()
+
+            def get_examples(self, word):
+                return [(f'{word}!', self.dictionary_data[word])] if word in self.dictionary_data else list()
+
+        translator = Translator.__new__(Translator)
+        en_ru, en_en, en_ru_2 = (Dictionary('EnglishRussian', {'cat': 'кошка', 'dog': 'собака', 'bird': 'птица'}),
+                                 Dictionary('EnglishEnglish', {'cat': 'a feline'}),
+                                 Dictionary('EnglishRussian', {'cat': 'кот'}))
+        translator.all_dictionaries = [en_ru, en_en, en_ru_2]
+        translator.dictionaries = {'EnglishRussian': [en_ru, en_ru_2], 'EnglishEnglish': [en_en]}
+        translator._make_routes()
+        translator.compile_indices()
+
+        def texts(chunks):
+            return [chunk.text for chunk in chunks]
+
+        self.assertEqual(texts(translator.translate('cat', 'EnglishRussian')), ['кошка', 'кот'])
+        self.assertEqual(texts(translator.translate('cat', 'EnglishEnglish')), ['a feline'])
+        self.assertEqual(texts(translator.translate('cat', 'JapaneseEnglish')), ['кошка', 'a feline', 'кот'])
+        self.assertEqual(translator.translate('cow', 'EnglishRussian'), [])
+        self.assertEqual(len(translator.get_examples('cat', 'english')), 3)
+        self.assertEqual(translator.get_examples('cat', 'japanese'), [])
+        self.assertIs(translator._indices[(0, 2)]['dog'], translator._indices[(0, 2)]['bird'])
+
+    def test_text_source(self):
+        from tempfile import TemporaryDirectory
+        from src.Metrics import Metrics
+        from src.Translator import Translator
+        from src.source.text import TextSource
+        from src.utils.singleton import Singleton
+
+        class Dictionary:
+            language_pair = 'EnglishRussian'
+            native_language = 'russian'
+
+            def translate_word_chunked(self, word, chunk_factory):
+                return [chunk_factory(language=self.native_language, text=word.upper())]
+
+        translator = Translator.__new__(Translator)
+        translator.all_dictionaries = [Dictionary()]
+        translator.dictionaries = {'EnglishRussian': translator.all_dictionaries}
+        translator._make_routes()
+        previous = Singleton._instances.get(Translator, None)
+        Singleton._instances[Translator] = translator
+        try:
+            with TemporaryDirectory() as root:
+                lines = [f'word{n % 7}' for n in range(100)]
+                with open(f'{root}/phrasebook.txt', 'w', encoding='utf-8') as f:
+                    f.write('\n\n'.join(lines))
+                for processes in (1, 2):
+                    Metrics().take()
+                    source = TextSource(f'{root}/phrasebook.txt', 'EnglishRussian', batch_size=4,
+                                        processes=processes, cache_size=1)
+                    rows = [(line, [chunk.text for chunk in translation]) for line, translation in next(source)]
+                    self.assertEqual(rows, [(line, [line.upper()]) for line in lines])
+                    self.assertLessEqual(len(source.translations), source.cache_size)
+                    self.assertLess(Metrics().take()['counters']['translation.lines'], len(lines))
+        finally:
+            if previous is None:
+                del Singleton._instances[Translator]
+            else:
+                Singleton._instances[Translator] = previous
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,144 @@
+import csv
+import gzip
+import struct
+import zlib
+from random import Random
+from zipfile import ZipFile, ZIP_DEFLATED
+
+_latin_syllables = ('ba', 'ce', 'di', 'fo', 'gu', 'ha', 'je', 'ki', 'lo', 'mu', 'na', 'pe', 'ri', 'so', 'tu',
+                    'va', 'we', 'xi', 'yo', 'ze', 'an', 'er', 'in', 'on', 'ust', 'tion', 'ght', 'th')
+_cyrillic_syllables = ('ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'му', 'на', 'пе', 'ри', 'со', 'ту',
+                       'фа', 'хе', 'цы', 'че', 'ша', 'ть', 'ость', 'ние', 'ка', 'ой')
+
+_japanese_nouns = ('財布', '学生', '先生', '日本', '電車', '時間', '天気', '新聞', '会社', '部屋', '名前', '映画',
+                   '音楽', '料理', '写真', '旅行', '仕事', '手紙', '病院', '図書館')
+_japanese_predicates = ('があります', 'がありません', 'を読みます', 'が好きです', 'を見ました', 'はどこですか',
+                        'を買いたいです', 'が高いです')
+
+
+def make_words(count, seed=0, syllables=_latin_syllables, min_syllables=1, max_syllables=4):
+    """:return: *count* distinct pseudo-words, the same ones for the same seed"""
+    random = Random(seed)
+    words = list()
+    seen = set()
+    while len(words) < count:
+        word = ''.join(random.choice(syllables) for _ in range(random.randint(min_syllables, max_syllables)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def make_glossary(count, seed=0):
+    """:return: list of (word, list of translations)"""
+    random = Random(seed)
+    words = make_words(count, seed)
+    translations = make_words(count * 3, seed + 1, _cyrillic_syllables, 2, 4)
+    return [(word, random.sample(translations, random.randint(1, 3))) for word in words]
+
+
+def make_sentence(random, words, length):
+    return ' '.join(random.choice(words) for _ in range(length)).capitalize() + '.'
+
+
+def write_dsl(path, glossary, name='Synthetic', seed=0, encoding='utf-16'):
+    """Writes GoldenDict dictionary (.dsl.dz) with translations and an example for each word of the glossary"""
+    random = Random(seed)
+    words = [word for word, _ in glossary]
+    with gzip.open(path, mode='wt', encoding=encoding) as f:
+        f.write(f'#NAME "{name}"\n#INDEX_LANGUAGE "English"\n#CONTENTS_LANGUAGE "Russian"\n\n')
+        for word, translations in glossary:
+            f.write(f'{word}\n')
+            f.write(f'\t[m1][b]1.[/b] [trn]{"; ".join(translations)}[/trn][/m]\n')
+            example = make_sentence(random, words, random.randint(3, 8))
+            example = example.replace(' ', ' ~ ', 1)  # '~' stands for the headword
+            f.write(f'\t[m2][ex][lang name="English"]{example}[/lang] — {translations[0]}[/ex][/m]\n')
+            f.write('\n')
+        f.write('\n\n')  # the reader stops at the end of file, the last record must be followed by blank lines
+
+
+def write_ldx(path, glossary, dictionary_id, streams=4):
+    """
+    Writes Lingoes dictionary (.ldx) of the layout *LdxBaseDictionary* reads: a header, an index of definitions
+    and zlib streams of inflated words index, words and XML entries.
+    :param dictionary_id: distinct dictionaries must have distinct ids, it's the key of their cache
+    """
+    words_index, words, xmls = bytearray(), bytearray(), bytearray()
+    for word, translations in glossary:
+        words_index += struct.pack('<iiBB', len(words), len(xmls), 0, 0)
+        words += word.encode('utf-8')
+        xmls += f'<C><F><I><N>{"; ".join(translations)}</N></I></F></C>'.encode('utf-8')
+    words_index += struct.pack('<iiBB', len(words), len(xmls), 0, 0)  # ends of the last definition
+    inflated = bytes(words_index + words + xmls)
+
+    chunk_size = len(inflated) // streams + 1
+    compressed = [zlib.compress(inflated[i:i + chunk_size]) for i in range(0, len(inflated), chunk_size)]
+    ends, end = list(), 0
+    for stream in compressed:
+        end += len(stream)
+        ends.append(end)
+
+    header = bytearray(0x60)
+    header[1:4] = b'LDX'
+    struct.pack_into('<hhI', header, 0x18, 2, 5, dictionary_id)
+    data_offset = len(header)
+    index_offset = data_offset + 0x1C
+    definitions_header = index_offset + 4 * len(glossary)
+    streams_offset = definitions_header + 12 + 4 * len(ends)
+    limit = streams_offset + ends[-1]
+
+    data = bytearray(struct.pack('<iiiiii', 3, limit - data_offset - 8, definitions_header - index_offset,
+                                 len(words_index), len(words), len(xmls)))
+    data += bytes(index_offset - data_offset - len(data))
+    data += bytes(4 * len(glossary))
+    data += struct.pack('<iii', 0, 0, 0)
+    data += struct.pack(f'<{len(ends)}i', *ends)
+    with open(path, 'wb') as f:
+        f.write(header + data + b''.join(compressed))
+
+
+def write_corpus(directory, words, files=4, sentences=200, seed=0):
+    """Writes plain text files of sentences made of *words*, to be read by NLTK *PlaintextCorpusReader*"""
+    random = Random(seed)
+    paths = list()
+    for n in range(files):
+        path = f'{directory}/text{n:02}.txt'
+        with open(path, mode='w', encoding='utf-8') as f:
+            for _ in range(sentences):
+                f.write(f'{make_sentence(random, words, random.randint(4, 16))}\n')
+        paths.append(path)
+    return paths
+
+
+def write_csv_phrasebook(path, glossary, language_pair=('English', 'Russian')):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for word, translations in glossary:
+            writer.writerow([*language_pair, word, '; '.join(translations)])
+
+
+def write_text_phrasebook(path, glossary):
+    with open(path, mode='w', encoding='utf-8') as f:
+        for word, _ in glossary:
+            f.write(f'{word}\n')
+
+
+def make_japanese_phrases(count, seed=0):
+    """:return: *count* short Japanese sentences, the vocabulary is small, so phrases repeat like in a phrasebook"""
+    random = Random(seed)
+    return [f'{random.choice(_japanese_nouns)}の{random.choice(_japanese_nouns)}{random.choice(_japanese_predicates)}'
+            for _ in range(count)]
+
+
+def write_unihan(path, seed=0):
+    """Writes Unihan.zip with readings and definitions of the kanji of *make_japanese_phrases*, for *KanjiTable*"""
+    random = Random(seed)
+    kanji = sorted({char for text in _japanese_nouns + _japanese_predicates for char in text if ord(char) >= 0x4E00})
+    lines = list()
+    for char in kanji:
+        codepoint = f'U+{ord(char):04X}'
+        lines.append(f'{codepoint}\tkDefinition\t{" ".join(make_words(2, random.randint(0, 1 << 16)))}')
+        lines.append(f'{codepoint}\tkJapaneseKun\t{random.choice(("KA", "MI", "TO", "HANA", "YAMA"))}')
+        lines.append(f'{codepoint}\tkJapaneseOn\t{random.choice(("SAI", "GAKU", "SEI", "NICHI", "DEN"))}')
+    with ZipFile(path, mode='w', compression=ZIP_DEFLATED) as z:
+        z.writestr('Unihan_Readings.txt', '# Synthetic\n' + '\n'.join(lines) + '\n')
@@ -0,0 +1,24 @@
+from sys import platform
+
+
+def get_rss():
+    """:return: resident set size of the process and its peak, bytes"""
+    if platform == 'win32':
+        from win32api import GetCurrentProcess
+        from win32process import GetProcessMemoryInfo
+
+        info = GetProcessMemoryInfo(GetCurrentProcess())
+        return info['WorkingSetSize'], info['PeakWorkingSetSize']
+
+    rss, peak = 0, 0
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        from resource import getrusage, RUSAGE_SELF
+        peak = getrusage(RUSAGE_SELF).ru_maxrss * (1 if platform == 'darwin' else 1024)
+    return rss, peak
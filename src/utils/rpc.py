@@ -0,0 +1,99 @@
+import hmac
+import struct
+from base64 import b64decode, b64encode
+from hashlib import sha256
+from json import dumps, loads
+from os import environ
+from secrets import token_hex
+
+header = struct.Struct('!Q')
+max_frame_size = 1 << 30
+secret_variable = 'RITMOM_RPC_SECRET'
+
+
+def get_secret(rpc_config, generate=False):
+    """
+    :return: the shared secret of the coordinator and its workers, from the environment variable
+        RITMOM_RPC_SECRET or **rpc.secret** of the config
+    :param generate: make a random secret if none is configured, it has to be passed to remote workers then
+    """
+    secret = environ.get(secret_variable, None) or rpc_config.get('secret', None)
+    if not secret:
+        if not generate:
+            raise ValueError(f'RPC needs a shared secret, set {secret_variable} or "rpc.secret" of the config')
+        secret = token_hex(16)
+        print(f'RPC secret is generated, remote workers need {secret_variable}={secret}')
+    return secret
+
+
+def _chunk_classes():
+    from src.Sequencer import TextChunk, JingleChunk
+    return {cls.__name__: cls for cls in (TextChunk, JingleChunk)}
+
+
+def _encode(value):
+    import attr
+
+    if isinstance(value, bytes):
+        return {'__bytes__': b64encode(value).decode('ascii')}
+    if attr.has(value.__class__) and value.__class__.__name__ in _chunk_classes():
+        return {'__chunk__': value.__class__.__name__, **attr.asdict(value, recurse=False)}
+    raise TypeError(f'{value.__class__.__name__} can not be sent')
+
+
+def _decode(value):
+    if '__bytes__' in value:
+        return b64decode(value['__bytes__'])
+    if '__chunk__' in value:
+        fields = dict(value)
+        return _chunk_classes()[fields.pop('__chunk__')](**fields)
+    return value
+
+
+def _sign(secret, data):
+    return hmac.new(secret.encode('utf-8'), data, sha256).digest()
+
+
+def send_message(sock, message, secret):
+    """
+    Sends a dict as a length-prefixed frame of JSON signed with HMAC of the shared secret.
+    Besides JSON types, bytes and text and jingle chunks of phrasebook translations can be sent.
+    """
+    data = dumps(message, ensure_ascii=False, default=_encode).encode('utf-8')
+    sock.sendall(header.pack(len(data)) + _sign(secret, data) + data)
+
+
+def _receive_exactly(sock, size):
+    chunks = list()
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive_message(sock, secret):
+    """
+    :return: the dict sent by *send_message*, or None if the connection is closed
+    :raise ValueError: if the frame is too big or isn't signed with the shared secret
+    """
+    data = _receive_exactly(sock, header.size + sha256().digest_size)
+    if data is None:
+        return None
+    (size, ), signature = header.unpack(data[:header.size]), data[header.size:]
+    if size > max_frame_size:
+        raise ValueError(f'Frame of {size} bytes is too big')
+    data = _receive_exactly(sock, size)
+    if data is None:
+        return None
+    if not hmac.compare_digest(signature, _sign(secret, data)):
+        raise ValueError('Frame is not signed with the shared secret')
+    return loads(data.decode('utf-8'), object_hook=_decode)
+
+
+def parse_address(address, default_port):
+    """'host:port' or 'host' -> (host, port)"""
+    host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+    return host or 'localhost', int(port) if port else default_port
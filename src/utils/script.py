@@ -0,0 +1,85 @@
+import re
+from typing import List, Tuple
+
+
+# Codepoint ranges of letters by script. Digits, spaces and punctuation are neutral on purpose.
+SCRIPT_RANGES = {
+    'latin': [(0x0041, 0x005A), (0x0061, 0x007A), (0x00C0, 0x00D6), (0x00D8, 0x00F6), (0x00F8, 0x024F),
+              (0x1E00, 0x1EFF)],
+    'greek': [(0x0370, 0x03FF), (0x1F00, 0x1FFF)],
+    'cyrillic': [(0x0400, 0x052F), (0x2DE0, 0x2DFF), (0xA640, 0xA69F)],
+    'hebrew': [(0x0590, 0x05FF)],
+    'arabic': [(0x0600, 0x06FF), (0x0750, 0x077F)],
+    'devanagari': [(0x0900, 0x097F)],
+    'thai': [(0x0E00, 0x0E7F)],
+    'hangul': [(0x1100, 0x11FF), (0x3130, 0x318F), (0xAC00, 0xD7AF)],
+    'kana': [(0x3040, 0x309F), (0x30A0, 0x30FF), (0x31F0, 0x31FF), (0xFF66, 0xFF9F)],
+    'cjk': [(0x3005, 0x3007), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0x20000, 0x323AF)],
+}
+
+# A language a run of the script is attributed to, unless the chunk's own language uses that script
+SCRIPT_LANGUAGES = {
+    'latin': 'english',
+    'greek': 'greek',
+    'cyrillic': 'russian',
+    'hebrew': 'hebrew',
+    'arabic': 'arabic',
+    'devanagari': 'hindi',
+    'thai': 'thai',
+    'hangul': 'korean',
+    'kana': 'japanese',
+    'cjk': 'japanese',
+}
+
+LANGUAGE_SCRIPTS = {
+    'english': {'latin'},
+    'french': {'latin'},
+    'russian': {'cyrillic'},
+    'japanese': {'kana', 'cjk'},
+    'korean': {'hangul', 'cjk'},
+}
+
+
+def _character_class(ranges):
+    return ''.join(f'\\U{low:08X}-\\U{high:08X}' for low, high in ranges)
+
+
+_script_runs_regex = re.compile('|'.join(f'(?P<{script}>[{_character_class(ranges)}]+)'
+                                         for script, ranges in SCRIPT_RANGES.items()))
+
+
+def script_runs(text) -> List[Tuple[int, int, str]]:
+    """
+    Finds runs of letters of the same script
+
+    :return: list of (start, end, script), neutral characters in between are not covered
+    """
+    return [(m.start(), m.end(), m.lastgroup) for m in _script_runs_regex.finditer(text)]
+
+
+def script_language(script, preferred_language=None):
+    if script in LANGUAGE_SCRIPTS.get(preferred_language, ()):
+        return preferred_language
+    return SCRIPT_LANGUAGES[script]
+
+
+def split_by_language(text, preferred_language=None, languages=None) -> List[Tuple[str, str]]:
+    """
+    Cuts text into pieces of a single language each. Neutral characters
+    stick to the preceding piece, leading ones to the first piece.
+
+    :param languages: the ones which can be spoken, letters of other languages are neutral; any if None
+    :return: list of (text, language), empty if there are no letters at all
+    """
+    cuts = list()  # (start, language)
+    for start, _, script in script_runs(text):
+        language = script_language(script, preferred_language)
+        if languages is not None and language not in languages:
+            continue
+        if not cuts or cuts[-1][1] != language:
+            cuts.append((start, language))
+    if not cuts:
+        return list()
+    cuts[0] = (0, cuts[0][1])
+    ends = [start for start, _ in cuts[1:]] + [len(text)]
+    return [(text[start:end], language) for (start, language), end in zip(cuts, ends)]